@@ -18,6 +18,8 @@ import modules.doctors.models
 import modules.patients.models
 import modules.appointments.models
 import modules.infections.models
+import modules.jobs.models
+import modules.exports.models
 
 
 # Alembic config
@@ -32,6 +34,13 @@ if DATABASE_URL:
 
 target_metadata = Base.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    """Autogenerate: skip indexes the models only create on another dialect (Index.ddl_if)."""
+    if type_ == "index" and not reflected and object._ddl_if is not None:
+        dialect = object._ddl_if.dialect
+        return dialect is None or dialect == context.get_context().dialect.name
+    return True
+
 # ----------------------------
 # Offline migrations
 def run_migrations_offline() -> None:
@@ -41,6 +50,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
     with context.begin_transaction():
         context.run_migrations()
@@ -54,7 +64,7 @@ def run_migrations_online() -> None:
         poolclass=pool.NullPool,
     )
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
         with context.begin_transaction():
             context.run_migrations()
 
@@ -0,0 +1,28 @@
+"""add users role/id index
+
+Revision ID: 3c9e0f6b2a71
+Revises: 7e3b52a0c1d8
+Create Date: 2026-10-18 15:10:04.218733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9e0f6b2a71'
+down_revision: Union[str, Sequence[str], None] = '7e3b52a0c1d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_role_id', 'users', ['role', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_role_id', table_name='users')
@@ -0,0 +1,69 @@
+"""add jobs table and infection record status / appointment link
+
+Revision ID: 59163840f318
+Revises: 9a4d2c7e1f60
+Create Date: 2026-10-18 13:59:04.494760
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '59163840f318'
+down_revision: Union[str, Sequence[str], None] = '9a4d2c7e1f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('blob', sa.LargeBinary(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=128), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=64), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index(op.f('ix_jobs_id'), 'jobs', ['id'], unique=False)
+    op.create_index('ix_jobs_status_run_at', 'jobs', ['status', 'run_at'], unique=False)
+    # batch mode: SQLite can only change nullability / add a foreign key by copying the table
+    # (existing records were diagnosed inline, hence status 'done')
+    with op.batch_alter_table('infection_records') as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=16), server_default='done', nullable=False))
+        batch_op.add_column(sa.Column('error', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('appointment_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+        batch_op.alter_column('image_url', existing_type=sa.VARCHAR(), nullable=True)
+        batch_op.create_foreign_key('fk_infection_records_appointment_id', 'appointments',
+                                    ['appointment_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # records that never got an image (pending / failed diagnoses) cannot survive NOT NULL
+    op.execute("DELETE FROM infection_records WHERE image_url IS NULL")
+    with op.batch_alter_table('infection_records') as batch_op:
+        batch_op.drop_constraint('fk_infection_records_appointment_id', type_='foreignkey')
+        batch_op.alter_column('image_url', existing_type=sa.VARCHAR(), nullable=False)
+        batch_op.drop_column('completed_at')
+        batch_op.drop_column('appointment_id')
+        batch_op.drop_column('error')
+        batch_op.drop_column('status')
+    op.drop_index('ix_jobs_status_run_at', table_name='jobs')
+    op.drop_index(op.f('ix_jobs_id'), table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,43 @@
+"""add diagnosis_cache
+
+Revision ID: 7e3b52a0c1d8
+Revises: d41f7a9c3e25
+Create Date: 2026-10-18 14:02:37.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e3b52a0c1d8'
+down_revision: Union[str, Sequence[str], None] = 'd41f7a9c3e25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('diagnosis_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('perceptual_hash', sa.String(length=16), nullable=True),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('image_url', sa.String(), nullable=False),
+    sa.Column('ai_response', sa.JSON(), nullable=False),
+    sa.Column('inference_ms', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_hash', 'model', name='uq_diagnosis_cache_content_model')
+    )
+    op.create_index(op.f('ix_diagnosis_cache_id'), 'diagnosis_cache', ['id'], unique=False)
+    op.create_index(op.f('ix_diagnosis_cache_perceptual_hash'), 'diagnosis_cache', ['perceptual_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_diagnosis_cache_perceptual_hash'), table_name='diagnosis_cache')
+    op.drop_index(op.f('ix_diagnosis_cache_id'), table_name='diagnosis_cache')
+    op.drop_table('diagnosis_cache')
@@ -0,0 +1,45 @@
+"""add slot_holds and unique appointments.slot_id
+
+Revision ID: 9a4d2c7e1f60
+Revises: 3c9e0f6b2a71
+Create Date: 2026-10-18 16:05:41.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4d2c7e1f60'
+down_revision: Union[str, Sequence[str], None] = '3c9e0f6b2a71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('slot_holds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('slot_id', sa.Integer(), nullable=False),
+    sa.Column('patient_id', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['patient_id'], ['patients.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['slot_id'], ['doctor_slots.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('slot_id')
+    )
+    op.create_index(op.f('ix_slot_holds_expires_at'), 'slot_holds', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_slot_holds_id'), 'slot_holds', ['id'], unique=False)
+    # fails if the table already holds double bookings; resolve those before upgrading
+    op.create_index('uq_appointments_slot_id', 'appointments', ['slot_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_appointments_slot_id', table_name='appointments')
+    op.drop_index(op.f('ix_slot_holds_id'), table_name='slot_holds')
+    op.drop_index(op.f('ix_slot_holds_expires_at'), table_name='slot_holds')
+    op.drop_table('slot_holds')
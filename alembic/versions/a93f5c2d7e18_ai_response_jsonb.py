@@ -0,0 +1,59 @@
+"""store infection_records.ai_response as a JSON document (JSONB on Postgres)
+
+Revision ID: a93f5c2d7e18
+Revises: c0e831300ec4
+Create Date: 2026-10-18 15:02:11.304518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93f5c2d7e18'
+down_revision: Union[str, Sequence[str], None] = 'c0e831300ec4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # rows written so far hold a JSON string whose text is the document (json.dumps into a
+    # JSON column); unwrap them to the document itself
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("""
+            ALTER TABLE infection_records ALTER COLUMN ai_response TYPE JSONB USING (
+                CASE WHEN json_typeof(ai_response) = 'string' THEN (ai_response #>> '{}')::jsonb
+                     ELSE ai_response::jsonb END
+            )
+        """)
+        op.create_index('ix_infection_records_ai_response', 'infection_records', ['ai_response'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'ai_response': 'jsonb_path_ops'})
+    else:
+        op.execute("""
+            UPDATE infection_records SET ai_response = json_extract(ai_response, '$')
+            WHERE json_valid(ai_response) AND json_type(ai_response) = 'text'
+        """)
+    op.create_index('ix_infection_records_confidence', 'infection_records', ['confidence'], unique=False)
+    op.create_index('ix_infection_records_diagnosis_created_at', 'infection_records', ['diagnosis', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_infection_records_diagnosis_created_at', table_name='infection_records')
+    op.drop_index('ix_infection_records_confidence', table_name='infection_records')
+    # back to the JSON-string encoding the previous code reads
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index('ix_infection_records_ai_response', table_name='infection_records')
+        op.execute("""
+            ALTER TABLE infection_records ALTER COLUMN ai_response TYPE JSON USING (
+                CASE WHEN ai_response IS NULL THEN NULL ELSE to_json(ai_response::text) END
+            )
+        """)
+    else:
+        op.execute("""
+            UPDATE infection_records SET ai_response = json_quote(ai_response)
+            WHERE json_valid(ai_response) AND json_type(ai_response) = 'object'
+        """)
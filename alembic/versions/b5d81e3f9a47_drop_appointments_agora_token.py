@@ -0,0 +1,31 @@
+"""drop appointments.agora_token
+
+Revision ID: b5d81e3f9a47
+Revises: f875376540cb
+Create Date: 2026-10-18 17:05:12.418903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d81e3f9a47'
+down_revision: Union[str, Sequence[str], None] = 'f875376540cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tokens are minted per (channel, uid) on request (agora_utils.TokenCache); nothing writes this
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.drop_column('agora_token')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('appointments') as batch_op:
+        batch_op.add_column(sa.Column('agora_token', sa.String(), nullable=True))
@@ -0,0 +1,43 @@
+"""add export watermarks and infection record updated_at
+
+Revision ID: c0e831300ec4
+Revises: e7b2d9a4c610
+Create Date: 2026-10-18 14:23:46.697286
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c0e831300ec4'
+down_revision: Union[str, Sequence[str], None] = 'e7b2d9a4c610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('export_watermarks',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('watermark', sa.DateTime(), nullable=False),
+    sa.Column('rows', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.add_column('infection_records', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # existing records last changed when their diagnosis finished
+    op.execute("UPDATE infection_records SET updated_at = COALESCE(completed_at, created_at)")
+    op.create_index('ix_infection_records_created_at', 'infection_records', ['created_at'], unique=False)
+    op.create_index('ix_infection_records_updated_at_id', 'infection_records', ['updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_infection_records_updated_at_id', table_name='infection_records')
+    op.drop_index('ix_infection_records_created_at', table_name='infection_records')
+    with op.batch_alter_table('infection_records') as batch_op:
+        batch_op.drop_column('updated_at')
+    op.drop_table('export_watermarks')
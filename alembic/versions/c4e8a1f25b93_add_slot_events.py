@@ -0,0 +1,44 @@
+"""add slot_events
+
+Revision ID: c4e8a1f25b93
+Revises: 59163840f318
+Create Date: 2026-10-18 19:12:08.417530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f25b93'
+down_revision: Union[str, Sequence[str], None] = '59163840f318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('slot_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('slot_id', sa.Integer(), nullable=False),
+    sa.Column('start_datetime', sa.DateTime(), nullable=False),
+    sa.Column('end_datetime', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    # event ids are stream resume cursors: SQLite must not reuse them
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_slot_events_created_at', 'slot_events', ['created_at'], unique=False)
+    op.create_index('ix_slot_events_doctor_id_id', 'slot_events', ['doctor_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_slot_events_doctor_id_id', table_name='slot_events')
+    op.drop_index('ix_slot_events_created_at', table_name='slot_events')
+    op.drop_table('slot_events')
@@ -0,0 +1,40 @@
+"""add slot and appointment indexes
+
+Revision ID: d41f7a9c3e25
+Revises: 2bd8dcb790f7
+Create Date: 2026-10-18 10:12:04.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41f7a9c3e25'
+down_revision: Union[str, Sequence[str], None] = '2bd8dcb790f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_doctors_specialization'), 'doctors', ['specialization'], unique=False)
+    op.create_index('ix_doctor_slots_doctor_booked_start', 'doctor_slots', ['doctor_id', 'is_booked', 'start_datetime'], unique=False)
+    op.create_index(
+        'ix_doctor_slots_free_start', 'doctor_slots', ['start_datetime', 'doctor_id', 'id'], unique=False,
+        postgresql_where=sa.text('is_booked = false'),
+        sqlite_where=sa.text('is_booked = 0'),
+    )
+    op.create_index('ix_appointments_patient_scheduled', 'appointments', ['patient_id', 'scheduled_at'], unique=False)
+    op.create_index('ix_appointments_doctor_scheduled', 'appointments', ['doctor_id', 'scheduled_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_appointments_doctor_scheduled', table_name='appointments')
+    op.drop_index('ix_appointments_patient_scheduled', table_name='appointments')
+    op.drop_index('ix_doctor_slots_free_start', table_name='doctor_slots')
+    op.drop_index('ix_doctor_slots_doctor_booked_start', table_name='doctor_slots')
+    op.drop_index(op.f('ix_doctors_specialization'), table_name='doctors')
@@ -0,0 +1,58 @@
+"""add doctor_availability summary
+
+Revision ID: e7b2d9a4c610
+Revises: c4e8a1f25b93
+Create Date: 2026-10-18 21:03:44.190266
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2d9a4c610'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f25b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('doctor_availability',
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('specialization', sa.String(), nullable=True),
+    sa.Column('next_free_at', sa.DateTime(), nullable=True),
+    sa.Column('free_slots_7d', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['doctor_id'], ['doctors.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('doctor_id')
+    )
+    op.create_index('ix_doctor_availability_next', 'doctor_availability', ['next_free_at'], unique=False)
+    op.create_index('ix_doctor_availability_spec_free', 'doctor_availability', ['specialization', 'free_slots_7d'], unique=False)
+    op.create_index('ix_doctor_availability_spec_next', 'doctor_availability', ['specialization', 'next_free_at'], unique=False)
+
+    # backfill one row per doctor; the app's refresh loop keeps them current from here on
+    now = datetime.utcnow()
+    op.get_bind().execute(sa.text("""
+        INSERT INTO doctor_availability (doctor_id, specialization, next_free_at, free_slots_7d, updated_at)
+        SELECT d.id, d.specialization,
+               (SELECT min(s.start_datetime) FROM doctor_slots s
+                WHERE s.doctor_id = d.id AND s.is_booked = :free AND s.start_datetime >= :now),
+               (SELECT count(*) FROM doctor_slots s
+                WHERE s.doctor_id = d.id AND s.is_booked = :free AND s.start_datetime >= :now
+                  AND s.start_datetime < :until),
+               :now
+        FROM doctors d
+    """).bindparams(sa.bindparam("free", False, sa.Boolean()), sa.bindparam("now", now, sa.DateTime()),
+                    sa.bindparam("until", now + timedelta(days=7), sa.DateTime())))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_doctor_availability_spec_next', table_name='doctor_availability')
+    op.drop_index('ix_doctor_availability_spec_free', table_name='doctor_availability')
+    op.drop_index('ix_doctor_availability_next', table_name='doctor_availability')
+    op.drop_table('doctor_availability')
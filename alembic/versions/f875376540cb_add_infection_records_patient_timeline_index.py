@@ -0,0 +1,28 @@
+"""add infection_records patient timeline index
+
+Revision ID: f875376540cb
+Revises: a93f5c2d7e18
+Create Date: 2026-10-18 14:42:44.823626
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f875376540cb'
+down_revision: Union[str, Sequence[str], None] = 'a93f5c2d7e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_infection_records_patient_created_at', 'infection_records', ['patient_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_infection_records_patient_created_at', table_name='infection_records')
@@ -0,0 +1,132 @@
+# benchmarks/export_history.py
+"""
+Infection history export at scale: streams --records infection records (joined with
+patients and consultations) through modules.exports.infection_history in each format and
+reports throughput, file size and resident memory while streaming.
+
+Memory must stay flat: the script samples RSS after every piece of the file and exits
+non-zero if, past the first quarter of the rows, it grows by more than --max-growth-mb
+(a buffered export grows with every batch).
+
+    python benchmarks/export_history.py --records 200000
+    python benchmarks/export_history.py --out export_history.json
+    python benchmarks/export_history.py --compare export_history.json
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--records", type=int, default=200000)
+parser.add_argument("--patients", type=int, default=5000)
+parser.add_argument("--batch-size", type=int, default=5000, help="EXPORT_BATCH_SIZE")
+parser.add_argument("--max-growth-mb", type=float, default=16)
+
+import report
+
+report.add_arguments(parser)
+args = parser.parse_args()
+
+workdir = Path(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'export_history.db'}"
+os.environ["EXPORT_BATCH_SIZE"] = str(args.batch_size)
+
+from seed import make_engine, seed
+
+from sqlalchemy import insert, select
+
+from modules.core.db import async_engine
+from modules.appointments.models import Appointment
+from modules.infections.models import InfectionRecord
+from modules.exports import infection_history
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def seed_records(engine):
+    """Records spread over a year, a quarter of them with a consultation."""
+    seed(engine, 50, 200, args.patients, appointments_per_patient=2)
+    rng = random.Random(0)
+    start = datetime.utcnow() - timedelta(days=365)
+    with engine.begin() as conn:
+        appointments = conn.execute(select(Appointment.id, Appointment.patient_id)).all()
+        for low in range(0, args.records, 10000):
+            rows = []
+            for i in range(low, min(low + 10000, args.records)):
+                created = start + timedelta(seconds=i * 365 * 86400 // args.records)
+                confidence = round(rng.uniform(0.5, 0.99), 2)
+                appointment_id, patient_id = appointments[i % len(appointments)] if i % 4 == 0 else \
+                    (None, rng.randint(1, args.patients))
+                rows.append({
+                    "patient_id": patient_id,
+                    "image_url": f"/media/{i:08x}.png",
+                    "ai_response": {"diagnosis": "Possible fungal infection", "confidence": confidence,
+                                    "advice": "Apply anti-fungal cream twice daily for 2 weeks."},
+                    "diagnosis": "Possible fungal infection",
+                    "confidence": confidence,
+                    "recommended_consultation": confidence < 0.9,
+                    "status": "done",
+                    "appointment_id": appointment_id,
+                    "created_at": created,
+                    "completed_at": created,
+                    "updated_at": created,
+                })
+            conn.execute(insert(InfectionRecord), rows)
+
+
+async def export(fmt: str) -> dict:
+    before = rss_kb()
+    samples = []  # RSS after each piece
+    size = 0
+    t0 = time.perf_counter()
+    with open(workdir / f"export.{fmt}", "wb") as f:
+        async for chunk in infection_history.stream_export(fmt):
+            f.write(chunk)
+            size += len(chunk)
+            samples.append(rss_kb())
+    elapsed = time.perf_counter() - t0
+    warm = samples[len(samples) // 4:]
+    return {
+        "rows_per_sec": round(args.records / elapsed, 1),
+        "seconds": round(elapsed, 2),
+        "file_mb": round(size / 2**20, 2),
+        "rss_growth_mb": round((max(samples) - before) / 1024, 1),
+        "rss_growth_after_first_quarter_mb": round((max(warm) - warm[0]) / 1024, 1),
+    }
+
+
+async def run() -> dict:
+    results = {}
+    for fmt in infection_history.FORMATS:
+        await export(fmt)  # warm-up: imports, allocator, page cache
+        results[f"export_{fmt}"] = await export(fmt)
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    seed_records(make_engine(os.environ["DATABASE_URL"]))
+    results = asyncio.run(run())
+    failures = [name for name, r in results.items() if r["rss_growth_after_first_quarter_mb"] > args.max_growth_mb]
+    for name in results:
+        print(f"{'FAIL' if name in failures else 'ok  '} {name}: memory flat while streaming")
+    code = report.finish(args, {
+        "meta": report.meta(benchmark="export_history", records=args.records, batch_size=args.batch_size),
+        "results": results,
+    })
+    return code or (1 if failures else 0)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+# benchmarks/inference_batching.py
+"""
+Throughput of the micro-batching inference service against max batch size.
+
+Feeds N concurrent JPEG images through InferenceService with a CPU stand-in
+model (global average pool + a fixed linear layer in NumPy) and reports
+images/second, mean batch size and per-request p50/p99 for each batch size.
+
+    python benchmarks/inference_batching.py --images 512 --batch-sizes 1 4 8 16 32
+"""
+import argparse
+import asyncio
+import io
+import statistics
+import time
+
+import seed  # noqa: F401  (sys.path + env defaults)
+
+import numpy as np
+from PIL import Image
+
+from modules.infections.inference import InferenceService
+
+LABELS = ["Possible fungal infection", "Eczema", "Psoriasis", "Acne", "Benign nevus"]
+
+
+def make_linear_model(image_size: int, hidden: int = 256):
+    rng = np.random.default_rng(0)
+    w1 = rng.standard_normal((3 * 16 * 16, hidden), dtype=np.float32) / 28
+    w2 = rng.standard_normal((hidden, len(LABELS)), dtype=np.float32) / 16
+    pool = image_size // 16
+
+    def model(batch: np.ndarray) -> list[dict]:
+        n = batch.shape[0]
+        # average-pool to 16x16, flatten, two dense layers, softmax
+        pooled = batch[:, :, :pool * 16, :pool * 16].reshape(n, 3, 16, pool, 16, pool).mean(axis=(3, 5))
+        logits = np.maximum(pooled.reshape(n, -1) @ w1, 0) @ w2
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [{"diagnosis": LABELS[i], "confidence": float(probs[row, i])} for row, i in enumerate(best)]
+
+    return model
+
+
+def make_images(n: int, size: tuple[int, int] = (640, 480)) -> list[bytes]:
+    rng = np.random.default_rng(1)
+    images = []
+    for _ in range(n):
+        buf = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(buf, "JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+async def run_one(images, batch_size, max_wait_ms, image_size):
+    service = InferenceService(make_linear_model(image_size), batch_size, max_wait_ms, image_size)
+    latencies = []
+
+    async def one(data):
+        t0 = time.perf_counter()
+        await service.predict(data)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(data) for data in images))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    stats = service.stats()
+    return {
+        "max_batch_size": batch_size,
+        "images": len(images),
+        "images_per_s": round(len(images) / elapsed, 1),
+        "avg_batch_size": stats["avg_batch_size"],
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--image-size", type=int, default=224)
+    args = parser.parse_args()
+
+    images = make_images(args.images)
+    for batch_size in args.batch_sizes:
+        print(asyncio.run(run_one(images, batch_size, args.max_wait_ms, args.image_size)))
+
+
+if __name__ == "__main__":
+    main()
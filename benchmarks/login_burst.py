@@ -0,0 +1,100 @@
+# benchmarks/login_burst.py
+"""
+Login-storm benchmark for the password-hash pool (modules/auth/hashing.py).
+
+Measures GET /patients/me latency on its own, then again while a burst of
+POST /auth/login requests is in flight, and reports login p50/p99 for the burst.
+
+    pip install httpx
+    python benchmarks/login_burst.py --logins 200 --login-concurrency 50
+    PASSWORD_HASH_WORKERS=8 BCRYPT_ROUNDS=12 python benchmarks/login_burst.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--url", default=None, help="database URL (default: temporary SQLite file)")
+parser.add_argument("--patients", type=int, default=200)
+parser.add_argument("--logins", type=int, default=200)
+parser.add_argument("--login-concurrency", type=int, default=50)
+parser.add_argument("--other-concurrency", type=int, default=8)
+parser.add_argument("--other-requests", type=int, default=400)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = args.url or f"sqlite:///{Path(tempfile.mkdtemp()) / 'login_burst.db'}"
+
+from seed import seed
+
+import httpx
+from sqlalchemy import update
+
+import main
+from modules.core.db import engine, async_engine
+from modules.users.models import User
+from modules.auth import hashing
+from modules.auth.security import create_access_token
+
+PASSWORD = "bench-password"
+
+
+def summarize(name, latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 2),
+    }
+
+
+async def fire(client, n, concurrency, request):
+    latencies = []
+    counter = iter(range(n))
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            r = await request(client, i)
+            latencies.append(time.perf_counter() - t0)
+            assert r.status_code == 200, r.text
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - t0
+
+
+async def run():
+    seed(engine, 1, 1, args.patients)
+    with engine.begin() as conn:
+        conn.execute(update(User).values(hashed_password=hashing.get_pwd_context().hash(PASSWORD)))
+    tokens = [create_access_token({"sub": f"user{1 + i}", "role": "patient"}) for i in range(args.patients)]
+
+    def other(client, i):
+        return client.get("/patients/me", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+
+    def login(client, i):
+        return client.post("/auth/login", json={"username_or_email": f"user{1 + i % args.patients}", "password": PASSWORD})
+
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(summarize("patients/me idle", *await fire(client, args.other_requests, args.other_concurrency, other)))
+            (login_lat, login_elapsed), (other_lat, other_elapsed) = await asyncio.gather(
+                fire(client, args.logins, args.login_concurrency, login),
+                fire(client, args.other_requests, args.other_concurrency, other),
+            )
+            print(summarize("auth/login burst", login_lat, login_elapsed))
+            print(summarize("patients/me during burst", other_lat, other_elapsed))
+            print(hashing.stats())
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,127 @@
+# benchmarks/polling.py
+"""
+The apps' polling loop against the response cache: each simulated client (a patient or a
+doctor) requests its read-mostly endpoints over and over through the ASGI app in-process.
+
+  uncached     response cache off (max_size 0): every poll runs the handler
+  cached       polls after the first are answered from the cache
+  revalidated  as cached, sending If-None-Match: the answer is an empty 304
+
+Reports requests per second, latency and SQL statements per request, and exits non-zero
+if a poll answered from the cache reaches the database.
+
+    python benchmarks/polling.py --out polling.json
+    python benchmarks/polling.py --compare polling.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--clients", type=int, default=50, help="patients and doctors polling, half each")
+parser.add_argument("--rounds", type=int, default=20, help="polls of every endpoint per client")
+parser.add_argument("--appointments", type=int, default=10, help="upcoming appointments per patient")
+
+import report
+
+report.add_arguments(parser)
+args = parser.parse_args()
+
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(tempfile.mkdtemp()) / 'polling.db'}"
+# entries must outlive the run; invalidation is exercised by the smoke tests, not here
+os.environ["RESPONSE_CACHE_TTL_SECONDS"] = "3600"
+
+from seed import seed
+
+import httpx
+from sqlalchemy import event
+
+import main
+from modules.core.db import engine, async_engine
+from modules.core.response_cache import response_cache
+from modules.auth.security import create_access_token
+
+N_DOCTORS = max(args.clients // 2, 1)
+N_PATIENTS = max(args.clients - N_DOCTORS, 1)
+ENDPOINTS = {
+    "patient": ["/auth/profile", "/patients/me", "/appointments/patient"],
+    "doctor": ["/auth/profile", "/doctors/me/slots", "/appointments/doctor"],
+}
+
+
+async def poll(client, variant: str) -> dict:
+    response_cache.clear()
+    response_cache.max_size = 0 if variant == "uncached" else 10000
+    clients = [("doctor", f"user{i}") for i in range(N_DOCTORS)] + \
+              [("patient", f"user{N_DOCTORS + i}") for i in range(N_PATIENTS)]
+    headers = {sub: {"Authorization": "Bearer " + create_access_token({"sub": sub, "role": role})} for role, sub in clients}
+    etags = {}
+    for role, sub in clients:  # warm principal and response caches
+        for path in ENDPOINTS[role]:
+            r = await client.get(path, headers=headers[sub])
+            assert r.status_code == 200, (path, r.text)
+            etags[sub, path] = r.headers["etag"]
+
+    statements = 0
+
+    def before_cursor_execute(*_):
+        nonlocal statements
+        statements += 1
+
+    samples = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    t0 = time.perf_counter()
+    try:
+        for _ in range(args.rounds):
+            for role, sub in clients:
+                for path in ENDPOINTS[role]:
+                    request_headers = headers[sub]
+                    if variant == "revalidated":
+                        request_headers = {**request_headers, "If-None-Match": etags[sub, path]}
+                    start = time.perf_counter()
+                    r = await client.get(path, headers=request_headers)
+                    samples.append(time.perf_counter() - start)
+                    assert r.status_code == (304 if variant == "revalidated" else 200), (path, r.status_code)
+    finally:
+        elapsed = time.perf_counter() - t0
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return {
+        "rps": round(len(samples) / elapsed, 1),
+        **report.percentiles(samples, 1000, "ms"),
+        "statements_per_request": round(statements / len(samples), 2),
+    }
+
+
+async def run() -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for variant in ("uncached", "cached", "revalidated"):
+                results[variant] = await poll(client, variant)
+    finally:
+        await async_engine.dispose()
+    return results
+
+
+def benchmark():
+    seed(engine, N_DOCTORS, 20, N_PATIENTS, args.appointments)
+    results = asyncio.run(run())
+    failures = [name for name in ("cached", "revalidated") if results[name]["statements_per_request"] > 0]
+    for name in ("cached", "revalidated"):
+        print(f"{'FAIL' if name in failures else 'ok  '} {name}: no SQL per poll")
+    code = report.finish(args, {
+        "meta": report.meta(benchmark="polling", clients=args.clients, rounds=args.rounds),
+        "results": results,
+    })
+    return code or (1 if failures else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(benchmark())
@@ -0,0 +1,140 @@
+# benchmarks/report.py
+"""
+JSON baselines for the benchmark suite (load_mix.py, micro.py, startup.py).
+
+A report is {"meta": {...}, "results": {name: {metric: value}}}. compare() checks a
+new report against a saved baseline and lists every metric that got worse by more
+than the tolerance; statements per request may not grow by half a statement or more.
+
+    python benchmarks/report.py baseline.json current.json --tolerance 0.15
+
+Baselines are only comparable on the same, otherwise idle machine; raise --tolerance
+on shared or single-core hosts.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# metric name -> True if higher is better. p99 (and p95 of the microsecond-scale micro
+# benchmarks) are reported but not gated on: a handful of samples decide them and they
+# flap between identical runs.
+DIRECTIONS = {
+    "rps": True,
+    "ops_per_sec": True,
+    "rows_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "mean_us": False,
+    "p50_us": False,
+    "error_rate": False,
+    "statements_per_request": False,
+    "import_ms": False,
+    "first_response_ms": False,
+}
+# compared in absolute terms: averages move a little with cache warm-up, an N+1 adds a whole statement
+ABSOLUTE_SLACK = {"statements_per_request": 0.5}
+
+
+def percentiles(samples: list[float], scale: float, unit: str) -> dict:
+    """p50/p95/p99 (and mean) of samples in seconds, scaled to `unit` ("ms" or "us")."""
+    samples = sorted(samples)
+
+    def pick(q):
+        return round(samples[min(int(len(samples) * q), len(samples) - 1)] * scale, 2)
+
+    return {
+        f"mean_{unit}": round(statistics.fmean(samples) * scale, 2),
+        f"p50_{unit}": pick(0.50),
+        f"p95_{unit}": pick(0.95),
+        f"p99_{unit}": pick(0.99),
+    }
+
+
+def meta(**extra) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        **extra,
+    }
+
+
+def write(path: str, report: dict):
+    Path(path).write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def load(path: str) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.15) -> list[str]:
+    """Regressions of `current` against `baseline`, one line each (empty list: none)."""
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            regressions.append(f"{name}: missing from current run")
+            continue
+        for metric, higher_is_better in DIRECTIONS.items():
+            if metric not in base or metric not in now:
+                continue
+            old, new = base[metric], now[metric]
+            if metric in ABSOLUTE_SLACK:
+                worse = new >= old + ABSOLUTE_SLACK[metric]
+            elif higher_is_better:
+                worse = new < old * (1 - tolerance)
+            else:
+                # small absolute floors keep near-zero values (error_rate 0 -> 0.001) meaningful
+                worse = new > old * (1 + tolerance) and new - old > 0.01
+            if worse:
+                change = f"{(new - old) / old:+.0%}" if old else "new"
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change})")
+    return regressions
+
+
+def print_compare(baseline_path: str, current: dict, tolerance: float) -> int:
+    """Print the comparison and return a process exit code (1 on regression)."""
+    regressions = compare(load(baseline_path), current, tolerance)
+    if regressions:
+        print(f"REGRESSIONS vs {baseline_path} (tolerance {tolerance:.0%}):")
+        for line in regressions:
+            print("  " + line)
+        return 1
+    print(f"no regressions vs {baseline_path} (tolerance {tolerance:.0%})")
+    return 0
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--out", help="write the results as a JSON baseline to this path")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a saved baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+
+
+def finish(args, report: dict) -> int:
+    print(json.dumps(report["results"], indent=2))
+    if args.out:
+        write(args.out, report)
+        print(f"baseline written to {args.out}")
+    if args.compare:
+        return print_compare(args.compare, report, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    sys.exit(print_compare(args.baseline, load(args.current), args.tolerance))
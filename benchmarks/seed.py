@@ -0,0 +1,110 @@
+# benchmarks/seed.py
+"""
+Shared setup for the benchmark scripts: environment defaults, engine creation and
+bulk seeding of users/doctors/patients/slots/appointments.
+
+Importing this module first makes the app modules importable without a .env file.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("AGORA_APP_ID", "bench-app-id")
+os.environ.setdefault("AGORA_APP_CERTIFICATE", "bench-app-certificate")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from modules.core.db import Base
+from modules.users.models import User
+from modules.patients.models import Patient
+from modules.doctors.models import Doctor, DoctorSlot
+from modules.appointments.models import Appointment
+from modules.infections.models import InfectionRecord
+import modules.jobs.models  # noqa: F401
+import modules.exports.models  # noqa: F401
+from modules.doctors import availability_summary
+
+SPECIALIZATIONS = ["dermatology", "allergy", "cosmetic", "pediatric"]
+
+
+def make_engine(url: str | None = None, name: str = "bench"):
+    """Engine for `url`, or a throwaway SQLite file when no URL is given."""
+    if not url:
+        path = Path(tempfile.mkdtemp()) / f"{name}.db"
+        url = f"sqlite:///{path}"
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+    return create_engine(url, pool_size=32, max_overflow=32)
+
+
+def seed(engine, n_doctors: int, slots_per_doctor: int, n_patients: int, appointments_per_patient: int = 0,
+         infections_per_patient: int = 0):
+    """Recreate all tables and bulk insert a synthetic dataset.
+
+    Slots start one hour from now in 30 minute steps. Appointments (if any) are spread
+    over past and future slots and mark those slots booked. Infection records (if any)
+    are finished diagnoses, one per patient per hour going back from now.
+    """
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = datetime.utcnow() + timedelta(hours=1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i + 1, "username": f"user{i}", "email": f"user{i}@bench.local",
+             "hashed_password": "x", "role": "doctor" if i < n_doctors else "patient"}
+            for i in range(n_doctors + n_patients)
+        ])
+        conn.execute(insert(Doctor), [
+            {"id": i + 1, "user_id": i + 1, "specialization": SPECIALIZATIONS[i % len(SPECIALIZATIONS)]}
+            for i in range(n_doctors)
+        ])
+        conn.execute(insert(Patient), [
+            {"id": i + 1, "user_id": n_doctors + i + 1} for i in range(n_patients)
+        ])
+
+        booked = {}
+        slot_id = 0
+        for p in range(n_patients):
+            for a in range(appointments_per_patient):
+                slot_id += 1
+                booked[slot_id] = p + 1
+
+        slots = []
+        for d in range(n_doctors):
+            for s in range(slots_per_doctor):
+                slots.append({
+                    "id": len(slots) + 1,
+                    "doctor_id": d + 1,
+                    "start_datetime": start + timedelta(minutes=30 * s),
+                    "end_datetime": start + timedelta(minutes=30 * (s + 1)),
+                    "is_booked": len(slots) + 1 in booked,
+                })
+        conn.execute(insert(DoctorSlot), slots)
+
+        if booked:
+            conn.execute(insert(Appointment), [
+                {"patient_id": patient_id, "doctor_id": slots[sid - 1]["doctor_id"], "slot_id": sid,
+                 "status": "scheduled", "scheduled_at": slots[sid - 1]["start_datetime"],
+                 "channel_name": f"appt_bench_{sid}"}
+                for sid, patient_id in booked.items()
+            ])
+
+        if infections_per_patient:
+            now = datetime.utcnow()
+            conn.execute(insert(InfectionRecord), [
+                {"patient_id": p + 1, "image_url": f"/media/bench/{p}-{i}.png", "status": "done",
+                 "ai_response": {"diagnosis": "Possible fungal infection", "confidence": 0.86},
+                 "diagnosis": "Possible fungal infection", "confidence": 0.86, "recommended_consultation": True,
+                 "created_at": now - timedelta(hours=i), "completed_at": now - timedelta(hours=i),
+                 "updated_at": now - timedelta(hours=i)}
+                for p in range(n_patients) for i in range(infections_per_patient)
+            ])
+
+    # derived table the app maintains on every slot write
+    with Session(engine) as db:
+        availability_summary.refresh(db)
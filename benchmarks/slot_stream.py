@@ -0,0 +1,216 @@
+# benchmarks/slot_stream.py
+"""
+Live slot availability streams at scale: N concurrent SSE subscribers on one node.
+
+Starts the app under uvicorn in this process (lifespan included, so the slot event tail
+loop runs), opens --subscribers raw HTTP connections split between doctor streams
+(/doctors/{id}/slots/stream) and specialization streams, then creates and books slots
+at --rate changes per second through the crud functions (as another worker process
+would) and times every delivery from commit to the subscriber reading the frame.
+
+Reports connect time, memory per open stream, delivery latency p50/p95/p99 over all
+subscriber deliveries, delivered vs expected frames, and the polling load the streams
+replace (subscribers / --poll-interval requests per second; the streams cost one tail
+query per change and process).
+
+    python benchmarks/slot_stream.py --subscribers 5000 --changes 40
+    python benchmarks/slot_stream.py --subscribers 500 --out slot_stream.json
+    python benchmarks/slot_stream.py --compare slot_stream.json
+
+Clients and server share one event loop (and one core here), so latencies include the
+clients' own parsing; run the clients from another machine for server-only numbers.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import tempfile
+import time
+from pathlib import Path
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--subscribers", type=int, default=5000)
+parser.add_argument("--doctors", type=int, default=50)
+parser.add_argument("--changes", type=int, default=40, help="slot changes to stream (half created, half booked)")
+parser.add_argument("--rate", type=float, default=10, help="changes per second")
+parser.add_argument("--connect-batch", type=int, default=250, help="connections opened at a time")
+parser.add_argument("--poll-interval", type=float, default=2, help="client poll interval the streams replace")
+
+import report
+
+report.add_arguments(parser)
+args = parser.parse_args()
+
+workdir = Path(tempfile.mkdtemp())
+os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'slot_stream.db'}"
+os.environ.setdefault("DB_SCHEMA_MODE", "off")
+os.environ.setdefault("AGORA_PREMINT_ENABLED", "false")
+os.environ.setdefault("JOBS_WORKER_ENABLED", "false")
+os.environ.setdefault("SLOT_EVENTS_QUEUE_SIZE", str(max(256, args.changes * 2)))
+
+from seed import seed, make_engine, SPECIALIZATIONS
+
+import uvicorn
+
+import main as app_main
+from modules.auth.security import create_access_token
+from sqlalchemy import event
+
+from modules.core.db import SessionLocal, async_engine
+from modules.doctors import crud as doctor_crud, slot_events
+from modules.appointments import crud as appt_crud
+
+N_PATIENTS = 10
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Subscriber:
+    def __init__(self, path: str):
+        self.path = path
+        self.received = {}  # event id -> perf_counter when read
+        self.ready = asyncio.Event()
+
+    async def run(self, port: int, token: str):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"GET {self.path} HTTP/1.1\r\nHost: bench\r\nAuthorization: Bearer {token}\r\n"
+            f"Accept: text/event-stream\r\n\r\n".encode()
+        )
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise RuntimeError(f"{self.path}: {status!r}")
+        event_id = None
+        try:
+            # chunked body: chunk-size lines interleave with the frame lines, which is fine here
+            while line := await reader.readline():
+                if line.startswith(b"id: "):
+                    event_id = int(line[4:])
+                elif line.startswith(b"event: slot."):
+                    self.received[event_id] = time.perf_counter()
+                elif line.startswith((b"event: snapshot", b"event: ready")):
+                    self.ready.set()
+        finally:
+            writer.close()
+
+
+def make_change(i: int, start) -> tuple[int, int, float]:
+    """One slot change through the crud layer; (doctor id, its event id, commit time)."""
+    from datetime import timedelta
+
+    with SessionLocal() as db:
+        committed_at = []
+        event.listen(db, "after_commit", lambda session: committed_at.append(time.perf_counter()))
+        if i % 2 == 0:
+            doctor_id = i // 2 % args.doctors + 1
+            slot_start = start + timedelta(days=30, minutes=30 * i)
+            doctor_crud.create_slot(db, doctor_id, slot_start, slot_start + timedelta(minutes=30))
+        else:
+            appt = appt_crud.book_earliest_slot_across_doctors(db, patient_id=i % N_PATIENTS + 1)
+            doctor_id = appt.doctor_id
+        return doctor_id, slot_events.latest_event_id(db), committed_at[0]
+
+
+async def run() -> dict:
+    from datetime import datetime, timezone
+
+    seed(make_engine(os.environ["DATABASE_URL"]), args.doctors, 20, N_PATIENTS)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app_main.app, port=port, log_level="warning", backlog=4096))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    token = create_access_token({"sub": f"user{args.doctors}", "role": "patient"})
+    subscribers = []
+    for i in range(args.subscribers):
+        if i % 2 == 0:
+            path = f"/doctors/{i // 2 % args.doctors + 1}/slots/stream"
+        else:
+            path = f"/doctors/specializations/{SPECIALIZATIONS[i // 2 % len(SPECIALIZATIONS)]}/slots/stream"
+        subscribers.append(Subscriber(path))
+
+    rss_before = rss_kb()
+    t0 = time.perf_counter()
+    tasks = []
+    for batch in range(0, len(subscribers), args.connect_batch):
+        group = subscribers[batch:batch + args.connect_batch]
+        tasks += [asyncio.create_task(s.run(port, token)) for s in group]
+        await asyncio.wait_for(asyncio.gather(*(s.ready.wait() for s in group)), 60)
+    connect_s = time.perf_counter() - t0
+    rss_per_stream = (rss_kb() - rss_before) / len(subscribers)
+
+    # who should get what: doctor streams by doctor id, specialization streams by name
+    by_path = {}
+    for s in subscribers:
+        by_path[s.path] = by_path.get(s.path, 0) + 1
+    start = datetime.now(timezone.utc)
+    committed = {}  # event id -> (commit time, expected deliveries)
+    loop = asyncio.get_running_loop()
+    for i in range(args.changes):
+        began = time.perf_counter()
+        doctor_id, event_id, committed_at = await loop.run_in_executor(None, make_change, i, start)
+        specialization = SPECIALIZATIONS[(doctor_id - 1) % len(SPECIALIZATIONS)]
+        expected = by_path.get(f"/doctors/{doctor_id}/slots/stream", 0) + \
+            by_path.get(f"/doctors/specializations/{specialization}/slots/stream", 0)
+        committed[event_id] = (committed_at, expected)
+        await asyncio.sleep(max(0.0, 1 / args.rate - (time.perf_counter() - began)))
+
+    expected_total = sum(e for _, e in committed.values())
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline:
+        delivered = sum(1 for s in subscribers for eid in s.received if eid in committed)
+        if delivered >= expected_total:
+            break
+        await asyncio.sleep(0.2)
+
+    latencies = [
+        at - committed[eid][0]
+        for s in subscribers for eid, at in s.received.items() if eid in committed
+    ]
+    hub_stats = slot_events.hub.stats()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    server.should_exit = True
+    await server_task
+    await async_engine.dispose()
+
+    return {
+        "subscribers": args.subscribers,
+        "changes": args.changes,
+        "connect_s": round(connect_s, 2),
+        "rss_kb_per_stream": round(rss_per_stream, 1),
+        "deliveries_expected": expected_total,
+        "deliveries": len(latencies),
+        "lagged_streams": hub_stats["lagged"],
+        **(report.percentiles(latencies, 1000, "ms") if latencies else {}),
+        "polling_requests_per_sec_replaced": round(args.subscribers / args.poll_interval, 1),
+    }
+
+
+def main():
+    results = asyncio.run(run())
+    ok = results["deliveries"] == results["deliveries_expected"]
+    print(f"{'ok  ' if ok else 'FAIL'} every subscriber got every change for its topic")
+    code = report.finish(args, {"meta": report.meta(subscribers=args.subscribers, changes=args.changes),
+                                "results": {"slot_stream": results}})
+    return code or (0 if ok else 1)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
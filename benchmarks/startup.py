@@ -0,0 +1,141 @@
+# benchmarks/startup.py
+"""
+Worker startup time, checked against a budget (startup_budget.json).
+
+  import_ms           `python -X importtime -c "import main"` in a fresh interpreter:
+                      cumulative import time of the app module
+  first_response_ms   spawn `uvicorn main:app` against a migrated SQLite database and
+                      poll GET /docs until it answers: process start, imports, lifespan
+                      (schema revision check) and the first request
+
+Both are medians over --repeat fresh processes. The budget also lists third-party
+modules that must not be imported at startup (they are loaded on first use).
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --out startup.json
+    python benchmarks/startup.py --compare startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import report
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET = Path(__file__).resolve().parent / "startup_budget.json"
+
+
+def app_env(workdir: Path) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{workdir / 'startup.db'}",
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_DIR": str(workdir / "media"),
+        "PYTHONDONTWRITEBYTECODE": "",
+    })
+    env.setdefault("AGORA_APP_ID", "bench-app-id")
+    env.setdefault("AGORA_APP_CERTIFICATE", "bench-app-certificate")
+    env.pop("ASYNC_DATABASE_URL", None)
+    return env
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """module -> cumulative microseconds, from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative_us)
+    return modules
+
+
+def measure_import(env: dict) -> dict[str, int]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return parse_importtime(result.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(env: dict, timeout: float = 60.0) -> float:
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited during startup:\n{proc.stderr.read()}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1) as r:
+                    if r.status == 200:
+                        return time.perf_counter() - t0
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError("server did not answer within the timeout")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per measurement; the median is kept")
+    parser.add_argument("--budget", default=str(BUDGET), help="budget file (default benchmarks/startup_budget.json)")
+    parser.add_argument("--top", type=int, default=10, help="print the slowest top-level imports")
+    report.add_arguments(parser)
+    args = parser.parse_args()
+    budget = json.loads(Path(args.budget).read_text())
+
+    workdir = Path(tempfile.mkdtemp())
+    env = app_env(workdir)
+    # the app refuses to start on an unmigrated database (DB_SCHEMA_MODE=check)
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, env=env,
+                   capture_output=True, check=True)
+
+    imports = [measure_import(env) for _ in range(args.repeat)]
+    first_responses = [measure_first_response(env) for _ in range(args.repeat)]
+
+    last = imports[-1]
+    slowest = sorted(((us, name) for name, us in last.items() if name.split(".")[0] == name and name != "main"),
+                     reverse=True)[:args.top]
+    print("slowest top-level imports (cumulative ms):")
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f}  {name}")
+
+    results = {"startup": {
+        "import_ms": round(statistics.median(run["main"] for run in imports) / 1000, 1),
+        "first_response_ms": round(statistics.median(first_responses) * 1000, 1),
+    }}
+    failures = [
+        f"{metric} {results['startup'][metric]} > budget {limit}"
+        for metric, limit in budget["max_ms"].items()
+        if results["startup"][metric] > limit
+    ]
+    failures += [f"{module} imported at startup" for module in budget["lazy_modules"] if module in last]
+    for line in failures:
+        print("OVER BUDGET: " + line)
+
+    code = report.finish(args, {
+        "meta": report.meta(benchmark="startup", repeat=args.repeat),
+        "results": results,
+    })
+    return 1 if failures else code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# benchmarks/users_listing.py
+"""
+Memory and latency of the admin user listings: the old full-table ORM load versus
+keyset pages of projected rows and the NDJSON export.
+
+For each table size it reports wall time and the tracemalloc peak of
+  legacy  get_all_users() + UserOut serialization of every row
+  first   get_users_page() for the first page
+  deep    get_users_page() for a page near the end of the table
+  export  iter_users() serialized as NDJSON lines (discarded as they are produced)
+
+    python benchmarks/users_listing.py
+    python benchmarks/users_listing.py --sizes 10000 100000 1000000 --legacy-max 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from seed import make_engine
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from modules.core.db import Base
+from modules.users.models import User
+from modules.users import crud, schemas
+import modules.patients.models  # noqa: F401
+import modules.doctors.models  # noqa: F401
+
+ROLES = ["patient", "patient", "patient", "doctor", "admin"]
+
+
+def seed_users(engine, n, chunk=50_000):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for lo in range(0, n, chunk):
+            conn.execute(insert(User), [
+                {"id": i + 1, "username": f"user{i}", "email": f"user{i}@example.com",
+                 "phone_number": None, "hashed_password": "$2b$12$" + "x" * 53, "role": ROLES[i % len(ROLES)]}
+                for i in range(lo, min(n, lo + chunk))
+            ])
+
+
+def measure(Session, fn):
+    """(seconds, peak MiB) of fn(db); timed and traced in separate runs so tracing doesn't skew latency."""
+    with Session() as db:
+        t0 = time.perf_counter()
+        fn(db)
+        elapsed = time.perf_counter() - t0
+    with Session() as db:
+        tracemalloc.start()
+        fn(db)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def legacy(db):
+    return [schemas.UserOut.model_validate(u).model_dump() for u in crud.get_all_users(db)]
+
+
+def export(db):
+    n = 0
+    for row in crud.iter_users(db):
+        n += len(json.dumps(row._asdict())) + 1
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="database URL (default: throwaway SQLite file)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="skip the full ORM load above this many rows")
+    args = parser.parse_args()
+
+    engine = make_engine(args.url, "users_listing")
+    Session = sessionmaker(bind=engine)
+
+    print(f"{'rows':>9} {'case':<7} {'ms':>10} {'peak MiB':>9}")
+    for n in args.sizes:
+        seed_users(engine, n)
+        cases = {
+            "first": lambda db: crud.get_users_page(db, None, args.limit),
+            "deep": lambda db: crud.get_users_page(db, n - args.limit * 2, args.limit),
+            "export": export,
+        }
+        if n <= args.legacy_max:
+            cases = {"legacy": legacy, **cases}
+        for name, fn in cases.items():
+            seconds, peak = measure(Session, fn)
+            print(f"{n:>9} {name:<7} {seconds * 1000:>10.1f} {peak:>9.2f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,68 @@
 # main.py
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
-from modules.core.db import engine, Base
+from fastapi.staticfiles import StaticFiles
+from modules.core.db import engine, async_engine
+from modules.core import storage, metrics, agora_utils, migrations, response_cache
+from modules.auth import hashing
+from modules.auth.principal_cache import principal_cache
+from modules.infections import inference
+from modules.infections.diagnosis_cache import diagnosis_cache
 from modules.auth import routes as auth_routes
 from modules.users import routes as user_routes
 from modules.patients import routes as patient_routes
 from modules.doctors import routes as doctor_routes
 from modules.appointments import routes as appointment_routes
 from modules.infections import routes as infection_routes
+from modules.video import routes as video_routes
+from modules.jobs import routes as job_routes
+from modules.exports import routes as export_routes
+from modules.jobs import worker as job_worker
+from modules.appointments import token_prefetch, hold_sweeper
+from modules.doctors import availability, availability_summary, slot_events
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema is owned by Alembic; only the revision is checked here (see DB_SCHEMA_MODE)
+    await migrations.prepare_schema(async_engine)
+    tasks = []
+    if token_prefetch.AGORA_PREMINT_ENABLED:
+        tasks.append(asyncio.create_task(token_prefetch.run_premint_loop()))
+    if availability_summary.AVAILABILITY_SUMMARY_REFRESH_ENABLED:
+        tasks.append(asyncio.create_task(availability_summary.run_refresh_loop()))
+    if hold_sweeper.HOLD_SWEEPER_ENABLED:
+        tasks.append(asyncio.create_task(hold_sweeper.run_sweep_loop()))
+    if slot_events.SLOT_EVENTS_ENABLED:
+        tasks.append(asyncio.create_task(slot_events.run_tail_loop()))
+    if job_worker.JOBS_WORKER_ENABLED:
+        tasks.append(asyncio.create_task(job_worker.run_workers()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
 
-app = FastAPI(title="DermaAI Backend")
+app = FastAPI(title="DermaAI Backend", lifespan=lifespan)
+
+if response_cache.RESPONSE_CACHE_ENABLED:
+    # added before MetricsMiddleware, so it runs inside it and cache hits are measured too
+    app.add_middleware(response_cache.ResponseCacheMiddleware)
+
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "sync")
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    metrics.register_stats("principal_cache", principal_cache.stats)
+    metrics.register_stats("password_pool", hashing.stats)
+    metrics.register_stats("diagnosis_cache", diagnosis_cache.stats)
+    metrics.register_stats("agora_token_cache", agora_utils.token_cache.stats)
+    metrics.register_stats("inference", inference.service_stats)
+    metrics.register_stats("availability_index", availability.availability_index.stats)
+    metrics.register_stats("jobs", job_worker.stats)
+    metrics.register_stats("slot_events", slot_events.stats)
+    metrics.register_stats("response_cache", response_cache.response_cache.stats)
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics.router)
 
 app.include_router(auth_routes.router)
 app.include_router(user_routes.router)
@@ -18,3 +70,10 @@ app.include_router(patient_routes.router)
 app.include_router(doctor_routes.router)
 app.include_router(appointment_routes.router)
 app.include_router(infection_routes.router)
+app.include_router(video_routes.router)
+app.include_router(job_routes.router)
+app.include_router(export_routes.router)
+
+# serve locally stored images when not using Cloudinary
+if storage.STORAGE_BACKEND == "local":
+    app.mount(storage.STORAGE_PUBLIC_BASE_URL, StaticFiles(directory=storage.STORAGE_LOCAL_DIR, check_dir=False), name="media")
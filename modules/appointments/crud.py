@@ -1,64 +1,286 @@
 # modules/appointments/crud.py
-from sqlalchemy.orm import Session
+from sqlalchemy import update, select, delete, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, selectinload, raiseload
 from modules.doctors.models import Doctor, DoctorSlot
-from modules.appointments.models import Appointment
+from modules.patients.models import Patient
+from modules.users.models import User  # noqa: F401  (the loading plans below join Patient.user / Doctor.user)
+from modules.appointments.models import Appointment, SlotHold
 from modules.doctors import crud as doctor_crud
-from modules.core import agora_utils
-from datetime import datetime
+from modules.doctors.availability import availability_index, index_active
+from modules.doctors import slot_events, availability_summary
+from modules.core.response_cache import response_cache
+from collections import defaultdict
+from datetime import datetime, timedelta
+import os
 import uuid
 
-def book_earliest_slot_across_doctors(db: Session, patient_id: int, preferred_specialization: str | None = None):
+# how long a held slot stays reserved without confirmation
+SLOT_HOLD_TTL_SECONDS = int(os.getenv("SLOT_HOLD_TTL_SECONDS", "120"))
+
+def _earliest_free_slot_query(db: Session, now: datetime, preferred_specialization: str | None = None, exclude_ids: list[int] | None = None):
+    """Globally earliest unbooked future slot, optionally limited to one specialization."""
+    query = db.query(DoctorSlot).filter(DoctorSlot.is_booked == False, DoctorSlot.start_datetime >= now)
+    if exclude_ids:
+        query = query.filter(DoctorSlot.id.notin_(exclude_ids))
+    if preferred_specialization:
+        query = query.join(Doctor, Doctor.id == DoctorSlot.doctor_id).filter(Doctor.specialization == preferred_specialization)
+    return (
+        query.order_by(DoctorSlot.start_datetime, DoctorSlot.doctor_id, DoctorSlot.id)
+        # lock only the slot row; rows held by concurrent bookings are skipped, not waited on
+        .with_for_update(skip_locked=True, of=DoctorSlot)
+        .limit(1)
+    )
+
+def _claim_slot(db: Session, slot_id: int) -> bool:
+    """Flip is_booked only if nobody else did first. Guards backends without row locks (SQLite)."""
+    result = db.execute(
+        update(DoctorSlot)
+        .where(DoctorSlot.id == slot_id, DoctorSlot.is_booked == False)
+        .values(is_booked=True)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+class HoldNotFound(LookupError):
+    pass
+
+class HoldExpired(Exception):
+    pass
+
+def _new_appointment(patient_id: int, doctor_id: int, slot_id: int, scheduled_at: datetime):
+    # Agora channel; tokens are minted by the token cache when the call nears
+    return Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        slot_id=slot_id,
+        scheduled_at=scheduled_at,
+        status="scheduled",
+        channel_name=f"appt_{uuid.uuid4().hex[:8]}",
+    )
+
+def _reserve_earliest(db: Session, make_row, preferred_specialization: str | None, use_index: bool):
     """
-    Booking algorithm:
-    - get doctors (optionally filtered by specialization) ordered by ID (sequential).
-    - for each doctor: find the earliest unbooked slot (start >= now).
-    - reserve the first found slot by setting is_booked True and creating an Appointment.
-    NOTE: This is a simple approach. For concurrency use DB-level locks or SELECT ... FOR UPDATE.
+    Claim the globally earliest free slot and commit `make_row(doctor_id, slot_id, start)`,
+    the slot's `booked` event and the doctor's availability summary in the same short
+    transaction (conditional UPDATEs + INSERTs).
+
+    - with the availability index built, the candidate comes from its heaps in O(log n);
+      if the index has nothing, the database query below runs (slots may have been added
+      by another worker).
+    - otherwise one query picks the earliest unbooked slot (start >= now), optionally
+      filtered by doctor specialization, locking it with FOR UPDATE SKIP LOCKED so
+      concurrent patients get different slots instead of queuing on the same row.
+    - the slot is claimed with a conditional UPDATE (is_booked False -> True); a lost race
+      (or a unique-constraint violation from another node) retries without that slot.
     """
     now = datetime.utcnow()
-    query = db.query(Doctor)
-    if preferred_specialization:
-        query = query.filter(Doctor.specialization == preferred_specialization)
-    doctors = query.order_by(Doctor.id).all()
-
-    for doc in doctors:
-        # find earliest unbooked slot for this doctor
-        slot = (
-            db.query(DoctorSlot)
-            .filter(DoctorSlot.doctor_id == doc.id, DoctorSlot.is_booked == False, DoctorSlot.start_datetime >= now)
-            .order_by(DoctorSlot.start_datetime)
-            .with_for_update()  # try to lock row where supported
-            .first()
-        )
-        if slot:
-            slot.is_booked = True
-            # generate Agora channel
-            channel_name = f"appt_{uuid.uuid4().hex[:8]}"
-            patient_token = agora_utils.generate_agora_token(channel_name, patient_id)
-            doctor_token = agora_utils.generate_agora_token(channel_name, doc.id)
-
-            appt = Appointment(
-                patient_id=patient_id,
-                doctor_id=doc.id,
-                slot_id=slot.id,
-                scheduled_at=slot.start_datetime,
-                status="scheduled",
-                channel_name=channel_name,
-                agora_token=patient_token  # store one token or generate fresh on request
-            )
-            db.add(appt)
+    if index_active(use_index):
+        while True:
+            candidate = availability_index.take_earliest(now, preferred_specialization)
+            if candidate is None:
+                break
+            doctor_id, slot_id, start, end = candidate
+            if not _claim_slot(db, slot_id):
+                # booked by another worker process; it is already out of the index
+                db.rollback()
+                continue
+            try:
+                row = make_row(doctor_id, slot_id, start)
+                db.add(row)
+                slot_events.record(db, "booked", [(doctor_id, start, slot_id, end)])
+                availability_summary.slot_taken(db, doctor_id, start)
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                continue
+            except Exception:
+                db.rollback()
+                availability_index.add_slots(doctor_id, [(start, slot_id, end)])
+                raise
+            db.refresh(row)
+            response_cache.invalidate(f"doctor:{doctor_id}", f"patient:{row.patient_id}")
+            return row
+
+    lost_slot_ids = []
+    while True:
+        # every lost race excludes one more slot, so this ends once slots run out
+        slot = _earliest_free_slot_query(db, now, preferred_specialization, lost_slot_ids).first()
+        if not slot:
+            db.rollback()
+            return None
+        doctor_id, slot_id, start = slot.doctor_id, slot.id, slot.start_datetime
+        if not _claim_slot(db, slot_id):
+            lost_slot_ids.append(slot_id)
+            db.rollback()
+            continue
+        try:
+            row = make_row(doctor_id, slot_id, start)
+            db.add(row)
+            slot_events.record(db, "booked", [(doctor_id, start, slot_id, slot.end_datetime)])
+            availability_summary.slot_taken(db, doctor_id, start)
             db.commit()
-            db.refresh(appt)
-            return appt
-    return None
+        except IntegrityError:
+            lost_slot_ids.append(slot_id)
+            db.rollback()
+            continue
+        except Exception:
+            db.rollback()
+            raise
+        db.refresh(row)
+        availability_index.remove_slot(doctor_id, slot_id, start)
+        response_cache.invalidate(f"doctor:{doctor_id}", f"patient:{row.patient_id}")
+        return row
+
+def book_earliest_slot_across_doctors(db: Session, patient_id: int, preferred_specialization: str | None = None, use_index: bool = True, on_booked=None):
+    """
+    One-step booking: reserve the earliest free slot and create its Appointment.
+    `on_booked(appt)` runs before the commit, so rows it changes (e.g. linking the
+    appointment from another table) commit in the same transaction; if it raises, the
+    booking is rolled back (the slot stays free) and the exception propagates.
+    """
+    def make_row(doctor_id, slot_id, start):
+        appt = _new_appointment(patient_id, doctor_id, slot_id, start)
+        if on_booked:
+            on_booked(appt)
+        return appt
+
+    return _reserve_earliest(db, make_row, preferred_specialization, use_index)
+
+# ---------------- Holds (two-phase booking) ----------------
+
+def hold_earliest_slot(db: Session, patient_id: int, preferred_specialization: str | None = None, use_index: bool = True):
+    """Phase 1: reserve the earliest free slot for SLOT_HOLD_TTL_SECONDS. Returns (hold, slot) or None."""
+    expires_at = datetime.utcnow() + timedelta(seconds=SLOT_HOLD_TTL_SECONDS)
+    hold = _reserve_earliest(
+        db, lambda doctor_id, slot_id, start: SlotHold(slot_id=slot_id, patient_id=patient_id, expires_at=expires_at),
+        preferred_specialization, use_index,
+    )
+    if hold is None:
+        return None
+    return hold, db.get(DoctorSlot, hold.slot_id)
+
+def confirm_hold(db: Session, hold_id: int, patient_id: int):
+    """Phase 2: turn an unexpired hold into an Appointment (hold delete + insert, one transaction)."""
+    hold = db.get(SlotHold, hold_id)
+    if not hold or hold.patient_id != patient_id:
+        raise HoldNotFound(hold_id)
+    slot = db.get(DoctorSlot, hold.slot_id)
+    # conditional delete: loses cleanly against the sweeper once the hold has expired
+    result = db.execute(
+        delete(SlotHold)
+        .where(SlotHold.id == hold_id, SlotHold.expires_at > datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise HoldExpired(hold_id)
+    db.expunge(hold)
+    appt = _new_appointment(patient_id, slot.doctor_id, slot.id, slot.start_datetime)
+    db.add(appt)
+    db.commit()
+    db.refresh(appt)
+    response_cache.invalidate(f"doctor:{appt.doctor_id}", f"patient:{patient_id}")
+    return appt
+
+def _release(db: Session, hold_filter) -> int:
+    """Delete matching holds and free their slots (unless an appointment took the slot)."""
+    slot_ids = db.scalars(delete(SlotHold).where(hold_filter).returning(SlotHold.slot_id)).all()
+    if not slot_ids:
+        db.rollback()
+        return 0
+    released = db.execute(
+        update(DoctorSlot)
+        .where(
+            DoctorSlot.id.in_(slot_ids),
+            DoctorSlot.is_booked == True,
+            ~exists().where(Appointment.slot_id == DoctorSlot.id),
+        )
+        .values(is_booked=False)
+        .returning(DoctorSlot.doctor_id, DoctorSlot.start_datetime, DoctorSlot.id, DoctorSlot.end_datetime)
+        .execution_options(synchronize_session=False)
+    ).all()
+    slot_events.record(db, "released", released)
+    freed = defaultdict(list)
+    for doctor_id, start, _, _ in released:
+        freed[doctor_id].append(start)
+    for doctor_id in sorted(freed):  # one lock order across concurrent releases
+        availability_summary.slots_freed(db, doctor_id, freed[doctor_id])
+    db.commit()
+    for doctor_id, start, slot_id, end in released:
+        availability_index.add_slots(doctor_id, [(start, slot_id, end)])
+    response_cache.invalidate(*(f"doctor:{doctor_id}" for doctor_id in freed))
+    return len(released)
+
+def release_hold(db: Session, hold_id: int, patient_id: int) -> int:
+    """Give a held slot back before its hold expires."""
+    hold = db.get(SlotHold, hold_id)
+    if not hold or hold.patient_id != patient_id:
+        raise HoldNotFound(hold_id)
+    db.expunge(hold)
+    return _release(db, SlotHold.id == hold_id)
+
+def release_expired_holds(db: Session) -> int:
+    """Sweeper: free the slots of every expired hold; returns how many slots were released."""
+    return _release(db, SlotHold.expires_at <= datetime.utcnow())
+
+# ---------------- Loading plans ----------------
+# Each read endpoint gets an explicit set of loader options for exactly what its response
+# touches; raiseload("*") turns any other relationship access into an error instead of a
+# silent per-row lazy load (which would also fail on the async routes after run_sync).
+
+# token check reads appt.patient.user_id / appt.doctor.user_id and the slot end: one row, join all three
+TOKEN_LOAD = (
+    joinedload(Appointment.patient),
+    joinedload(Appointment.doctor),
+    joinedload(Appointment.slot),
+    raiseload("*"),
+)
+# patient's list shows doctor name/specialization: one extra IN query per relationship hop
+PATIENT_LIST_LOAD = (
+    selectinload(Appointment.doctor).joinedload(Doctor.user),
+    raiseload("*"),
+)
+# doctor's list shows patient name
+DOCTOR_LIST_LOAD = (
+    selectinload(Appointment.patient).joinedload(Patient.user),
+    raiseload("*"),
+)
+
+def get_appointment_by_id(db: Session, appointment_id: int):
+    """Appointment with its patient and doctor loaded (callers check both parties' user_id)."""
+    return (
+        db.query(Appointment)
+        .options(*TOKEN_LOAD)
+        .filter(Appointment.id == appointment_id)
+        .first()
+    )
+
+def get_call_parties_starting_between(db: Session, start: datetime, end: datetime):
+    """Rows of (channel_name, patient_user_id, doctor_user_id, ends_at) for scheduled calls starting in [start, end)."""
+    stmt = (
+        select(
+            Appointment.channel_name,
+            Patient.user_id.label("patient_user_id"),
+            Doctor.user_id.label("doctor_user_id"),
+            DoctorSlot.end_datetime.label("ends_at"),
+        )
+        .join(Patient, Patient.id == Appointment.patient_id)
+        .join(Doctor, Doctor.id == Appointment.doctor_id)
+        .join(DoctorSlot, DoctorSlot.id == Appointment.slot_id)
+        .where(Appointment.status == "scheduled", Appointment.channel_name.isnot(None))
+        .where(Appointment.scheduled_at >= start, Appointment.scheduled_at < end)
+    )
+    return db.execute(stmt).all()
 
 # ---------------- Upcoming Appointments ----------------
 
 def get_patient_upcoming_appointments(db: Session, patient_id: int):
-    """Return upcoming appointments for patient sorted by scheduled_at."""
+    """Return upcoming appointments for patient sorted by scheduled_at, doctors preloaded."""
     now = datetime.utcnow()
     return (
         db.query(Appointment)
+        .options(*PATIENT_LIST_LOAD)
         .filter(Appointment.patient_id == patient_id)
         .filter(Appointment.scheduled_at >= now)
         .order_by(Appointment.scheduled_at.asc())
@@ -66,10 +288,11 @@ def get_patient_upcoming_appointments(db: Session, patient_id: int):
     )
 
 def get_doctor_upcoming_appointments(db: Session, doctor_id: int):
-    """Return upcoming appointments for doctor sorted by scheduled_at."""
+    """Return upcoming appointments for doctor sorted by scheduled_at, patients preloaded."""
     now = datetime.utcnow()
     return (
         db.query(Appointment)
+        .options(*DOCTOR_LIST_LOAD)
         .filter(Appointment.doctor_id == doctor_id)
         .filter(Appointment.scheduled_at >= now)
         .order_by(Appointment.scheduled_at.asc())
@@ -0,0 +1,22 @@
+# modules/appointments/hold_sweeper.py
+import asyncio
+import logging
+import os
+from modules.core.db import AsyncSessionLocal
+from modules.appointments import crud as appt_crud
+
+logger = logging.getLogger(__name__)
+
+# one sweeper per deployment is enough: turn it off in all but one process
+HOLD_SWEEPER_ENABLED = os.getenv("HOLD_SWEEPER_ENABLED", "true").lower() == "true"
+SLOT_HOLD_SWEEP_SECONDS = int(os.getenv("SLOT_HOLD_SWEEP_SECONDS", "30"))
+
+async def run_sweep_loop(interval: int = SLOT_HOLD_SWEEP_SECONDS):
+    """Background task started by the app lifespan: release expired slot holds until cancelled."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(appt_crud.release_expired_holds)
+        except Exception:
+            logger.exception("Releasing expired slot holds failed")
+        await asyncio.sleep(interval)
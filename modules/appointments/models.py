@@ -1,5 +1,5 @@
 # modules/appointments/models.py
-from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, JSON
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from modules.core.db import Base
 import datetime
@@ -16,8 +16,24 @@ class Appointment(Base):
 
     # Agora-related fields
     channel_name = Column(String, nullable=True)
-    agora_token = Column(String, nullable=True)
 
     patient = relationship("Patient")
     doctor = relationship("Doctor")
     slot = relationship("DoctorSlot")
+
+    __table_args__ = (
+        # upcoming appointment lists for patients and doctors
+        Index("ix_appointments_patient_scheduled", patient_id, scheduled_at),
+        Index("ix_appointments_doctor_scheduled", doctor_id, scheduled_at),
+        # one appointment per slot, enforced by the database across all workers
+        Index("uq_appointments_slot_id", slot_id, unique=True),
+    )
+
+class SlotHold(Base):
+    """Short-lived reservation of a slot between hold and confirm; swept once expired."""
+    __tablename__ = "slot_holds"
+    id = Column(Integer, primary_key=True, index=True)
+    slot_id = Column(Integer, ForeignKey("doctor_slots.id", ondelete="CASCADE"), unique=True, nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -39,83 +39,182 @@
 
 
 
+import time
+from typing import Literal
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from modules.core.db import get_db
-from modules.auth.security import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_async_db
+from modules.auth.security import get_current_user_async
 from modules.users.models import User
-from modules.appointments.models import Appointment
 from modules.appointments import schemas, crud as appt_crud
 from modules.patients import crud as patient_crud
+from modules.doctors import crud as doctor_crud
+from modules.core import agora_utils
+from modules.core.response_cache import cached, tag
 
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
+# Routes here are async and run the (sync) crud functions on the async session via
+# run_sync, so a request waiting on the database does not hold a threadpool worker.
+
 # ---------------- Book Appointment ----------------
 @router.post("/request", response_model=schemas.AppointmentOut)
-def request_appointment(
+async def request_appointment(
     payload: schemas.AppointmentRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    source: Literal["index", "db"] = "index",
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Only patients can request appointments")
 
-    patient = patient_crud.get_patient_by_user_id(db, current_user.id)
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
 
-    appt = appt_crud.book_earliest_slot_across_doctors(
-        db,
+    appt = await db.run_sync(
+        appt_crud.book_earliest_slot_across_doctors,
         patient.id,
-        preferred_specialization=payload.preferred_specialization
+        preferred_specialization=payload.preferred_specialization,
+        # ?source=db books through the database query instead of the availability index
+        use_index=source == "index",
     )
 
     if not appt:
         raise HTTPException(status_code=404, detail="No available slots found")
     return appt
 
+# ---------------- Holds (two-phase booking) ----------------
+# Hold the earliest slot for SLOT_HOLD_TTL_SECONDS, then confirm it.
+# Unconfirmed holds are released by the sweeper (modules/appointments/hold_sweeper.py).
+
+@router.post("/hold", response_model=schemas.SlotHoldOut)
+async def hold_appointment_slot(
+    payload: schemas.AppointmentRequest,
+    source: Literal["index", "db"] = "index",
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if current_user.role != "patient":
+        raise HTTPException(status_code=403, detail="Only patients can request appointments")
+
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient profile not found")
+
+    held = await db.run_sync(
+        appt_crud.hold_earliest_slot,
+        patient.id,
+        preferred_specialization=payload.preferred_specialization,
+        use_index=source == "index",
+    )
+    if not held:
+        raise HTTPException(status_code=404, detail="No available slots found")
+    hold, slot = held
+    return {
+        "id": hold.id,
+        "slot_id": slot.id,
+        "doctor_id": slot.doctor_id,
+        "scheduled_at": slot.start_datetime,
+        "expires_at": hold.expires_at,
+    }
+
+@router.post("/holds/{hold_id}/confirm", response_model=schemas.AppointmentOut)
+async def confirm_appointment_hold(
+    hold_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient profile not found")
+    try:
+        return await db.run_sync(appt_crud.confirm_hold, hold_id, patient.id)
+    except appt_crud.HoldNotFound:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    except appt_crud.HoldExpired:
+        raise HTTPException(status_code=410, detail="Hold has expired")
+
+@router.delete("/holds/{hold_id}")
+async def release_appointment_hold(
+    hold_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient profile not found")
+    try:
+        await db.run_sync(appt_crud.release_hold, hold_id, patient.id)
+    except appt_crud.HoldNotFound:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    return {"msg": "Hold released"}
+
 # ---------------- Get Agora Token ----------------
 @router.get("/{appointment_id}/token")
-def get_agora_token(
+async def get_agora_token(
     appointment_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    appt = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    appt = await db.run_sync(appt_crud.get_appointment_by_id, appointment_id)
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
     if appt.patient.user_id != current_user.id and appt.doctor.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    ends_at = appt.slot.end_datetime if appt.slot else appt.scheduled_at
+    expires_at = agora_utils.call_window_expiry(ends_at)
+    if expires_at <= time.time():
+        raise HTTPException(status_code=410, detail="Appointment call window has ended")
+    if expires_at - time.time() > agora_utils.AGORA_TOKEN_MAX_TTL_SECONDS:
+        # Agora tokens live at most 24h; one minted now would stop working before the call ends
+        raise HTTPException(status_code=425, detail="Token is available within 24 hours of the call")
+
     uid = current_user.id
-    token = agora_utils.generate_agora_token(appt.channel_name, uid)
-    return {"channel_name": appt.channel_name, "token": token, "uid": uid}
+    token, expires_at = agora_utils.token_cache.get_token(appt.channel_name, uid, expires_at)
+    return {"channel_name": appt.channel_name, "token": token, "uid": uid, "expires_at": expires_at}
+
+
+@router.get("/token-cache")
+async def agora_token_cache_stats(current_user: User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return agora_utils.token_cache.stats()
 
 
 # ---------------- Get Upcoming Appointments for Patient ----------------
-@router.get("/patient", response_model=list[schemas.AppointmentOut])
-def get_patient_appointments(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@router.get("/patient", response_model=list[schemas.PatientAppointmentOut])
+@cached()
+async def get_patient_appointments(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Only patients can access this")
 
-    patient = patient_crud.get_patient_by_user_id(db, current_user.id)
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
 
-    return appt_crud.get_patient_upcoming_appointments(db, patient.id)
+    tag(f"user:{current_user.id}", f"patient:{patient.id}")
+    return await db.run_sync(appt_crud.get_patient_upcoming_appointments, patient.id)
 
 
 # ---------------- Get Upcoming Appointments for Doctor ----------------
-@router.get("/doctor", response_model=list[schemas.AppointmentOut])
-def get_doctor_appointments(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@router.get("/doctor", response_model=list[schemas.DoctorAppointmentOut])
+@cached()
+async def get_doctor_appointments(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if current_user.role != "doctor":
         raise HTTPException(status_code=403, detail="Only doctors can access this")
 
-    return appt_crud.get_doctor_upcoming_appointments(db, current_user.doctor_profile.id)
+    doctor = await db.run_sync(doctor_crud.get_doctor_by_user_id, current_user.id)
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+
+    tag(f"user:{current_user.id}", f"doctor:{doctor.id}")
+    return await db.run_sync(appt_crud.get_doctor_upcoming_appointments, doctor.id)
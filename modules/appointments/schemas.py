@@ -1,5 +1,5 @@
 # modules/appointments/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, AliasPath
 from datetime import datetime
 from typing import Optional
 
@@ -17,3 +17,17 @@ class AppointmentOut(BaseModel):
 
     model_config = {"from_attributes": True}
 
+
+class PatientAppointmentOut(AppointmentOut):
+    doctor_name: Optional[str] = Field(None, validation_alias=AliasPath("doctor", "user", "username"))
+    doctor_specialization: Optional[str] = Field(None, validation_alias=AliasPath("doctor", "specialization"))
+
+class DoctorAppointmentOut(AppointmentOut):
+    patient_name: Optional[str] = Field(None, validation_alias=AliasPath("patient", "user", "username"))
+
+class SlotHoldOut(BaseModel):
+    id: int
+    slot_id: int
+    doctor_id: int
+    scheduled_at: datetime
+    expires_at: datetime
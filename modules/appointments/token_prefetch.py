@@ -0,0 +1,37 @@
+# modules/appointments/token_prefetch.py
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from modules.core.db import AsyncSessionLocal
+from modules.core.agora_utils import token_cache, call_window_expiry
+from modules.appointments import crud as appt_crud
+
+logger = logging.getLogger(__name__)
+
+AGORA_PREMINT_ENABLED = os.getenv("AGORA_PREMINT_ENABLED", "true").lower() == "true"
+# mint tokens for both parties of calls starting within this window ...
+AGORA_PREMINT_WINDOW_MINUTES = int(os.getenv("AGORA_PREMINT_WINDOW_MINUTES", "30"))
+# ... checking this often
+AGORA_PREMINT_INTERVAL_SECONDS = int(os.getenv("AGORA_PREMINT_INTERVAL_SECONDS", "60"))
+
+def premint_upcoming(db: Session, window_minutes: int = AGORA_PREMINT_WINDOW_MINUTES) -> int:
+    """Warm the token cache for calls starting soon; returns how many tokens were looked up."""
+    now = datetime.utcnow()
+    rows = appt_crud.get_call_parties_starting_between(db, now, now + timedelta(minutes=window_minutes))
+    for row in rows:
+        expires_at = call_window_expiry(row.ends_at)
+        token_cache.get_token(row.channel_name, row.patient_user_id, expires_at)
+        token_cache.get_token(row.channel_name, row.doctor_user_id, expires_at)
+    return len(rows) * 2
+
+async def run_premint_loop(interval: int = AGORA_PREMINT_INTERVAL_SECONDS):
+    """Background task started by the app lifespan; runs until cancelled."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(premint_upcoming)
+        except Exception:
+            logger.exception("Agora token pre-mint failed")
+        await asyncio.sleep(interval)
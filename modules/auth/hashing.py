@@ -0,0 +1,108 @@
+# modules/auth/hashing.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# bcrypt cost. Pinning min/max to the same value makes hashes made with any other
+# cost "need update", so they are transparently rehashed on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a thread pool gives real parallelism here
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# operations allowed to wait for a worker before new ones are rejected (PasswordPoolBusy; 503)
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_lock = threading.Lock()
+_stats = {"queued": 0, "running": 0, "completed": 0, "rejected": 0, "rehashed": 0}
+_pwd_context = None
+
+
+class PasswordPoolBusy(Exception):
+    """PASSWORD_HASH_MAX_QUEUE operations are already waiting; the caller should retry shortly."""
+
+
+def get_pwd_context():
+    """The bcrypt CryptContext, built on first use so passlib/bcrypt stay out of worker startup."""
+    global _pwd_context
+    if _pwd_context is None:
+        with _lock:
+            if _pwd_context is None:
+                from passlib.context import CryptContext
+
+                _pwd_context = CryptContext(
+                    schemes=["bcrypt"],
+                    deprecated="auto",
+                    bcrypt__default_rounds=BCRYPT_ROUNDS,
+                    bcrypt__min_rounds=BCRYPT_ROUNDS,
+                    bcrypt__max_rounds=BCRYPT_ROUNDS,
+                )
+    return _pwd_context
+
+
+def _submit(fn, *args):
+    with _lock:
+        if _stats["queued"] >= PASSWORD_HASH_MAX_QUEUE:
+            _stats["rejected"] += 1
+            raise PasswordPoolBusy("Too many password operations in progress, retry shortly")
+        _stats["queued"] += 1
+
+    def run():
+        with _lock:
+            _stats["queued"] -= 1
+            _stats["running"] += 1
+        try:
+            return fn(*args)
+        finally:
+            with _lock:
+                _stats["running"] -= 1
+                _stats["completed"] += 1
+
+    return _executor.submit(run)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    verified, new_hash = get_pwd_context().verify_and_update(password, hashed_password)
+    if new_hash:
+        with _lock:
+            _stats["rehashed"] += 1
+    return verified, new_hash
+
+
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+    return get_pwd_context().verify(password, hashed_password)
+
+
+# -------------------- ASYNC (for async def routes) --------------------
+async def hash_password(password: str) -> str:
+    return await asyncio.wrap_future(_submit(_hash, password))
+
+async def verify_and_update(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify a password; the second item is a fresh hash when the stored one uses old cost settings."""
+    return await asyncio.wrap_future(_submit(_verify_and_update, password, hashed_password))
+
+
+# -------------------- SYNC (for sync callers; still bounded by the pool) --------------------
+def hash_password_sync(password: str) -> str:
+    return _submit(_hash, password).result()
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    return _submit(_verify, password, hashed_password).result()
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_queue": PASSWORD_HASH_MAX_QUEUE,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "queue_depth": _stats["queued"],
+            "in_flight": _stats["running"],
+            "completed": _stats["completed"],
+            "rejected": _stats["rejected"],
+            "rehashed": _stats["rehashed"],
+        }
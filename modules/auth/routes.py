@@ -1,33 +1,40 @@
 # modules/auth/routes.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from passlib.context import CryptContext
-from modules.core.db import get_db
+from modules.core.db import get_async_db
 from modules.users.models import User
+from modules.users import crud as user_crud
 from modules.patients.models import Patient
 from modules.doctors.models import Doctor
+from modules.auth import hashing
 from modules.auth.security import create_access_token, get_current_user
+from modules.auth.principal_cache import principal_cache
+from modules.core.response_cache import cached, tag
 from modules.auth.schemas import UserCreate, LoginRequest
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# register/login are async so bcrypt runs on the password-hash pool (modules/auth/hashing.py)
+# without tying up the threadpool that serves sync routes.
 
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if username already exists
-    existing_user = db.query(User).filter(User.username == user.username).first()
+    existing_user = await db.run_sync(user_crud.get_user_by_username, user.username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already taken")
 
     # Check if email already exists
-    existing_email = db.query(User).filter(User.email == user.email).first()
+    existing_email = await db.run_sync(user_crud.get_user_by_email, user.email)
     if existing_email:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Hash password
-    hashed_password = pwd_context.hash(user.password)
+    try:
+        hashed_password = await hashing.hash_password(user.password)
+    except hashing.PasswordPoolBusy as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
     new_user = User(
         username=user.username,
         email=user.email,
@@ -36,35 +43,42 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         role=user.role
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     # 👇 Automatically create patient/doctor entry
     if new_user.role == "patient":
         patient = Patient(user_id=new_user.id)
         db.add(patient)
-        db.commit()
+        await db.commit()
 
     elif new_user.role == "doctor":
         doctor = Doctor(user_id=new_user.id)
         db.add(doctor)
-        db.commit()
+        await db.commit()
 
     return {"msg": f"User {new_user.username} created successfully", "role": new_user.role}
 
 
 # -------------------- LOGIN --------------------
 @router.post("/login")
-def login(form_data: LoginRequest, db: Session = Depends(get_db)):
-    user = (
-        db.query(User)
-        .filter((User.username == form_data.username_or_email) | (User.email == form_data.username_or_email))
-        .first()
-    )
+async def login(form_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.run_sync(user_crud.get_user_by_username_or_email, form_data.username_or_email)
 
-    if not user or not pwd_context.verify(form_data.password, user.hashed_password):
+    verified = False
+    if user:
+        try:
+            verified, new_hash = await hashing.verify_and_update(form_data.password, user.hashed_password)
+        except hashing.PasswordPoolBusy as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+    if not verified:
         raise HTTPException(status_code=400, detail="Invalid username/email or password")
 
+    # stored hash used outdated cost settings: replace it while we have the plaintext
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
     access_token = create_access_token(
         data={"sub": user.username, "role": user.role},
         expires_delta=timedelta(hours=24),
@@ -74,10 +88,28 @@ def login(form_data: LoginRequest, db: Session = Depends(get_db)):
 
 # -------------------- PROFILE --------------------
 @router.get("/profile")
+@cached()
 def read_profile(current_user=Depends(get_current_user)):
+    tag(f"user:{current_user.id}")
     return {
         "username": current_user.username,
         "email": current_user.email,
         "role": current_user.role,
         "phone_number": current_user.phone_number,
     }
+
+
+# -------------------- PRINCIPAL CACHE STATS (admin only) --------------------
+@router.get("/principal-cache")
+def read_principal_cache_stats(current_user=Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return principal_cache.stats()
+
+
+# -------------------- PASSWORD HASH POOL STATS (admin only) --------------------
+@router.get("/password-pool")
+def read_password_pool_stats(current_user=Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return hashing.stats()
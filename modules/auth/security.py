@@ -1,13 +1,14 @@
 # modules/auth/security.py
 import os
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from modules.core.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_db, get_async_db
 from modules.users import crud
+from modules.auth.principal_cache import principal_cache
+from modules.auth import hashing
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,12 +17,11 @@ SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")  # change in prod
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password_sync(plain_password, hashed_password)
 
 def authenticate_user(db: Session, username: str, password: str):
     user = crud.get_user_by_username(db, username)
@@ -29,13 +29,18 @@ def authenticate_user(db: Session, username: str, password: str):
         return None
     return user
 
+# python-jose (and its cryptography backend) is imported on first use, not at startup
 def create_access_token(data: dict, expires_delta: timedelta | None= None):
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _decode_token(token: str) -> dict:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -43,8 +48,34 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = crud.get_user_by_username(db, username=username)
+    return payload
+
+def _cache_user(db: Session, user, payload: dict):
+    # detach so the cached object outlives this request's session
+    db.expunge(user)
+    principal_cache.put(payload["sub"], user, token_exp=payload.get("exp"))
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = _decode_token(token)
+    user = principal_cache.get(payload["sub"])
+    if user is not None:
+        return user
+
+    user = crud.get_user_by_username(db, username=payload["sub"])
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
\ No newline at end of file
+    _cache_user(db, user, payload)
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """Same as get_current_user, for async routes running on get_async_db."""
+    payload = _decode_token(token)
+    user = principal_cache.get(payload["sub"])
+    if user is not None:
+        return user
+
+    user = await db.run_sync(crud.get_user_by_username, payload["sub"])
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    await db.run_sync(_cache_user, user, payload)
+    return user
@@ -1,17 +1,104 @@
+import calendar
 import os
+import threading
 import time
-from agora_token_builder import RtcTokenBuilder
+from collections import OrderedDict
+from datetime import datetime
 
 APP_ID = os.getenv("AGORA_APP_ID")
 APP_CERTIFICATE = os.getenv("AGORA_APP_CERTIFICATE")
 
-def generate_agora_token(channel_name: str, uid: int):
-    expiration_time_in_seconds = 3600  # 1 hour
-    current_timestamp = int(time.time())
-    privilege_expired_ts = current_timestamp + expiration_time_in_seconds
+# lifetime of tokens for ad-hoc channels (/video/token)
+AGORA_TOKEN_TTL_SECONDS = int(os.getenv("AGORA_TOKEN_TTL_SECONDS", "3600"))
+# appointment tokens stay valid until the slot ends plus this grace period
+AGORA_TOKEN_GRACE_MINUTES = int(os.getenv("AGORA_TOKEN_GRACE_MINUTES", "30"))
+# a cached token is re-minted once it is this close to expiring
+AGORA_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("AGORA_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+AGORA_TOKEN_CACHE_MAX_SIZE = int(os.getenv("AGORA_TOKEN_CACHE_MAX_SIZE", "20000"))
+# Agora caps privilege expiry at 24 hours from minting
+AGORA_TOKEN_MAX_TTL_SECONDS = 24 * 3600
+
+def generate_agora_token(channel_name: str, uid: int, privilege_expired_ts: int | None = None):
+    from agora_token_builder import RtcTokenBuilder
+
+    if privilege_expired_ts is None:
+        privilege_expired_ts = int(time.time()) + AGORA_TOKEN_TTL_SECONDS
 
     token = RtcTokenBuilder.buildTokenWithUid(
         APP_ID, APP_CERTIFICATE, channel_name, uid,
         1, privilege_expired_ts
     )
     return token
+
+def call_window_expiry(ends_at: datetime) -> int:
+    """Unix expiry for an appointment token: the slot end (naive UTC) plus the grace period."""
+    return calendar.timegm(ends_at.timetuple()) + AGORA_TOKEN_GRACE_MINUTES * 60
+
+
+class TokenCache:
+    """
+    LRU cache of RTC tokens keyed by (channel, uid). A token is served until it is within
+    `refresh_margin` seconds of its expiry, or until a different expiry is asked for
+    (the appointment moved), then minted again.
+    """
+
+    def __init__(self, max_size: int = AGORA_TOKEN_CACHE_MAX_SIZE, refresh_margin: int = AGORA_TOKEN_REFRESH_MARGIN_SECONDS):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self._entries = OrderedDict()  # (channel, uid) -> (expires_at, token)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.minted = 0
+        self.evictions = 0
+
+    def get_token(self, channel_name: str, uid: int, expires_at: int | None = None) -> tuple[str, int]:
+        """(token, expires_at) for this channel/uid, minting only when the cached one won't do."""
+        key = (channel_name, uid)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] - self.refresh_margin > now and expires_at in (None, entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[0]
+            self.misses += 1
+
+        if expires_at is None:
+            expires_at = int(now) + AGORA_TOKEN_TTL_SECONDS
+        token = generate_agora_token(channel_name, uid, expires_at)
+        self.put(channel_name, uid, token, expires_at)
+        return token, expires_at
+
+    def put(self, channel_name: str, uid: int, token: str, expires_at: int):
+        if self.max_size <= 0:
+            return
+        key = (channel_name, uid)
+        with self._lock:
+            self.minted += 1
+            self._entries[key] = (expires_at, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "refresh_margin_seconds": self.refresh_margin,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "minted": self.minted,
+                "evictions": self.evictions,
+            }
+
+
+token_cache = TokenCache()
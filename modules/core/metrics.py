@@ -0,0 +1,238 @@
+# modules/core/metrics.py
+import contextvars
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# when set, /metrics requires "Authorization: Bearer <token>"
+METRICS_BEARER_TOKEN = os.getenv("METRICS_BEARER_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound is math.inf else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_str(self.labels + ('le',), label_values + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, label_values)} {series[-1]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "dermaai_http_request_duration_seconds", "Request latency by route template and status.",
+    ("method", "route", "status"),
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "dermaai_http_request_db_statements", "SQL statements executed per request.",
+    ("method", "route"), COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "dermaai_http_request_db_seconds", "Total time spent executing SQL per request.",
+    ("method", "route"),
+)
+DB_STATEMENT_SECONDS = Histogram(
+    "dermaai_db_statement_duration_seconds", "Duration of individual SQL statements.",
+    ("engine",), FAST_BUCKETS,
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "dermaai_db_pool_checkout_wait_seconds", "Time spent waiting for (or opening) a pooled connection.",
+    ("engine",), FAST_BUCKETS,
+)
+EXTERNAL_SECONDS = Histogram(
+    "dermaai_external_call_duration_seconds", "Calls to external services (storage, AI model).",
+    ("service", "outcome"),
+)
+
+METRICS = [REQUEST_SECONDS, REQUEST_DB_STATEMENTS, REQUEST_DB_SECONDS, DB_STATEMENT_SECONDS,
+           POOL_CHECKOUT_SECONDS, EXTERNAL_SECONDS]
+
+# name -> callable returning a flat dict; numeric values are exported as gauges
+_collectors = {}
+
+
+def register_stats(name: str, fn):
+    """Export an existing stats() dict (caches, pools, ...) as dermaai_<name>_<key> gauges."""
+    _collectors[name] = fn
+
+
+# ---------------- Per-request accounting ----------------
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_current = contextvars.ContextVar("dermaai_request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("dermaai_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute_for(engine_label: str):
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["dermaai_query_start"].pop()
+        DB_STATEMENT_SECONDS.observe(elapsed, engine_label)
+        stats = _current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+    return after_cursor_execute
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("dermaai_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine, label: str):
+    """Time every statement and every pool checkout of a (sync) Engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute_for(label))
+    event.listen(engine, "handle_error", _handle_error)
+
+    # the pool has no "before checkout" event; time the call that hands out a connection
+    pool = engine.pool
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, label)
+
+    pool._do_get = timed_do_get
+
+    def pool_stats():
+        stats = {}
+        for key in ("size", "checkedout", "overflow", "checkedin"):
+            fn = getattr(pool, key, None)
+            if fn is not None:
+                stats[key] = fn()
+        return stats
+
+    register_stats(f"db_pool_{label}", pool_stats)
+
+
+@contextmanager
+def external_call(service: str):
+    """Time a call to an external service: `with external_call("cloudinary"): ...`."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        EXTERNAL_SECONDS.observe(time.perf_counter() - start, service, outcome)
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: latency, status and DB usage per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # templates, not raw paths, keep label cardinality bounded
+            route = getattr(route, "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method, route, str(status))
+            REQUEST_DB_STATEMENTS.observe(stats.statements, method, route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method, route)
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, fn in _collectors.items():
+        try:
+            values = fn()
+        except Exception:
+            continue
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE dermaai_{name}_{key} gauge")
+                lines.append(f"dermaai_{name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics(request: Request):
+    if METRICS_BEARER_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_BEARER_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,57 @@
+# modules/core/migrations.py
+import logging
+import os
+from pathlib import Path
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Alembic owns the schema. At startup the app only compares the database revision with
+# the migration head (one query), instead of reflecting every table with create_all.
+#   check       refuse to start unless the database is at the head (default)
+#   warn        log the mismatch and start anyway
+#   create_all  create missing tables on startup (throwaway local databases only)
+#   off         do nothing
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "check").lower()
+ALEMBIC_INI = os.getenv("ALEMBIC_INI", str(Path(__file__).resolve().parents[2] / "alembic.ini"))
+
+
+def script_heads() -> set[str]:
+    """Head revision(s) of the migration scripts shipped with this code."""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    return set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+
+
+def database_heads(connection) -> set[str]:
+    """Revision(s) recorded in the database's alembic_version table (empty if never migrated)."""
+    from alembic.runtime.migration import MigrationContext
+
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+async def prepare_schema(engine: AsyncEngine, mode: str = DB_SCHEMA_MODE):
+    """Run once from the app lifespan, before the first request."""
+    if mode == "off":
+        return
+    if mode == "create_all":
+        from modules.core.db import Base
+
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return
+
+    expected = script_heads()
+    async with engine.connect() as conn:
+        current = await conn.run_sync(database_heads)
+    if current == expected:
+        return
+    message = (
+        f"Database schema is at {', '.join(sorted(current)) or 'no revision'}, "
+        f"this code expects {', '.join(sorted(expected))}; run `alembic upgrade head`"
+    )
+    if mode == "warn":
+        logger.warning(message)
+        return
+    raise RuntimeError(message)
@@ -0,0 +1,307 @@
+# modules/core/response_cache.py
+"""
+Server-side cache of GET responses for read-mostly endpoints polled by the apps
+(/auth/profile, /patients/me, /doctors/me/slots, upcoming-appointment lists).
+
+- a route opts in with `@cached()` (under its @router.get) and names what its response
+  depends on with `tag("user:1", "doctor:7")` while it runs;
+- ResponseCacheMiddleware stores its 200 responses per user (token `sub`) and path + query
+  for RESPONSE_CACHE_TTL_SECONDS, gives them a strong ETag (hash of the body) and answers
+  later requests from the cache, with a 304 when If-None-Match matches: no handler, no
+  database. Responses of opted-in routes that are not cached still get the ETag / 304.
+  The request is matched against the opted-in routes before anything else, so other
+  requests pass straight through without their token being decoded;
+- crud functions that change those rows call `response_cache.invalidate(...)` with the same
+  tags after their commit.
+
+Tags in use: user:<users.id>, patient:<patients.id>, doctor:<doctors.id>.
+
+The cache is per process: a write handled by another worker reaches this one's entries
+only when they expire, so the TTL bounds how stale a response can be; so does it for
+changes that invalidate nothing (time passing, a doctor renaming seen in patients' lists).
+A response whose tags were invalidated while it was being computed is not stored.
+"""
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from starlette.routing import Match
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "10"))
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "10000"))
+# larger bodies are sent with an ETag but not kept
+RESPONSE_CACHE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BODY_BYTES", "65536"))
+
+# headers of a stored response that are replayed on a hit
+_KEPT_HEADERS = {b"content-type"}
+
+
+class _Capture:
+    """Per-request state: the tags named by the handler and the cache epoch it started at."""
+
+    __slots__ = ("tags", "epoch")
+
+    def __init__(self, epoch: int):
+        self.tags = set()
+        self.epoch = epoch
+
+
+_current = contextvars.ContextVar("response_cache_capture", default=None)
+
+
+def cached(ttl: int | None = None):
+    """Route decorator: cache this GET endpoint's responses (for `ttl` seconds, default RESPONSE_CACHE_TTL_SECONDS)."""
+    def decorator(endpoint):
+        endpoint.__response_cache_ttl__ = RESPONSE_CACHE_TTL_SECONDS if ttl is None else ttl
+        return endpoint
+    return decorator
+
+
+def tag(*tags: str):
+    """Name the rows the current response depends on; untagged responses are not stored."""
+    capture = _current.get()
+    if capture is not None:
+        capture.tags.update(tags)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def if_none_match(header: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison, as RFC 9110 asks for)."""
+    if not header:
+        return False
+    tags = [item.strip().removeprefix("W/") for item in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies keyed by (sub, path, query string), with an index from
+    tag to the keys that depend on it. Every invalidation advances an epoch; the epoch at
+    which each tag was last invalidated is kept (for the last `max_size` tags) so a
+    response computed across an invalidation of one of its tags can be refused.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_MAX_SIZE, ttl: int = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, etag, headers, body, tags, route)
+        self._by_tag = {}  # tag -> set of keys
+        self._invalidated = OrderedDict()  # tag -> epoch of its last invalidation
+        self._forgotten_epoch = 0  # newest epoch dropped from _invalidated
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.stores = 0
+        self.stale_skips = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for name in entry[4]:
+            keys = self._by_tag.get(name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[name]
+
+    def get(self, key):
+        """(etag, headers, body, route) of a fresh entry, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2], entry[3], entry[5]
+
+    def put(self, key, etag: str, headers: list, body: bytes, tags, since_epoch: int,
+            ttl: int | None = None, route=None) -> bool:
+        """Store a response computed from `since_epoch` on; refused if one of its tags was invalidated since."""
+        if self.max_size <= 0 or not tags:
+            return False
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if since_epoch < self._forgotten_epoch or \
+                    any(self._invalidated.get(name, 0) > since_epoch for name in tags):
+                self.stale_skips += 1
+                return False
+            self._drop(key)
+            self._entries[key] = (expires_at, etag, headers, body, frozenset(tags), route)
+            for name in tags:
+                self._by_tag.setdefault(name, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self.stores += 1
+            return True
+
+    def invalidate(self, *tags: str):
+        """Drop every response depending on one of `tags` (call after the write commits)."""
+        with self._lock:
+            self._epoch += 1
+            for name in tags:
+                self._invalidated[name] = self._epoch
+                self._invalidated.move_to_end(name)
+                for key in self._by_tag.pop(name, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+            while len(self._invalidated) > max(self.max_size, 1):
+                _, epoch = self._invalidated.popitem(last=False)
+                self._forgotten_epoch = max(self._forgotten_epoch, epoch)
+
+    def count_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": RESPONSE_CACHE_ENABLED,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "bytes": sum(len(entry[3]) for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "stores": self.stores,
+                "stale_skips": self.stale_skips,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+
+def _request_header(scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _subject(scope) -> str | None:
+    """Token `sub` of a valid bearer token, else None (the route's own auth then answers)."""
+    from fastapi import HTTPException
+    from modules.auth.security import _decode_token
+
+    authorization = _request_header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return _decode_token(authorization[7:].strip())["sub"]
+    except HTTPException:
+        return None
+
+
+def _validator_headers(etag: str) -> list:
+    # the client must revalidate every time: cheap here, and a write is seen at once
+    return [(b"etag", etag.encode()), (b"cache-control", b"private, no-cache"), (b"vary", b"Authorization")]
+
+
+class ResponseCacheMiddleware:
+    """Plain ASGI middleware serving and storing responses of @cached routes (see module docstring)."""
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+        self._routes = None  # the app's @cached routes, collected on the first request
+
+    def _opted_in(self, scope) -> bool:
+        """Whether a @cached route will handle this request (known before routing runs)."""
+        if self._routes is None:
+            self._routes = [
+                route for route in getattr(scope.get("app"), "routes", ())
+                if getattr(getattr(route, "endpoint", None), "__response_cache_ttl__", None) is not None
+            ]
+        return any(route.matches(scope)[0] == Match.FULL for route in self._routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not self._opted_in(scope):
+            return await self.app(scope, receive, send)
+
+        sub = _subject(scope)
+        key = (sub, scope["path"], scope["query_string"]) if sub is not None else None
+        cache = self.cache
+        if key is not None:
+            entry = cache.get(key)
+            if entry is not None:
+                return await self._replay(scope, send, *entry)
+
+        capture = _Capture(cache.epoch)
+        token = _current.set(capture)
+        start = None
+        chunks = []
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                ttl = getattr(scope.get("endpoint"), "__response_cache_ttl__", None)
+                if ttl is None or message["status"] != 200:
+                    return await send(message)
+                # an opted-in 200: hold it back until the whole body is known
+                start = (message, ttl)
+                return
+            if start is None or message["type"] != "http.response.body":
+                return await send(message)
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            begin, ttl = start
+            etag = make_etag(body)
+            kept = [(name, value) for name, value in begin["headers"] if name.lower() in _KEPT_HEADERS]
+            if key is not None and len(body) <= RESPONSE_CACHE_MAX_BODY_BYTES:
+                cache.put(key, etag, kept, body, capture.tags, capture.epoch, ttl, scope.get("route"))
+            if if_none_match(_request_header(scope, b"if-none-match"), etag):
+                cache.count_not_modified()
+                await send({"type": "http.response.start", "status": 304, "headers": _validator_headers(etag)})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            headers = [(name, value) for name, value in begin["headers"] if name.lower() not in (b"etag", b"cache-control", b"vary")]
+            await send({**begin, "headers": headers + _validator_headers(etag)})
+            await send({"type": "http.response.body", "body": body})
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+
+    async def _replay(self, scope, send, etag: str, headers: list, body: bytes, route):
+        scope["route"] = route  # for MetricsMiddleware's per-route labels
+        if if_none_match(_request_header(scope, b"if-none-match"), etag):
+            self.cache.count_not_modified()
+            await send({"type": "http.response.start", "status": 304, "headers": _validator_headers(etag)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers = headers + [(b"content-length", str(len(body)).encode())] + _validator_headers(etag)
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
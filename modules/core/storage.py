@@ -0,0 +1,139 @@
+# modules/core/storage.py
+import hashlib
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+from modules.core.metrics import external_call
+
+# cloudinary | local
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+STORAGE_LOCAL_DIR = os.getenv("STORAGE_LOCAL_DIR", "media")
+# URL prefix the local files are served under (main.py mounts it when the local backend is used)
+STORAGE_PUBLIC_BASE_URL = os.getenv("STORAGE_PUBLIC_BASE_URL", "/media")
+CLOUDINARY_FOLDER = "dermaai_images"
+# longest side, in pixels, of the thumbnails that lists link to instead of the full image
+STORAGE_THUMBNAIL_SIZE = int(os.getenv("STORAGE_THUMBNAIL_SIZE", "256"))
+
+
+def _extension(content_type: str | None) -> str:
+    ext = mimetypes.guess_extension(content_type or "") or ""
+    return ".jpg" if ext == ".jpe" else ext
+
+
+class StorageBackend:
+    """
+    Where uploaded images go. Objects are content-addressed by sha256, so saving the
+    same bytes twice returns the same URL without storing (or uploading) them again.
+    """
+    name = "base"
+
+    def save(self, data: bytes, content_type: str | None = None, sha256: str | None = None) -> str:
+        raise NotImplementedError
+
+    def thumbnail_url(self, url: str | None) -> str | None:
+        """URL of a STORAGE_THUMBNAIL_SIZE version of a saved image (the image's own URL if there is none)."""
+        return url
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Write then rename so readers never see a partial file; the temp file goes if either step fails."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class LocalStorage(StorageBackend):
+    """Files under STORAGE_LOCAL_DIR as ab/cd/<sha256><ext>; for local dev, tests and single-node installs."""
+    name = "local"
+
+    def __init__(self, root: str = STORAGE_LOCAL_DIR, base_url: str = STORAGE_PUBLIC_BASE_URL,
+                 thumbnail_size: int = STORAGE_THUMBNAIL_SIZE):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        self.thumbnail_size = thumbnail_size
+
+    def save(self, data: bytes, content_type: str | None = None, sha256: str | None = None) -> str:
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        relpath = f"{sha256[:2]}/{sha256[2:4]}/{sha256}{_extension(content_type)}"
+        path = self.root / relpath
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(path, data)
+            self._write_thumbnail(data, path)
+        return f"{self.base_url}/{relpath}"
+
+    def _thumbnail_relpath(self, relpath: str) -> str:
+        return f"{relpath.rsplit('.', 1)[0]}.thumb{self.thumbnail_size}.jpg"
+
+    def _write_thumbnail(self, data: bytes, path: Path):
+        """<name>.thumb<size>.jpg next to the original; skipped for anything Pillow can't read."""
+        import io
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                # JPEGs decode straight at a fraction of their size
+                image.draft("RGB", (self.thumbnail_size, self.thumbnail_size))
+                thumbnail = ImageOps.exif_transpose(image).convert("RGB")
+                thumbnail.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                out = io.BytesIO()
+                thumbnail.save(out, "JPEG", quality=80)
+        except (UnidentifiedImageError, OSError):
+            return
+        target = self.root / self._thumbnail_relpath(str(path.relative_to(self.root)))
+        _write_atomic(target, out.getvalue())
+
+    def thumbnail_url(self, url: str | None) -> str | None:
+        # images saved before thumbnails existed have none; they keep the full-size URL
+        if not url or not url.startswith(self.base_url + "/"):
+            return url
+        relpath = self._thumbnail_relpath(url[len(self.base_url) + 1:])
+        return f"{self.base_url}/{relpath}" if (self.root / relpath).exists() else url
+
+
+class CloudinaryStorage(StorageBackend):
+    """Cloudinary assets with public_id = sha256; re-uploading a known hash keeps the existing asset."""
+    name = "cloudinary"
+
+    def __init__(self, folder: str = CLOUDINARY_FOLDER, thumbnail_size: int = STORAGE_THUMBNAIL_SIZE):
+        from modules.core import cloudinary_utils  # noqa: F401  (applies cloudinary.config)
+        self.folder = folder
+        # delivery-URL transformation: Cloudinary resizes on first request and caches it on its CDN
+        self.thumbnail_transformation = f"c_limit,w_{thumbnail_size},h_{thumbnail_size},q_auto,f_auto"
+
+    def save(self, data: bytes, content_type: str | None = None, sha256: str | None = None) -> str:
+        import cloudinary.uploader
+
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        # overwrite=False: an existing public_id answers with the stored asset, so no lookup
+        # (rate-limited Admin API) is needed first; exact repeats rarely get here anyway,
+        # the diagnosis cache answers them with the stored URL
+        with external_call("cloudinary_upload"):
+            result = cloudinary.uploader.upload(data, public_id=sha256, folder=self.folder, overwrite=False)
+        return result.get("secure_url")
+
+    def thumbnail_url(self, url: str | None) -> str | None:
+        if not url or "/upload/" not in url:
+            return url
+        return url.replace("/upload/", f"/upload/{self.thumbnail_transformation}/", 1)
+
+
+BACKENDS = {
+    "local": LocalStorage,
+    "cloudinary": CloudinaryStorage,
+}
+
+_storage = None
+
+def get_storage() -> StorageBackend:
+    """The configured backend (STORAGE_BACKEND), created on first use."""
+    global _storage
+    if _storage is None:
+        _storage = BACKENDS[STORAGE_BACKEND]()
+    return _storage
@@ -0,0 +1,70 @@
+# modules/core/upload_utils.py
+import hashlib
+import os
+import time
+from tempfile import SpooledTemporaryFile
+from fastapi import HTTPException, UploadFile
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 256 * 1024
+# uploads bigger than this spill from memory to a temp file while being received
+UPLOAD_SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+class BufferedUpload:
+    """An UploadFile drained exactly once into a spooled buffer, with its size and sha256."""
+
+    def __init__(self, spool: SpooledTemporaryFile, size: int, sha256: str, filename: str | None, content_type: str | None):
+        self._spool = spool
+        self._data = None
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+        self.content_type = content_type
+
+    def read_bytes(self) -> bytes:
+        """Whole payload; read from the spool once and shared by every consumer (storage, inference)."""
+        if self._data is None:
+            self._spool.seek(0)
+            self._data = self._spool.read()
+            self._spool.close()
+        return self._data
+
+    def close(self):
+        self._spool.close()
+
+
+async def read_upload(upload: UploadFile, max_bytes: int | None = None) -> BufferedUpload:
+    """Read an UploadFile in chunks, enforcing a size cap (413) and hashing as it goes."""
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    spool = SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY)
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        spool.write(chunk)
+    if size == 0:
+        spool.close()
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return BufferedUpload(spool, size, digest.hexdigest(), upload.filename, upload.content_type)
+
+
+class StageTimer:
+    """Wall-clock duration per pipeline stage, rendered as a Server-Timing header."""
+
+    def __init__(self):
+        self.stages = {}
+
+    async def track(self, name: str, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
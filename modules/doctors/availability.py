@@ -0,0 +1,204 @@
+# modules/doctors/availability.py
+import heapq
+import os
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from modules.doctors.models import Doctor, DoctorSlot
+
+AVAILABILITY_INDEX_ENABLED = os.getenv("AVAILABILITY_INDEX_ENABLED", "true").lower() == "true"
+# full rebuild from the database, run by the slot-event tail between two reads; repairs
+# anything the feed cannot carry (e.g. another worker changing a doctor's specialization)
+AVAILABILITY_INDEX_REFRESH_SECONDS = int(os.getenv("AVAILABILITY_INDEX_REFRESH_SECONDS", "300"))
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+class AvailabilityIndex:
+    """
+    In-memory read model of free slots.
+
+    - per doctor: free slots as a sorted list of (start, slot_id, end), and its specialization
+    - min-heaps of (start, doctor_id, slot_id), one over all doctors and one per
+      specialization, holding each doctor's next free slot. Entries are not removed
+      when a doctor's head changes; they are skipped as stale when they surface.
+
+    The database stays authoritative: a slot taken from the index is booked with the
+    same conditional UPDATE as the database path, and a lost claim just drops the slot.
+
+    The index is per process. Slots created, booked or released by other workers reach it
+    through the slot-event tail (modules/doctors/slot_events.py), which applies every
+    slot_events row here; the index is only used while that feed runs (`synced`), so
+    booking and listings lag other workers by one tail read (SLOT_EVENTS_POLL_SECONDS
+    with the poll backend, the commit itself with postgres) rather than a rebuild period.
+    The tail also runs every rebuild, just before a read: changes the snapshot misses are
+    in that read's events.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = {}
+        self._specialization = {}
+        self._heaps = defaultdict(list)  # None = all doctors
+        self.ready = False
+        self.synced = False  # set while the slot-event tail feeds this index
+        self.rebuilds = 0
+        self.events_applied = 0
+        self.taken = 0
+        self.stale_skipped = 0
+
+    # ---------------- maintenance (call with the lock held) ----------------
+
+    def _push_head(self, doctor_id: int):
+        slots = self._free.get(doctor_id)
+        if not slots:
+            return
+        start, slot_id, _ = slots[0]
+        entry = (start, doctor_id, slot_id)
+        heapq.heappush(self._heaps[None], entry)
+        specialization = self._specialization.get(doctor_id)
+        if specialization:
+            heapq.heappush(self._heaps[specialization], entry)
+
+    def _is_current(self, entry, specialization) -> bool:
+        start, doctor_id, slot_id = entry
+        slots = self._free.get(doctor_id)
+        if not slots or slots[0][0] != start or slots[0][1] != slot_id:
+            return False
+        return specialization is None or self._specialization.get(doctor_id) == specialization
+
+    # ---------------- updates ----------------
+
+    def rebuild(self, db: Session):
+        """Reload every free future slot and every doctor's specialization."""
+        now = datetime.utcnow()
+        free = defaultdict(list)
+        rows = (
+            db.query(DoctorSlot.doctor_id, DoctorSlot.start_datetime, DoctorSlot.id, DoctorSlot.end_datetime)
+            .filter(DoctorSlot.is_booked == False, DoctorSlot.start_datetime >= now)
+            .order_by(DoctorSlot.doctor_id, DoctorSlot.start_datetime, DoctorSlot.id)
+        )
+        for doctor_id, start, slot_id, end in rows:
+            free[doctor_id].append((start, slot_id, end))
+        specializations = dict(db.query(Doctor.id, Doctor.specialization))
+
+        with self._lock:
+            self._free = dict(free)
+            self._specialization = specializations
+            self._heaps = defaultdict(list)
+            for doctor_id in self._free:
+                self._push_head(doctor_id)
+            self.ready = True
+            self.rebuilds += 1
+
+    def add_slots(self, doctor_id: int, slots):
+        """Make new (or released) slots available: iterable of (start, slot_id, end). Slots already listed are skipped."""
+        slots = [(_naive_utc(start), slot_id, _naive_utc(end)) for start, slot_id, end in slots]
+        if not slots:
+            return
+        with self._lock:
+            current = self._free.setdefault(doctor_id, [])
+            slots = [slot for slot in slots if not self._has(current, slot[0], slot[1])]
+            if not slots:
+                return
+            head = current[0] if current else None
+            if len(slots) == 1:
+                insort(current, slots[0])
+            else:
+                current.extend(slots)
+                current.sort()
+            if current[0] != head:
+                self._push_head(doctor_id)
+
+    @staticmethod
+    def _has(slots, start: datetime, slot_id: int) -> bool:
+        i = bisect_left(slots, (start, slot_id))
+        return i < len(slots) and slots[i][1] == slot_id
+
+    def apply_event(self, kind: str, doctor_id: int, slot_id: int, start: datetime, end: datetime):
+        """Follow a slot_events row (from any process): booked takes the slot, created / released free it."""
+        if kind == "booked":
+            self.remove_slot(doctor_id, slot_id, start)
+        else:
+            self.add_slots(doctor_id, [(start, slot_id, end)])
+        with self._lock:
+            self.events_applied += 1
+
+    def remove_slot(self, doctor_id: int, slot_id: int, start: datetime):
+        """Drop a slot booked through some other path."""
+        start = _naive_utc(start)
+        with self._lock:
+            slots = self._free.get(doctor_id)
+            if not slots:
+                return
+            i = bisect_left(slots, (start, slot_id))
+            if i < len(slots) and slots[i][1] == slot_id:
+                del slots[i]
+                if i == 0:
+                    self._push_head(doctor_id)
+
+    def set_specialization(self, doctor_id: int, specialization: str | None):
+        with self._lock:
+            if self._specialization.get(doctor_id) == specialization:
+                return
+            self._specialization[doctor_id] = specialization
+            self._push_head(doctor_id)
+
+    # ---------------- reads ----------------
+
+    def take_earliest(self, now: datetime, specialization: str | None = None):
+        """
+        Remove and return the globally earliest free slot starting at or after `now`
+        as (doctor_id, slot_id, start, end), or None. Ties break on (doctor_id, slot_id),
+        the same order as the database path.
+        """
+        specialization = specialization or None
+        with self._lock:
+            heap = self._heaps.get(specialization)
+            while heap:
+                entry = heapq.heappop(heap)
+                if not self._is_current(entry, specialization):
+                    self.stale_skipped += 1
+                    continue
+                start, doctor_id, slot_id = entry
+                _, _, end = self._free[doctor_id].pop(0)
+                self._push_head(doctor_id)
+                if start < now:
+                    continue  # past slots can never be booked again
+                self.taken += 1
+                return doctor_id, slot_id, start, end
+            return None
+
+    def available(self, doctor_id: int, now: datetime) -> list[tuple[datetime, int, datetime]]:
+        with self._lock:
+            slots = self._free.get(doctor_id, [])
+            return slots[bisect_left(slots, (now,)):]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": AVAILABILITY_INDEX_ENABLED,
+                "ready": self.ready,
+                "synced": self.synced,
+                "events_applied": self.events_applied,
+                "doctors": len(self._free),
+                "free_slots": sum(len(s) for s in self._free.values()),
+                "specializations": len({s for s in self._specialization.values() if s}),
+                "heap_entries": sum(len(h) for h in self._heaps.values()),
+                "rebuilds": self.rebuilds,
+                "taken": self.taken,
+                "stale_skipped": self.stale_skipped,
+            }
+
+
+availability_index = AvailabilityIndex()
+
+
+def index_active(use_index: bool = True) -> bool:
+    """Serve this request from the index? (enabled, built, fed by the slot-event tail, and not opted out)"""
+    return use_index and AVAILABILITY_INDEX_ENABLED and availability_index.ready and availability_index.synced
+
@@ -0,0 +1,204 @@
+# modules/doctors/availability_summary.py
+"""
+doctor_availability: one row per doctor with its specialization, next free slot and
+number of free slots in the next SUMMARY_WINDOW_DAYS days, so /doctors/search is one
+indexed query instead of a slot lookup per doctor.
+
+Rows change in the transaction that changes a slot (`slots_freed`, `slot_taken`, called
+from the doctor and appointment crud). Time moves the numbers as well (the next free
+slot passes, the window rolls forward), and two concurrent bookings of one doctor can
+leave next_free_at briefly pointing at a taken slot, so `run_refresh_loop` re-derives
+rows from doctor_slots: those whose next free slot has passed every
+AVAILABILITY_SUMMARY_REFRESH_SECONDS, all of them every AVAILABILITY_SUMMARY_FULL_REFRESH_SECONDS.
+Booking itself never reads this table.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, func, case, or_, exists, literal, DateTime, Integer
+from sqlalchemy.orm import Session
+from modules.core.db import AsyncSessionLocal
+from modules.doctors.models import Doctor, DoctorSlot, DoctorAvailability
+from modules.doctors.availability import _naive_utc
+from modules.users.models import User
+
+logger = logging.getLogger(__name__)
+
+# one refresher per deployment is enough: turn it off in all but one process
+AVAILABILITY_SUMMARY_REFRESH_ENABLED = os.getenv("AVAILABILITY_SUMMARY_REFRESH_ENABLED", "true").lower() == "true"
+# re-derive rows whose next free slot has passed
+AVAILABILITY_SUMMARY_REFRESH_SECONDS = int(os.getenv("AVAILABILITY_SUMMARY_REFRESH_SECONDS", "60"))
+# re-derive every row (rolls the 7-day window, repairs drift)
+AVAILABILITY_SUMMARY_FULL_REFRESH_SECONDS = int(os.getenv("AVAILABILITY_SUMMARY_FULL_REFRESH_SECONDS", "900"))
+SUMMARY_WINDOW_DAYS = 7
+# doctors per transaction in a full refresh
+REFRESH_BATCH = 1000
+
+
+# ---------------- incremental updates (in the caller's transaction) ----------------
+
+def set_specialization(db: Session, doctor_id: int, specialization: str | None):
+    """Create the doctor's row, or follow a specialization change."""
+    row = db.get(DoctorAvailability, doctor_id)
+    if row is None:
+        db.add(DoctorAvailability(doctor_id=doctor_id, specialization=specialization, free_slots_7d=0))
+    else:
+        row.specialization = specialization
+
+def slots_freed(db: Session, doctor_id: int, starts):
+    """Slots of one doctor became free (created or released)."""
+    now = datetime.utcnow()
+    starts = [start for start in map(_naive_utc, starts) if start >= now]
+    if not starts:
+        return
+    earliest = min(starts)
+    in_window = sum(start < now + timedelta(days=SUMMARY_WINDOW_DAYS) for start in starts)
+    summary = DoctorAvailability
+    db.execute(
+        update(summary)
+        .where(summary.doctor_id == doctor_id)
+        .values(
+            next_free_at=case(
+                (or_(summary.next_free_at.is_(None), summary.next_free_at > earliest, summary.next_free_at < now), earliest),
+                else_=summary.next_free_at,
+            ),
+            free_slots_7d=summary.free_slots_7d + in_window,
+            updated_at=now,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def _next_free_slot(doctor_id, now: datetime):
+    return (
+        select(func.min(DoctorSlot.start_datetime))
+        .where(DoctorSlot.doctor_id == doctor_id, DoctorSlot.is_booked == False, DoctorSlot.start_datetime >= now)
+        .scalar_subquery()
+    )
+
+def _free_slots_in_window(doctor_id, now: datetime):
+    return (
+        select(func.count())
+        .select_from(DoctorSlot)
+        .where(
+            DoctorSlot.doctor_id == doctor_id,
+            DoctorSlot.is_booked == False,
+            DoctorSlot.start_datetime >= now,
+            DoctorSlot.start_datetime < now + timedelta(days=SUMMARY_WINDOW_DAYS),
+        )
+        .scalar_subquery()
+    )
+
+def slot_taken(db: Session, doctor_id: int, start: datetime):
+    """A free slot was booked or held; run after the slot's UPDATE, so the next free one is found without it."""
+    now = datetime.utcnow()
+    start = _naive_utc(start)
+    summary = DoctorAvailability
+    values = {
+        # only a booking of the doctor's next slot needs the index lookup
+        "next_free_at": case(
+            (or_(summary.next_free_at == start, summary.next_free_at < now), _next_free_slot(doctor_id, now)),
+            else_=summary.next_free_at,
+        ),
+        "updated_at": now,
+    }
+    if now <= start < now + timedelta(days=SUMMARY_WINDOW_DAYS):
+        values["free_slots_7d"] = case((summary.free_slots_7d > 0, summary.free_slots_7d - 1), else_=0)
+    db.execute(
+        update(summary)
+        .where(summary.doctor_id == doctor_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ---------------- refresh from doctor_slots ----------------
+
+def refresh(db: Session, stale_only: bool = False) -> int:
+    """
+    Re-derive rows from doctor_slots; returns how many were rewritten. A full refresh also
+    adds rows for doctors without one and runs in doctor-id batches of REFRESH_BATCH, one
+    transaction each.
+    """
+    now = datetime.utcnow()
+    summary = DoctorAvailability
+    derived = {
+        "next_free_at": _next_free_slot(summary.doctor_id, now),
+        "free_slots_7d": _free_slots_in_window(summary.doctor_id, now),
+        "specialization": select(Doctor.specialization).where(Doctor.id == summary.doctor_id).scalar_subquery(),
+        "updated_at": now,
+    }
+    if stale_only:
+        result = db.execute(
+            update(summary).where(summary.next_free_at < now).values(**derived)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        return result.rowcount
+
+    db.execute(
+        insert(summary).from_select(
+            ["doctor_id", "specialization", "free_slots_7d", "updated_at"],
+            select(Doctor.id, Doctor.specialization, literal(0, Integer), literal(now, DateTime))
+            .where(~exists().where(summary.doctor_id == Doctor.id)),
+        )
+    )
+    db.commit()
+    rewritten = 0
+    last_id = db.scalar(select(func.max(summary.doctor_id))) or 0
+    for low in range(0, last_id, REFRESH_BATCH):
+        result = db.execute(
+            update(summary)
+            .where(summary.doctor_id > low, summary.doctor_id <= low + REFRESH_BATCH)
+            .values(**derived)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        rewritten += result.rowcount
+    return rewritten
+
+async def run_refresh_loop(interval: int = AVAILABILITY_SUMMARY_REFRESH_SECONDS,
+                           full_interval: int = AVAILABILITY_SUMMARY_FULL_REFRESH_SECONDS):
+    """Background task started by the app lifespan: full refresh at startup, then periodically."""
+    next_full = time.monotonic()
+    while True:
+        full = time.monotonic() >= next_full
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(refresh, not full)
+            if full:
+                next_full = time.monotonic() + full_interval
+        except Exception:
+            logger.exception("Refreshing the doctor availability summary failed")
+        await asyncio.sleep(interval)
+
+
+# ---------------- search ----------------
+
+def search(db: Session, specialization: str | None = None, within_hours: int | None = None,
+           sort: str = "soonest", limit: int = 20, offset: int = 0):
+    """
+    Doctors with a free future slot (sort=most_available: with free slots in the next 7 days),
+    as (doctor_id, username, specialization, next_free_at, free_slots_7d) rows. One query that
+    walks ix_doctor_availability_spec_next (or _spec_free) in order and joins doctors / users
+    by primary key for the page only.
+    """
+    now = datetime.utcnow()
+    summary = DoctorAvailability
+    query = (
+        select(summary.doctor_id, User.username, summary.specialization, summary.next_free_at, summary.free_slots_7d)
+        .join(Doctor, Doctor.id == summary.doctor_id)
+        .join(User, User.id == Doctor.user_id)
+        .where(summary.next_free_at >= now)
+    )
+    if specialization:
+        query = query.where(summary.specialization == specialization)
+    if within_hours:
+        query = query.where(summary.next_free_at < now + timedelta(hours=within_hours))
+    if sort == "most_available":
+        # walks ix_doctor_availability_spec_free backwards: ties come highest doctor id first
+        query = query.where(summary.free_slots_7d > 0).order_by(summary.free_slots_7d.desc(), summary.doctor_id.desc())
+    else:
+        query = query.order_by(summary.next_free_at, summary.doctor_id)
+    return db.execute(query.limit(limit).offset(offset)).all()
@@ -1,56 +1,165 @@
 # modules/doctors/crud.py
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from modules.doctors.models import Doctor, DoctorSlot
+from modules.doctors.availability import availability_index, index_active
+from modules.doctors import slot_events, availability_summary
+from modules.core.response_cache import response_cache
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+# upper bound on slots created by one bulk request
+MAX_BULK_SLOTS = 5000
+
+class SlotOverlapError(ValueError):
+    def __init__(self, conflicts: list[tuple[datetime, datetime]]):
+        super().__init__(f"{len(conflicts)} slot(s) overlap existing or requested slots")
+        self.conflicts = conflicts
+
+class TooManySlotsError(ValueError):
+    pass
 
 def create_doctor_profile(db: Session, user_id: int, specialization: str | None = None, qualifications: str | None = None, bio: str | None = None):
     doc = Doctor(user_id=user_id, specialization=specialization, qualifications=qualifications, bio=bio)
     db.add(doc)
+    db.flush()
+    availability_summary.set_specialization(db, doc.id, specialization)
     db.commit()
     db.refresh(doc)
+    availability_index.set_specialization(doc.id, doc.specialization)
+    response_cache.invalidate(f"user:{user_id}", f"doctor:{doc.id}")
     return doc
 
+def get_doctor(db: Session, doctor_id: int):
+    return db.get(Doctor, doctor_id)
+
 def get_doctor_by_user_id(db: Session, user_id: int):
     return db.query(Doctor).filter(Doctor.user_id == user_id).first()
 
+def _utc_naive(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
 def create_slot(db: Session, doctor_id: int, start_datetime: datetime, end_datetime: datetime):
-    # Convert incoming datetimes to UTC
-    start_datetime_utc = start_datetime.astimezone(timezone.utc)
-    end_datetime_utc = end_datetime.astimezone(timezone.utc)
-    
+    # stored as naive UTC, like the bulk paths (the columns have no time zone)
     slot = DoctorSlot(
         doctor_id=doctor_id,
-        start_datetime=start_datetime_utc,
-        end_datetime=end_datetime_utc
+        start_datetime=_utc_naive(start_datetime),
+        end_datetime=_utc_naive(end_datetime)
     )
     db.add(slot)
+    db.flush()
+    slot_events.record(db, "created", [(doctor_id, slot.start_datetime, slot.id, slot.end_datetime)])
+    availability_summary.slots_freed(db, doctor_id, [slot.start_datetime])
     db.commit()
     db.refresh(slot)
+    availability_index.add_slots(doctor_id, [(slot.start_datetime, slot.id, slot.end_datetime)])
+    response_cache.invalidate(f"doctor:{doctor_id}")
     return slot
 
 def create_slots_range(db: Session, doctor_id: int, start: datetime, end: datetime, slot_duration_minutes: int = 30):
-    slots = []
-
-    # Convert start and end to UTC
-    current = start.astimezone(timezone.utc)
-    end = end.astimezone(timezone.utc)
-
-    while current < end:
-        slot = DoctorSlot(
-            doctor_id=doctor_id,
-            start_datetime=current,
-            end_datetime=current + timedelta(minutes=slot_duration_minutes),
-            is_booked=False
+    step = timedelta(minutes=slot_duration_minutes)
+    current = _utc_naive(start)
+    end = _utc_naive(end)
+
+    windows = []
+    while current + step <= end:
+        windows.append((current, current + step))
+        current += step
+        if len(windows) > MAX_BULK_SLOTS:
+            raise TooManySlotsError(f"Range expands to more than {MAX_BULK_SLOTS} slots")
+    return create_slots_bulk(db, doctor_id, windows)
+
+def expand_schedule(rules) -> list[tuple[datetime, datetime]]:
+    """Expand recurrence rules (schemas.ScheduleRule) into sorted naive-UTC (start, end) windows, in memory."""
+    windows = []
+    for rule in rules:
+        tz = ZoneInfo(rule.timezone)
+        step = timedelta(minutes=rule.slot_duration_minutes)
+        weekdays = set(rule.weekdays)
+        day = rule.start_date
+        while day <= rule.end_date:
+            if day.weekday() in weekdays:
+                # wall-clock bounds are converted once and stepped in UTC, so every slot lasts
+                # `step` even across a DST change (wall-clock arithmetic would not)
+                breaks = [
+                    (_utc_naive(datetime.combine(day, b.start_time, tz)), _utc_naive(datetime.combine(day, b.end_time, tz)))
+                    for b in rule.breaks
+                ]
+                current = _utc_naive(datetime.combine(day, rule.start_time, tz))
+                day_end = _utc_naive(datetime.combine(day, rule.end_time, tz))
+                while current + step <= day_end:
+                    slot_end = current + step
+                    if not any(current < b_end and slot_end > b_start for b_start, b_end in breaks):
+                        windows.append((current, slot_end))
+                    current = slot_end
+                if len(windows) > MAX_BULK_SLOTS:
+                    raise TooManySlotsError(f"Schedule expands to more than {MAX_BULK_SLOTS} slots")
+            day += timedelta(days=1)
+    windows.sort()
+    return windows
+
+def find_slot_conflicts(db: Session, doctor_id: int, windows: list[tuple[datetime, datetime]]):
+    """Windows that overlap each other or the doctor's existing slots; one query for the whole batch."""
+    if not windows:
+        return []
+    conflicts = []
+    latest_end = None
+    for start, end in windows:
+        if latest_end is not None and start < latest_end:
+            conflicts.append((start, end))
+        latest_end = end if latest_end is None else max(latest_end, end)
+
+    existing = (
+        db.query(DoctorSlot.start_datetime, DoctorSlot.end_datetime)
+        .filter(
+            DoctorSlot.doctor_id == doctor_id,
+            DoctorSlot.start_datetime < windows[-1][1],
+            DoctorSlot.end_datetime > windows[0][0],
         )
-        db.add(slot)
-        slots.append(slot)
-        current += timedelta(minutes=slot_duration_minutes)
+        .order_by(DoctorSlot.start_datetime)
+        .all()
+    )
+    # both lists are sorted by start: sweep them together
+    i = 0
+    for start, end in windows:
+        while i < len(existing) and existing[i][1] <= start:
+            i += 1
+        j = i
+        while j < len(existing) and existing[j][0] < end:
+            if existing[j][1] > start:
+                conflicts.append((start, end))
+                break
+            j += 1
+    return conflicts
+
+def create_slots_bulk(db: Session, doctor_id: int, windows: list[tuple[datetime, datetime]]):
+    """Insert all windows in one INSERT ... RETURNING (executemany) after a single overlap check."""
+    if len(windows) > MAX_BULK_SLOTS:
+        raise TooManySlotsError(f"Request expands to more than {MAX_BULK_SLOTS} slots")
+    windows = sorted(windows)
+    conflicts = find_slot_conflicts(db, doctor_id, windows)
+    if conflicts:
+        raise SlotOverlapError(conflicts)
+    if not windows:
+        return []
+
+    slots = db.scalars(
+        insert(DoctorSlot).returning(DoctorSlot),
+        [{"doctor_id": doctor_id, "start_datetime": start, "end_datetime": end, "is_booked": False} for start, end in windows],
+    ).all()
+    slot_events.record(db, "created", [(doctor_id, slot.start_datetime, slot.id, slot.end_datetime) for slot in slots])
+    availability_summary.slots_freed(db, doctor_id, [slot.start_datetime for slot in slots])
     db.commit()
-    
-    for slot in slots:
-        db.refresh(slot)
+    availability_index.add_slots(doctor_id, [(slot.start_datetime, slot.id, slot.end_datetime) for slot in slots])
+    response_cache.invalidate(f"doctor:{doctor_id}")
     return slots
 
-def get_available_slots(db: Session, doctor_id: int):
+def get_available_slots(db: Session, doctor_id: int, use_index: bool = True):
+    """Doctor's free future slots, from the availability index unless it is off or opted out."""
     now = datetime.utcnow()
+    if index_active(use_index):
+        return [
+            {"id": slot_id, "doctor_id": doctor_id, "start_datetime": start, "end_datetime": end, "is_booked": False}
+            for start, slot_id, end in availability_index.available(doctor_id, now)
+        ]
     return db.query(DoctorSlot).filter(DoctorSlot.doctor_id == doctor_id, DoctorSlot.is_booked == False, DoctorSlot.start_datetime >= now).order_by(DoctorSlot.start_datetime).all()
@@ -1,5 +1,5 @@
 # modules/doctors/models.py
-from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, JSON, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from modules.core.db import Base
 import datetime
@@ -8,7 +8,7 @@ class Doctor(Base):
     __tablename__ = "doctors"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
-    specialization = Column(String, nullable=True)
+    specialization = Column(String, nullable=True, index=True)
     qualifications = Column(String, nullable=True)
     bio = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -25,3 +25,59 @@ class DoctorSlot(Base):
     is_booked = Column(Boolean, default=False, nullable=False)
 
     doctor = relationship("Doctor", back_populates="slots")
+
+    __table_args__ = (
+        # per-doctor availability listing: get_available_slots
+        Index("ix_doctor_slots_doctor_booked_start", doctor_id, is_booked, start_datetime),
+        # global earliest free slot for booking: only unbooked rows are indexed
+        Index(
+            "ix_doctor_slots_free_start",
+            start_datetime, doctor_id, id,
+            postgresql_where=(is_booked == False),
+            sqlite_where=(is_booked == False),
+        ),
+    )
+
+class SlotEvent(Base):
+    """
+    Slot availability change log (created / booked / released), written in the same
+    transaction as the change. The id is the SSE event id streams resume from; see
+    modules/doctors/slot_events.py.
+    """
+    __tablename__ = "slot_events"
+    id = Column(Integer, primary_key=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String(16), nullable=False)  # created, booked, released
+    slot_id = Column(Integer, nullable=False)
+    start_datetime = Column(DateTime, nullable=False)
+    end_datetime = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # replay after Last-Event-ID for one doctor
+        Index("ix_slot_events_doctor_id_id", doctor_id, id),
+        # retention purge
+        Index("ix_slot_events_created_at", created_at),
+        # ids must never be reused: they are the resume cursor
+        {"sqlite_autoincrement": True},
+    )
+
+class DoctorAvailability(Base):
+    """
+    Denormalized per-doctor availability for search and ranking; one row per doctor,
+    kept up to date by slot creation, booking and release (modules/doctors/availability_summary.py).
+    """
+    __tablename__ = "doctor_availability"
+    doctor_id = Column(Integer, ForeignKey("doctors.id", ondelete="CASCADE"), primary_key=True)
+    specialization = Column(String, nullable=True)  # copy of doctors.specialization
+    next_free_at = Column(DateTime, nullable=True)  # start of the earliest free future slot
+    free_slots_7d = Column(Integer, nullable=False, default=0)  # free slots starting in the next 7 days
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # search: sort=soonest, with and without a specialization filter
+        Index("ix_doctor_availability_spec_next", specialization, next_free_at),
+        Index("ix_doctor_availability_next", next_free_at),
+        # search: sort=most_available
+        Index("ix_doctor_availability_spec_free", specialization, free_slots_7d),
+    )
@@ -1,10 +1,16 @@
 # modules/doctors/routes.py
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from modules.core.db import get_db
-from modules.auth.security import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_db, get_async_db
+from modules.auth.security import get_current_user, get_current_user_async
 from modules.users.models import User
-from modules.doctors import crud, schemas
+from modules.doctors import crud, schemas, slot_events, availability_summary
+from modules.doctors.models import Doctor, SlotEvent
+from modules.doctors.availability import availability_index
+from modules.core.response_cache import response_cache, cached, tag
 
 router = APIRouter(prefix="/doctors", tags=["doctors"])
 
@@ -18,37 +24,134 @@ def create_or_update_doc_profile(payload: schemas.DoctorCreate, current_user: Us
         existing.specialization = payload.specialization or existing.specialization
         existing.qualifications = payload.qualifications or existing.qualifications
         existing.bio = payload.bio or existing.bio
+        availability_summary.set_specialization(db, existing.id, existing.specialization)
         db.commit()
         db.refresh(existing)
+        availability_index.set_specialization(existing.id, existing.specialization)
+        response_cache.invalidate(f"doctor:{existing.id}")
         return existing
     new = crud.create_doctor_profile(db, current_user.id, payload.specialization, payload.qualifications, payload.bio)
     return new
 
+@router.get("/search", response_model=list[schemas.DoctorSearchResult])
+async def search_doctors(
+    specialization: str | None = None,
+    within_hours: int | None = Query(None, ge=1, description="only doctors with a free slot starting within this many hours"),
+    sort: Literal["soonest", "most_available"] = "soonest",
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Doctors with free slots and their next free slot, soonest first or by free slots in the next 7 days."""
+    return await db.run_sync(availability_summary.search, specialization, within_hours, sort, limit, offset)
+
+# Slot routes are async on get_async_db; crud functions run through run_sync.
+
 @router.post("/me/slots", response_model=schemas.SlotOut)
-def create_slot(slot: schemas.SlotCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_slot(slot: schemas.SlotCreate, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     if current_user.role != "doctor":
         raise HTTPException(status_code=403, detail="Only doctors")
-    doctor = crud.get_doctor_by_user_id(db, current_user.id)
+    doctor = await db.run_sync(crud.get_doctor_by_user_id, current_user.id)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
-    new_slot = crud.create_slot(db, doctor.id, slot.start_datetime, slot.end_datetime)
+    new_slot = await db.run_sync(crud.create_slot, doctor.id, slot.start_datetime, slot.end_datetime)
     return new_slot
 
 @router.get("/me/slots", response_model=list[schemas.SlotOut])
-def list_my_available_slots(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@cached()
+async def list_my_available_slots(
+    source: Literal["index", "db"] = "index",
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
     if current_user.role != "doctor":
         raise HTTPException(status_code=403, detail="Only doctors")
-    doctor = crud.get_doctor_by_user_id(db, current_user.id)
+    doctor = await db.run_sync(crud.get_doctor_by_user_id, current_user.id)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
-    return crud.get_available_slots(db, doctor.id)
+    # ?source=db bypasses the in-memory availability index, which trails other workers by one slot-event read,
+    # and the response cache with it (an untagged response is not stored)
+    if source != "db":
+        tag(f"user:{current_user.id}", f"doctor:{doctor.id}")
+    return await db.run_sync(crud.get_available_slots, doctor.id, source == "index")
 
 @router.post("/me/slots-range", response_model=list[schemas.SlotOut])
-def create_slots_range(payload: schemas.SlotRangeCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def create_slots_range(payload: schemas.SlotRangeCreate, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    if current_user.role != "doctor":
+        raise HTTPException(status_code=403, detail="Only doctors")
+    doctor = await db.run_sync(crud.get_doctor_by_user_id, current_user.id)
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor profile not found")
+    try:
+        slots = await db.run_sync(crud.create_slots_range, doctor.id, payload.start_datetime, payload.end_datetime, payload.slot_duration_minutes)
+    except crud.SlotOverlapError as exc:
+        raise HTTPException(status_code=409, detail={"msg": str(exc), "conflicts": [[s.isoformat(), e.isoformat()] for s, e in exc.conflicts[:50]]})
+    except crud.TooManySlotsError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return slots
+
+@router.post("/me/schedule", response_model=list[schemas.SlotOut])
+async def create_schedule(payload: schemas.ScheduleCreate, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Create slots from recurrence rules (weekdays, hours, duration, breaks, date range) in one bulk insert."""
     if current_user.role != "doctor":
         raise HTTPException(status_code=403, detail="Only doctors")
-    doctor = crud.get_doctor_by_user_id(db, current_user.id)
+    doctor = await db.run_sync(crud.get_doctor_by_user_id, current_user.id)
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor profile not found")
-    slots = crud.create_slots_range(db, doctor.id, payload.start_datetime, payload.end_datetime)
+    try:
+        windows = crud.expand_schedule(payload.rules)
+        slots = await db.run_sync(crud.create_slots_bulk, doctor.id, windows)
+    except crud.SlotOverlapError as exc:
+        raise HTTPException(status_code=409, detail={"msg": str(exc), "conflicts": [[s.isoformat(), e.isoformat()] for s, e in exc.conflicts[:50]]})
+    except crud.TooManySlotsError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     return slots
+
+# ---------------- Live availability (server-sent events) ----------------
+# Events: slot.created / slot.booked / slot.released with {"type", "specialization", "slot"}.
+# Reconnecting with the Last-Event-ID header (EventSource does this itself) replays what
+# was missed; when that is not possible a `reset` event comes first and the stream starts
+# over. See modules/doctors/slot_events.py.
+
+def _event_stream_response(events):
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/{doctor_id}/slots/stream")
+async def stream_doctor_slots(
+    doctor_id: int,
+    last_event_id: int | None = Header(None),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """One doctor's free slots: a `snapshot` event (unless resuming), then every change."""
+    if not slot_events.SLOT_EVENTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Slot event streams are disabled")
+    if not await db.run_sync(crud.get_doctor, doctor_id):
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    await db.close()  # the stream must not keep a pooled connection
+
+    def snapshot(session):
+        # from the database: the events that follow are replayed after this read, which the index may lag
+        slots = crud.get_available_slots(session, doctor_id, use_index=False)
+        return {"doctor_id": doctor_id, "slots": [schemas.SlotOut.model_validate(s).model_dump(mode="json") for s in slots]}
+
+    return _event_stream_response(slot_events.event_stream(
+        slot_events.doctor_topic(doctor_id), SlotEvent.doctor_id == doctor_id, last_event_id, snapshot,
+    ))
+
+@router.get("/specializations/{specialization}/slots/stream")
+async def stream_specialization_slots(
+    specialization: str,
+    last_event_id: int | None = Header(None),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Slot changes of every doctor with this specialization; starts with a `ready` event (unless resuming)."""
+    if not slot_events.SLOT_EVENTS_ENABLED:
+        raise HTTPException(status_code=503, detail="Slot event streams are disabled")
+    await db.close()
+    return _event_stream_response(slot_events.event_stream(
+        slot_events.specialization_topic(specialization), Doctor.specialization == specialization, last_event_id,
+    ))
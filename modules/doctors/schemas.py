@@ -1,7 +1,11 @@
 # modules/doctors/schemas.py
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime, date, time
 from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# longest start_date..end_date span of one schedule rule
+MAX_SCHEDULE_DAYS = 366
 
 class DoctorCreate(BaseModel):
     specialization: Optional[str]
@@ -30,6 +34,50 @@ class SlotOut(BaseModel):
     
     model_config = {"from_attributes": True}
 
+class DoctorSearchResult(BaseModel):
+    doctor_id: int
+    username: str
+    specialization: Optional[str]
+    next_free_at: datetime
+    free_slots_7d: int
+
+    model_config = {"from_attributes": True}
+
 class SlotRangeCreate(BaseModel):
     start_datetime: datetime
-    end_datetime: datetime
\ No newline at end of file
+    end_datetime: datetime
+    slot_duration_minutes: int = Field(30, ge=5, le=480)
+
+class ScheduleBreak(BaseModel):
+    start_time: time
+    end_time: time
+
+class ScheduleRule(BaseModel):
+    """Recurring availability: on `weekdays` (0=Mon..6=Sun) from start_date to end_date inclusive."""
+    weekdays: list[int] = Field(..., min_length=1)
+    start_time: time
+    end_time: time
+    slot_duration_minutes: int = Field(30, ge=5, le=480)
+    breaks: list[ScheduleBreak] = []
+    start_date: date
+    end_date: date
+    timezone: str = "UTC"
+
+    @model_validator(mode="after")
+    def check_ranges(self):
+        if any(d < 0 or d > 6 for d in self.weekdays):
+            raise ValueError("weekdays must be between 0 (Monday) and 6 (Sunday)")
+        if self.end_time <= self.start_time:
+            raise ValueError("end_time must be after start_time")
+        if self.end_date < self.start_date:
+            raise ValueError("end_date must not be before start_date")
+        if (self.end_date - self.start_date).days >= MAX_SCHEDULE_DAYS:
+            raise ValueError(f"a rule may span at most {MAX_SCHEDULE_DAYS} days")
+        try:
+            ZoneInfo(self.timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"unknown timezone {self.timezone!r}")
+        return self
+
+class ScheduleCreate(BaseModel):
+    rules: list[ScheduleRule] = Field(..., min_length=1, max_length=50)
\ No newline at end of file
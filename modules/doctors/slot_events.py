@@ -0,0 +1,405 @@
+# modules/doctors/slot_events.py
+"""
+Live slot availability for the server-sent-event streams (/doctors/{id}/slots/stream,
+/doctors/specializations/{name}/slots/stream).
+
+Writers call `record()` in the transaction that creates, books or releases slots; it adds
+rows to slot_events, whose ids are the SSE event ids clients resume from (Last-Event-ID).
+Each app process runs one tail loop (`run_tail_loop`, started by the lifespan) that reads
+new rows and fans them out to the streams open in that process, so a change costs one
+query per process instead of one poll per client. What wakes the tail loop is pluggable
+(SLOT_EVENTS_BACKEND):
+
+- poll: commits made in this process wake it at once; changes from other processes
+  (workers, job runners) are picked up every SLOT_EVENTS_POLL_SECONDS.
+- postgres: writers also NOTIFY in their transaction (delivered on commit) and every
+  process LISTENs, so all workers stream a change as soon as it commits.
+
+Events carry the slot's new state (created / released = free, booked = taken), so
+applying one twice or after a snapshot that already includes it is harmless.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, select, delete
+from sqlalchemy.orm import Session
+from modules.core.db import AsyncSessionLocal, async_engine
+from modules.doctors.models import Doctor, SlotEvent
+from modules.doctors.availability import (
+    _naive_utc, availability_index, AVAILABILITY_INDEX_ENABLED, AVAILABILITY_INDEX_REFRESH_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+SLOT_EVENTS_ENABLED = os.getenv("SLOT_EVENTS_ENABLED", "true").lower() == "true"
+# poll | postgres
+SLOT_EVENTS_BACKEND = os.getenv("SLOT_EVENTS_BACKEND", "poll")
+SLOT_EVENTS_POLL_SECONDS = float(os.getenv("SLOT_EVENTS_POLL_SECONDS", "1"))
+# most events a reconnecting stream replays; further behind, it starts over from a snapshot
+SLOT_EVENTS_REPLAY_LIMIT = int(os.getenv("SLOT_EVENTS_REPLAY_LIMIT", "1000"))
+# events buffered per stream; a client this far behind is disconnected and resumes by replay
+SLOT_EVENTS_QUEUE_SIZE = int(os.getenv("SLOT_EVENTS_QUEUE_SIZE", "256"))
+SLOT_EVENTS_RETENTION_HOURS = int(os.getenv("SLOT_EVENTS_RETENTION_HOURS", "24"))
+# an id that is missing while later ones are visible (a transaction still committing, or
+# rolled back) is waited for this long before the tail moves past it
+SLOT_EVENTS_GAP_SECONDS = float(os.getenv("SLOT_EVENTS_GAP_SECONDS", "5"))
+SLOT_EVENTS_KEEPALIVE_SECONDS = 15
+NOTIFY_CHANNEL = "slot_events"
+
+_PENDING = "slot_events_pending"
+
+
+# ---------------- writing ----------------
+
+def record(db: Session, kind: str, slots):
+    """
+    Log availability changes of slots, (doctor_id, start, slot_id, end) each, in the
+    caller's transaction; they are streamed once it commits. kind: created, booked, released.
+    """
+    if not SLOT_EVENTS_ENABLED:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"doctor_id": doctor_id, "kind": kind, "slot_id": slot_id,
+         "start_datetime": _naive_utc(start), "end_datetime": _naive_utc(end), "created_at": now}
+        for doctor_id, start, slot_id, end in slots
+    ]
+    if not rows:
+        return
+    db.execute(insert(SlotEvent), rows)
+    get_backend().notify(db)
+    db.info[_PENDING] = True
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop(_PENDING, False):
+        wake()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+def latest_event_id(db: Session) -> int:
+    return db.scalar(select(func.max(SlotEvent.id))) or 0
+
+def purge_events(db: Session, older_than: timedelta) -> int:
+    deleted = db.execute(
+        delete(SlotEvent)
+        .where(SlotEvent.created_at < datetime.utcnow() - older_than)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return deleted.rowcount
+
+
+# ---------------- reading ----------------
+
+def _events_query():
+    return (
+        select(SlotEvent.id, SlotEvent.doctor_id, SlotEvent.kind, SlotEvent.slot_id,
+               SlotEvent.start_datetime, SlotEvent.end_datetime, Doctor.specialization)
+        .outerjoin(Doctor, Doctor.id == SlotEvent.doctor_id)
+        .order_by(SlotEvent.id)
+    )
+
+def doctor_topic(doctor_id: int) -> str:
+    return f"doctor:{doctor_id}"
+
+def specialization_topic(specialization: str) -> str:
+    return f"specialization:{specialization}"
+
+def frame(event_id: int, name: str, data: dict) -> bytes:
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+def _event_frame(row) -> tuple[list[str], bytes]:
+    """(topics, SSE frame) of a slot_events row; encoded once and shared by every subscriber."""
+    event_id, doctor_id, kind, slot_id, start, end, specialization = row
+    data = {
+        "type": kind,
+        "specialization": specialization,
+        "slot": {"id": slot_id, "doctor_id": doctor_id, "start_datetime": start.isoformat(),
+                 "end_datetime": end.isoformat(), "is_booked": kind == "booked"},
+    }
+    topics = [doctor_topic(doctor_id)]
+    if specialization:
+        topics.append(specialization_topic(specialization))
+    return topics, frame(event_id, f"slot.{kind}", data)
+
+def replay(db: Session, where, after: int, limit: int = SLOT_EVENTS_REPLAY_LIMIT):
+    """
+    [(event_id, frame)] of the events matching `where` after event id `after`, oldest first;
+    None if they cannot all be replayed (more than `limit`, already purged, or `after` is
+    not an id this database handed out).
+    """
+    oldest, latest = db.execute(select(func.min(SlotEvent.id), func.max(SlotEvent.id))).one()
+    if oldest is None or oldest > after + 1 or after > latest:
+        return None
+    rows = db.execute(_events_query().where(SlotEvent.id > after, where).limit(limit + 1)).all()
+    if len(rows) > limit:
+        return None
+    return [(row[0], _event_frame(row)[1]) for row in rows]
+
+
+class EventTail:
+    """
+    Reads new slot_events in id order. On Postgres ids are handed out before commit, so
+    a later id can become visible first: ids missing below the newest one seen are
+    re-checked for SLOT_EVENTS_GAP_SECONDS before the tail moves past them.
+    """
+
+    def __init__(self, floor: int):
+        self.floor = floor  # every id up to here is delivered (or given up on)
+        self._seen = set()  # delivered ids above the floor
+        self._holes = {}  # missing id -> when it was first noticed
+
+    def read(self, db: Session, batch: int = 1000) -> list:
+        fresh, cursor = [], self.floor
+        while True:
+            rows = db.execute(_events_query().where(SlotEvent.id > cursor).limit(batch)).all()
+            fresh.extend(row for row in rows if row[0] not in self._seen)
+            if len(rows) < batch:
+                break
+            cursor = rows[-1][0]
+        db.rollback()
+        self._advance([row[0] for row in fresh])
+        return fresh
+
+    def _advance(self, ids: list[int]):
+        now = time.monotonic()
+        self._seen.update(ids)
+        top = max(self._seen, default=self.floor)
+        for missing in range(self.floor + 1, top):
+            if missing not in self._seen:
+                self._holes.setdefault(missing, now)
+        while self.floor < top:
+            nxt = self.floor + 1
+            if nxt in self._seen:
+                self._seen.discard(nxt)
+            elif now - self._holes[nxt] < SLOT_EVENTS_GAP_SECONDS:
+                break
+            self._holes.pop(nxt, None)
+            self.floor = nxt
+
+
+# ---------------- fan-out ----------------
+
+class Subscription:
+    __slots__ = ("topic", "queue", "lagged")
+
+    def __init__(self, topic: str, queue_size: int):
+        self.topic = topic
+        self.queue = asyncio.Queue(queue_size)
+        self.lagged = False
+
+
+class SlotEventHub:
+    """This process's open streams by topic. Used from the event loop only."""
+
+    def __init__(self, queue_size: int = SLOT_EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics = defaultdict(set)
+        self.subscribers = 0
+        self.published = 0
+        self.delivered = 0
+        self.lagged = 0
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic, self.queue_size)
+        self._topics[topic].add(sub)
+        self.subscribers += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._topics.get(sub.topic)
+        if subs and sub in subs:
+            subs.discard(sub)
+            self.subscribers -= 1
+            if not subs:
+                del self._topics[sub.topic]
+
+    def publish(self, event_id: int, topics: list[str], data: bytes):
+        self.published += 1
+        lagging = []
+        for topic in topics:
+            for sub in self._topics.get(topic, ()):
+                try:
+                    sub.queue.put_nowait((event_id, data))
+                except asyncio.QueueFull:
+                    sub.lagged = True
+                    lagging.append(sub)
+                else:
+                    self.delivered += 1
+        for sub in lagging:
+            self.lagged += 1
+            self.unsubscribe(sub)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self.subscribers,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "lagged": self.lagged,
+        }
+
+
+hub = SlotEventHub()
+
+
+async def event_stream(topic: str, where, last_event_id: int | None = None, snapshot=None):
+    """
+    SSE frames for one topic: the events after `last_event_id` when they can be replayed,
+    otherwise a starting point (`snapshot(db) -> dict` as a `snapshot` event, or a `ready`
+    event; `reset` first when a resume failed), then live events until the client leaves.
+    Each event's id is the Last-Event-ID to reconnect with. The database is only used
+    while starting; the stream itself holds no connection.
+    """
+    sub = hub.subscribe(topic)  # before reading the starting point, so nothing falls in between
+    try:
+        async with AsyncSessionLocal() as db:
+            backlog = None
+            if last_event_id is not None:
+                backlog = await db.run_sync(replay, where, last_event_id)
+            if backlog is None:
+                cursor = await db.run_sync(latest_event_id)
+                if last_event_id is not None:
+                    yield frame(cursor, "reset", {"reason": "cannot resume from this event id"})
+                if snapshot is not None:
+                    yield frame(cursor, "snapshot", await db.run_sync(snapshot))
+                else:
+                    yield frame(cursor, "ready", {})
+                backlog = []
+        replayed = set()
+        for event_id, data in backlog:
+            replayed.add(event_id)
+            yield data
+
+        while not (sub.lagged and sub.queue.empty()):
+            try:
+                event_id, data = await asyncio.wait_for(sub.queue.get(), SLOT_EVENTS_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event_id not in replayed:
+                yield data
+        # fell too far behind: ending the stream makes the client reconnect and replay
+    finally:
+        hub.unsubscribe(sub)
+
+
+# ---------------- wake-up backends ----------------
+
+_loop = None
+_wakeup = None
+
+def wake():
+    """Make the tail loop read new events now; safe to call from any thread."""
+    if _loop is not None:
+        try:
+            _loop.call_soon_threadsafe(_wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed
+
+
+class PollBackend:
+    """Nothing crosses processes: other processes' events are found by the periodic poll."""
+    name = "poll"
+
+    def notify(self, db: Session):
+        pass
+
+    async def listen(self):
+        pass
+
+
+class PostgresBackend(PollBackend):
+    """NOTIFY in the writer's transaction; each process LISTENs on one dedicated connection."""
+    name = "postgres"
+
+    def notify(self, db: Session):
+        db.execute(select(func.pg_notify(NOTIFY_CHANNEL, "")))
+
+    async def listen(self):
+        while True:
+            try:
+                async with async_engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver = raw.driver_connection  # asyncpg
+                    closed = asyncio.Event()
+                    driver.add_termination_listener(lambda _: closed.set())
+                    await driver.add_listener(NOTIFY_CHANNEL, lambda *_: wake())
+                    wake()  # catch up on anything committed while (re)connecting
+                    await closed.wait()
+                    logger.warning("Slot event LISTEN connection closed; reconnecting")
+            except Exception:
+                logger.exception("Listening for slot events failed")
+            await asyncio.sleep(SLOT_EVENTS_POLL_SECONDS)
+
+
+BACKENDS = {"poll": PollBackend, "postgres": PostgresBackend}
+_backend = None
+
+def get_backend() -> PollBackend:
+    """The configured backend (SLOT_EVENTS_BACKEND), created on first use."""
+    global _backend
+    if _backend is None:
+        _backend = BACKENDS[SLOT_EVENTS_BACKEND]()
+    return _backend
+
+
+_tail = None
+
+def stats() -> dict:
+    return {
+        "enabled": SLOT_EVENTS_ENABLED,
+        "backend": SLOT_EVENTS_BACKEND,
+        "tail_floor": _tail.floor if _tail else None,
+        **hub.stats(),
+    }
+
+
+async def _run_tail(poll_interval: float, purge_interval: int = 3600):
+    global _tail
+    next_purge = next_rebuild = time.monotonic()
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                if _tail is None:
+                    _tail = EventTail(await db.run_sync(latest_event_id))
+                if AVAILABILITY_INDEX_ENABLED and time.monotonic() >= next_rebuild:
+                    # between two reads: whatever the snapshot misses is in the next read,
+                    # and no event is applied while it is taken
+                    await db.run_sync(availability_index.rebuild)
+                    next_rebuild = time.monotonic() + AVAILABILITY_INDEX_REFRESH_SECONDS
+                    availability_index.synced = True
+                rows = await db.run_sync(_tail.read)
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + purge_interval
+                    await db.run_sync(purge_events, timedelta(hours=SLOT_EVENTS_RETENTION_HOURS))
+        except Exception:
+            logger.exception("Reading slot events failed")
+            rows = []
+        for row in rows:
+            if availability_index.synced:
+                _, doctor_id, kind, slot_id, start, end, _ = row
+                availability_index.apply_event(kind, doctor_id, slot_id, start, end)
+            hub.publish(row[0], *_event_frame(row))
+        try:
+            await asyncio.wait_for(_wakeup.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+
+async def run_tail_loop(poll_interval: float = SLOT_EVENTS_POLL_SECONDS):
+    """Background task started by the app lifespan: stream new slot events to this process's subscribers."""
+    global _loop, _wakeup
+    _loop, _wakeup = asyncio.get_running_loop(), asyncio.Event()
+    try:
+        await asyncio.gather(_run_tail(poll_interval), get_backend().listen())
+    finally:
+        _loop = None
+        availability_index.synced = False
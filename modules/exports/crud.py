@@ -0,0 +1,24 @@
+# modules/exports/crud.py
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from modules.exports.models import ExportWatermark
+from datetime import datetime
+
+def get_watermark(db: Session, name: str) -> datetime | None:
+    row = db.get(ExportWatermark, name)
+    return row.watermark if row else None
+
+def set_watermark(db: Session, name: str, watermark: datetime, rows: int):
+    """Move the named watermark forward; an export that finishes after a later one leaves it alone."""
+    row = db.get(ExportWatermark, name)
+    if row is None:
+        db.add(ExportWatermark(name=name, watermark=watermark, rows=rows))
+    elif row.watermark < watermark:
+        row.watermark = watermark
+        row.rows = rows
+    try:
+        db.commit()
+    except IntegrityError:
+        # the first export under this name finished concurrently
+        db.rollback()
+        set_watermark(db, name, watermark, rows)
@@ -0,0 +1,276 @@
+# modules/exports/infection_history.py
+"""
+Bulk export of infection records joined with their patient and linked consultation
+(appointment and doctor specialization), as Parquet or Arrow IPC, for clinical analytics.
+
+Rows come from a server-side cursor (`yield_per`) and are written EXPORT_BATCH_SIZE at a
+time, one Parquet row group / Arrow record batch each, so memory stays flat however many
+records there are; `stream_export` yields the file in pieces as they are written.
+
+  date range   records created in [start, end) (either end open)
+  incremental  records changed since the last incremental export under the same name
+               (infection_records.updated_at), up to EXPORT_SETTLE_SECONDS ago so writes
+               still in flight are left for the next run; the watermark moves only once the
+               whole file has been written. A record that changes again (diagnosis finished,
+               consultation booked) is exported again: keep the last row per record_id.
+               Appointment changes alone (e.g. a cancellation) do not re-export a record.
+
+ai_response is split into ai_diagnosis / ai_confidence / ai_advice; any other keys the
+model returns go to ai_extra as JSON.
+
+    python -m modules.exports.infection_history --out records.parquet --start 2026-01-01 --end 2026-02-01
+    python -m modules.exports.infection_history --out changes.arrows --format arrow --incremental analytics
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from functools import lru_cache
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, type_coerce, Text
+from sqlalchemy.orm import Session
+from modules.core.db import AsyncSessionLocal, async_engine
+from modules.doctors.availability import _naive_utc
+from modules.doctors.models import Doctor
+from modules.appointments.models import Appointment
+from modules.infections.models import InfectionRecord
+from modules.patients.models import Patient
+from modules.exports import crud
+
+logger = logging.getLogger(__name__)
+
+# rows per cursor fetch and per row group / record batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# incremental exports stop this far behind now, past transactions still being committed
+EXPORT_SETTLE_SECONDS = int(os.getenv("EXPORT_SETTLE_SECONDS", "60"))
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# format -> (media type, file extension)
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+# keys of the model's response (see inference.dummy_model) that get their own ai_* column
+AI_RESPONSE_FIELDS = {"diagnosis": "string", "confidence": "double", "advice": "string"}
+
+# (column, arrow type) of the file, in order; the query labels its columns the same way
+COLUMNS = [
+    ("record_id", "int64"),
+    ("patient_id", "int64"),
+    ("status", "string"),
+    ("diagnosis", "string"),
+    ("confidence", "double"),
+    ("recommended_consultation", "bool"),
+    ("image_url", "string"),
+    ("error", "string"),
+    ("created_at", "timestamp[us]"),
+    ("completed_at", "timestamp[us]"),
+    ("updated_at", "timestamp[us]"),
+    ("patient_dob", "date32"),
+    ("patient_gender", "string"),
+    ("patient_medical_history", "string"),  # JSON
+    ("appointment_id", "int64"),
+    ("appointment_status", "string"),
+    ("appointment_scheduled_at", "timestamp[us]"),
+    ("doctor_id", "int64"),
+    ("doctor_specialization", "string"),
+    *((f"ai_{key}", kind) for key, kind in AI_RESPONSE_FIELDS.items()),
+    ("ai_extra", "string"),  # JSON
+]
+
+
+@lru_cache(maxsize=1)
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.type_for_alias(kind)) for name, kind in COLUMNS])
+
+
+def _query(start: datetime | None = None, end: datetime | None = None,
+           changed_after: datetime | None = None, changed_until: datetime | None = None):
+    record = InfectionRecord
+    query = (
+        select(
+            record.id.label("record_id"),
+            record.patient_id,
+            record.status,
+            record.diagnosis,
+            record.confidence,
+            record.recommended_consultation,
+            record.image_url,
+            record.error,
+            record.created_at,
+            record.completed_at,
+            record.updated_at,
+            Patient.dob.label("patient_dob"),
+            Patient.gender.label("patient_gender"),
+            # JSON columns as their stored text: no decode / re-encode per row
+            type_coerce(Patient.medical_history, Text).label("patient_medical_history"),
+            Appointment.id.label("appointment_id"),
+            Appointment.status.label("appointment_status"),
+            Appointment.scheduled_at.label("appointment_scheduled_at"),
+            Appointment.doctor_id,
+            Doctor.specialization.label("doctor_specialization"),
+            type_coerce(record.ai_response, Text).label("ai_response"),
+        )
+        .join(Patient, Patient.id == record.patient_id)
+        .outerjoin(Appointment, Appointment.id == record.appointment_id)
+        .outerjoin(Doctor, Doctor.id == Appointment.doctor_id)
+    )
+    if changed_until is not None:
+        # incremental: walks ix_infection_records_updated_at_id
+        if changed_after is not None:
+            query = query.where(record.updated_at > changed_after)
+        return query.where(record.updated_at <= changed_until).order_by(record.updated_at, record.id)
+    if start is not None:
+        query = query.where(record.created_at >= _naive_utc(start))
+    if end is not None:
+        query = query.where(record.created_at < _naive_utc(end))
+    return query.order_by(record.created_at, record.id)
+
+
+def flatten_ai_response(value) -> dict:
+    """ai_* columns for one ai_response (a dict, or its stored JSON text)."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    if value is not None and not isinstance(value, dict):
+        value = {"response": value}
+    columns = {f"ai_{key}": None for key in AI_RESPONSE_FIELDS}
+    extra = {}
+    for key, item in (value or {}).items():
+        kind = AI_RESPONSE_FIELDS.get(key)
+        if kind == "string" and isinstance(item, str) or \
+                kind == "double" and isinstance(item, (int, float)) and not isinstance(item, bool):
+            columns[f"ai_{key}"] = item
+        else:
+            extra[key] = item
+    columns["ai_extra"] = json.dumps(extra, sort_keys=True, default=str) if extra else None
+    return columns
+
+
+def _record_batch(rows):
+    import pyarrow as pa
+
+    # rows -> columns in one pass; only ai_response is looked at row by row
+    data = dict(zip(rows[0]._fields, zip(*rows)))
+    data["patient_medical_history"] = [None if text == "null" else text for text in data["patient_medical_history"]]
+    flattened = [flatten_ai_response(text) for text in data.pop("ai_response")]
+    for name in flattened[0]:
+        data[name] = [columns[name] for columns in flattened]
+    return pa.RecordBatch.from_pydict(data, schema=_schema())
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file for the pyarrow writers; `drain` hands over what was written since last time."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_writer(fmt: str, sink):
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(sink, _schema(), compression=EXPORT_PARQUET_COMPRESSION)
+    import pyarrow.ipc as ipc
+
+    return ipc.new_stream(sink, _schema())
+
+
+def _write(writer, rows) -> int:
+    writer.write_batch(_record_batch(rows))
+    return len(rows)
+
+
+def incremental_window(db: Session, name: str) -> tuple[datetime | None, datetime]:
+    """(changed_after, changed_until) of the next incremental export under `name`."""
+    return crud.get_watermark(db, name), datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+
+
+async def stream_export(fmt: str = "parquet", start: datetime | None = None, end: datetime | None = None,
+                        changed_after: datetime | None = None, changed_until: datetime | None = None,
+                        watermark: str | None = None):
+    """
+    The export file, in pieces. With `changed_until` the export is incremental (see
+    incremental_window); with `watermark` as well, that watermark moves to changed_until
+    after the last piece. Conversion and compression run in the threadpool.
+    """
+    sink = _Sink()
+    writer = _open_writer(fmt, sink)
+    rows = 0
+    async with AsyncSessionLocal() as db:
+        query = _query(start, end, changed_after, changed_until)
+        # Core rows straight off the cursor (no ORM loading step)
+        connection = await db.connection()
+        result = await connection.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            rows += await run_in_threadpool(_write, writer, partition)
+            yield sink.drain()
+        await result.close()
+        await run_in_threadpool(writer.close)
+        yield sink.drain()
+        if watermark and changed_until is not None:
+            await db.run_sync(crud.set_watermark, watermark, changed_until, rows)
+    logger.info("Exported %d infection records as %s", rows, fmt)
+
+
+async def export_to_file(path: str, fmt: str, start: datetime | None = None, end: datetime | None = None,
+                         incremental: str | None = None) -> int:
+    """CLI: write one export to `path`; returns its size in bytes."""
+    changed_after = changed_until = None
+    if incremental:
+        async with AsyncSessionLocal() as db:
+            changed_after, changed_until = await db.run_sync(incremental_window, incremental)
+    size = 0
+    with open(path, "wb") as f:
+        async for chunk in stream_export(fmt, start, end, changed_after, changed_until, incremental):
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+async def main(args):
+    try:
+        size = await export_to_file(args.out, args.format, args.start, args.end, args.incremental)
+        print(f"wrote {size} bytes to {args.out}")
+    finally:
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export infection records with patient and consultation data.")
+    parser.add_argument("--out", required=True, help="output file")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="records created at or after (UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="records created before (UTC)")
+    parser.add_argument("--incremental", metavar="NAME",
+                        help="records changed since the last incremental export under NAME; moves its watermark")
+    args = parser.parse_args()
+    if args.incremental and (args.start or args.end):
+        parser.error("--incremental does not combine with --start/--end")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main(args))
@@ -0,0 +1,12 @@
+# modules/exports/models.py
+from sqlalchemy import Column, Integer, String, DateTime
+from modules.core.db import Base
+import datetime
+
+class ExportWatermark(Base):
+    """Where the last incremental export under a name stopped (see modules/exports/infection_history.py)."""
+    __tablename__ = "export_watermarks"
+    name = Column(String(64), primary_key=True)  # one per consumer, e.g. "analytics"
+    watermark = Column(DateTime, nullable=False)  # rows changed up to here have been exported
+    rows = Column(Integer, nullable=False, default=0)  # rows in the export that moved it
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
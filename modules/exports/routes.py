@@ -0,0 +1,41 @@
+# modules/exports/routes.py
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_async_db
+from modules.auth.security import get_current_user_async
+from modules.users.models import User
+from modules.exports import infection_history
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+# Infection records with patient and consultation data as Parquet or Arrow IPC (admin only).
+# Date range: ?start=&end= on created_at. Incremental: ?incremental=<name>, changes since the
+# last incremental export under that name; the watermark moves once the file is complete.
+@router.get("/infections")
+async def export_infections(
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    incremental: str | None = Query(None, min_length=1, max_length=64),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    if incremental and (start or end):
+        raise HTTPException(status_code=400, detail="incremental does not combine with start/end")
+    media_type, extension = infection_history.FORMATS[format]
+    headers = {"Content-Disposition": f'attachment; filename="infection_history.{extension}"'}
+    changed_after = changed_until = None
+    if incremental:
+        changed_after, changed_until = await db.run_sync(infection_history.incremental_window, incremental)
+        headers["X-Export-Watermark"] = changed_until.isoformat()
+    # the export reads on its own connection; don't hold this one for the whole download
+    await db.close()
+    return StreamingResponse(
+        infection_history.stream_export(format, start, end, changed_after, changed_until, incremental),
+        media_type=media_type,
+        headers=headers,
+    )
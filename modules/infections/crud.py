@@ -1,16 +1,23 @@
 # modules/infections/crud.py
+from sqlalchemy import update, type_coerce, tuple_, select
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
-from modules.infections.models import InfectionRecord
-import json
+from modules.infections.models import InfectionRecord, DiagnosisCacheEntry
+from modules.patients.models import Patient
+from modules.jobs import crud as job_crud
+from modules.appointments import crud as appt_crud
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 
 def create_infection_record(db: Session, patient_id: int, image_url: str, ai_response: dict | None = None, diagnosis: str | None = None, confidence: float | None = None, recommended_consultation: bool = False):
     record = InfectionRecord(
         patient_id=patient_id,
         image_url=image_url,
-        ai_response=json.dumps(ai_response) if ai_response else None,
+        ai_response=ai_response or None,
         diagnosis=diagnosis,
         confidence=confidence,
-        recommended_consultation=recommended_consultation
+        recommended_consultation=recommended_consultation,
+        completed_at=datetime.utcnow(),
     )
     db.add(record)
     db.commit()
@@ -19,3 +26,207 @@ def create_infection_record(db: Session, patient_id: int, image_url: str, ai_res
 
 def get_infection_by_id(db: Session, record_id: int):
     return db.query(InfectionRecord).filter(InfectionRecord.id == record_id).first()
+
+def get_infection_with_owner(db: Session, record_id: int):
+    """(record, user id of its patient), or None."""
+    return (
+        db.query(InfectionRecord, Patient.user_id)
+        .join(Patient, Patient.id == InfectionRecord.patient_id)
+        .filter(InfectionRecord.id == record_id)
+        .first()
+    )
+
+class ConsultationAlreadyBooked(Exception):
+    """Another request linked an appointment to the record first."""
+
+def book_consultation(db: Session, record_id: int, preferred_specialization: str | None = None):
+    """
+    Book the earliest slot for a record's patient and link the appointment to the record
+    in the same transaction. A record that already has a consultation keeps it, so
+    repeating the request does not book twice. Returns the record, or None if no slot is free.
+    """
+    record = db.query(InfectionRecord).filter(InfectionRecord.id == record_id).first()
+    if record.appointment_id is not None:
+        return record
+
+    def link(appt):
+        # the conditional UPDATE is the guard: of two concurrent requests only one links,
+        # the other rolls back its booking (slot claim included)
+        db.add(appt)
+        db.flush()
+        linked = db.execute(
+            update(InfectionRecord)
+            .where(InfectionRecord.id == record_id, InfectionRecord.appointment_id.is_(None))
+            .values(appointment_id=appt.id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if linked != 1:
+            raise ConsultationAlreadyBooked(record_id)
+
+    try:
+        appt = appt_crud.book_earliest_slot_across_doctors(db, record.patient_id, preferred_specialization, on_booked=link)
+    except ConsultationAlreadyBooked:
+        pass
+    else:
+        if appt is None:
+            return None
+    db.refresh(record)
+    return record
+
+def get_patient_timeline(db: Session, user_id: int, before: tuple[datetime, int] | None = None, limit: int = 20):
+    """
+    One page of a patient's records, newest first, keyset-paginated on (created_at, id):
+    `before` is the last row of the previous page. Projected columns only (no ai_response);
+    walks ix_infection_records_patient_created_at.
+    """
+    record = InfectionRecord
+    query = (
+        db.query(
+            record.id, record.status, record.diagnosis, record.confidence, record.recommended_consultation,
+            record.appointment_id, record.image_url, record.created_at, record.completed_at, record.updated_at,
+        )
+        .filter(record.patient_id == select(Patient.id).where(Patient.user_id == user_id).scalar_subquery())
+    )
+    if before is not None:
+        query = query.filter(tuple_(record.created_at, record.id) < tuple_(*before))
+    return query.order_by(record.created_at.desc(), record.id.desc()).limit(limit).all()
+
+def search_infection_records(db: Session, diagnosis: str | None = None, min_confidence: float | None = None,
+                             max_confidence: float | None = None, fields: dict | None = None,
+                             limit: int = 50, offset: int = 0):
+    """
+    Records by AI result, newest first. diagnosis walks ix_infection_records_diagnosis_created_at,
+    a confidence range ix_infection_records_confidence. `fields` ({"advice": "..."}) matches
+    scalar fields of ai_response: containment on the GIN index on Postgres, a JSON field
+    comparison elsewhere.
+    """
+    query = db.query(InfectionRecord)
+    if diagnosis is not None:
+        query = query.filter(InfectionRecord.diagnosis == diagnosis)
+    if min_confidence is not None:
+        query = query.filter(InfectionRecord.confidence >= min_confidence)
+    if max_confidence is not None:
+        query = query.filter(InfectionRecord.confidence <= max_confidence)
+    if fields:
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.filter(type_coerce(InfectionRecord.ai_response, JSONB).contains(fields))
+        else:
+            for key, value in fields.items():
+                field = InfectionRecord.ai_response[key]
+                if isinstance(value, bool):
+                    query = query.filter(field.as_boolean() == value)
+                elif isinstance(value, (int, float)):
+                    query = query.filter(field.as_float() == value)
+                else:
+                    query = query.filter(field.as_string() == value)
+    return (
+        query.order_by(InfectionRecord.created_at.desc(), InfectionRecord.id.desc())
+        .limit(limit).offset(offset).all()
+    )
+
+# ---------------- Asynchronous diagnosis ----------------
+
+DIAGNOSE_JOB = "infections.diagnose"
+
+def create_pending_diagnosis(db: Session, patient_id: int, contents: bytes, content_type: str | None, sha256: str,
+                             perceptual_hash: str | None = None, idempotency_key: str | None = None):
+    """
+    Insert a pending record and the job that finishes it, in one transaction. The image
+    bytes travel with the job, so any worker process can pick it up. A repeated
+    idempotency key returns the record created the first time.
+    """
+    key = f"{DIAGNOSE_JOB}:{patient_id}:{idempotency_key}" if idempotency_key else None
+    if key:
+        job = job_crud.get_job_by_key(db, key)
+        if job:
+            return get_infection_by_id(db, job.payload["record_id"])
+    record = InfectionRecord(patient_id=patient_id, status="pending")
+    db.add(record)
+    db.flush()
+    job_crud.enqueue(
+        db, DIAGNOSE_JOB,
+        payload={"record_id": record.id, "sha256": sha256, "content_type": content_type, "perceptual_hash": perceptual_hash},
+        blob=contents, idempotency_key=key, commit=False,
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # the same idempotency key arrived concurrently; that request's record wins
+        db.rollback()
+        return get_infection_by_id(db, job_crud.get_job_by_key(db, key).payload["record_id"])
+    db.refresh(record)
+    return record
+
+def start_infection_record(db: Session, record_id: int) -> bool:
+    """pending (or an interrupted processing) -> processing; False if the record is finished or gone."""
+    started = db.execute(
+        update(InfectionRecord)
+        .where(InfectionRecord.id == record_id, InfectionRecord.status.in_(("pending", "processing")))
+        .values(status="processing")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return started.rowcount == 1
+
+def complete_infection_record(db: Session, record_id: int, image_url: str, ai_response: dict, recommended_consultation: bool):
+    db.execute(
+        update(InfectionRecord)
+        .where(InfectionRecord.id == record_id)
+        .values(
+            status="done",
+            image_url=image_url,
+            ai_response=ai_response or None,
+            diagnosis=ai_response.get("diagnosis"),
+            confidence=ai_response.get("confidence"),
+            recommended_consultation=recommended_consultation,
+            error=None,
+            completed_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def fail_infection_record(db: Session, record_id: int, error: str):
+    db.execute(
+        update(InfectionRecord)
+        .where(InfectionRecord.id == record_id, InfectionRecord.status != "done")
+        .values(status="failed", error=error, completed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+# ---------------- Diagnosis cache (persistent tier) ----------------
+
+def get_cached_diagnosis(db: Session, model: str, max_age: timedelta, content_hash: str | None = None, perceptual_hash: str | None = None):
+    query = db.query(DiagnosisCacheEntry).filter(
+        DiagnosisCacheEntry.model == model,
+        DiagnosisCacheEntry.created_at >= datetime.utcnow() - max_age,
+    )
+    if content_hash:
+        query = query.filter(DiagnosisCacheEntry.content_hash == content_hash)
+    else:
+        query = query.filter(DiagnosisCacheEntry.perceptual_hash == perceptual_hash)
+    return query.order_by(DiagnosisCacheEntry.created_at.desc()).first()
+
+def save_cached_diagnosis(db: Session, model: str, content_hash: str, perceptual_hash: str | None, image_url: str, ai_response: dict, inference_ms: float | None):
+    entry = (
+        db.query(DiagnosisCacheEntry)
+        .filter(DiagnosisCacheEntry.content_hash == content_hash, DiagnosisCacheEntry.model == model)
+        .first()
+    )
+    if entry is None:
+        entry = DiagnosisCacheEntry(content_hash=content_hash, model=model)
+        db.add(entry)
+    # (re)fill: also refreshes an entry that had aged out
+    entry.perceptual_hash = perceptual_hash
+    entry.image_url = image_url
+    entry.ai_response = ai_response
+    entry.inference_ms = inference_ms
+    entry.created_at = datetime.utcnow()
+    try:
+        db.commit()
+    except IntegrityError:
+        # a concurrent request cached the same image first
+        db.rollback()
+        return None
+    return entry
@@ -0,0 +1,158 @@
+# modules/infections/diagnosis_cache.py
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.infections import crud, inference
+
+DIAGNOSIS_CACHE_ENABLED = os.getenv("DIAGNOSIS_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DIAGNOSIS_CACHE_MAX_SIZE = int(os.getenv("DIAGNOSIS_CACHE_MAX_SIZE", "2048"))
+DIAGNOSIS_CACHE_TTL_SECONDS = int(os.getenv("DIAGNOSIS_CACHE_TTL_SECONDS", str(24 * 3600)))
+DIAGNOSIS_CACHE_DB_TTL_DAYS = int(os.getenv("DIAGNOSIS_CACHE_DB_TTL_DAYS", "30"))
+# near-duplicate matching on a 64-bit dHash (reuses the AI result only); 0 disables it
+DIAGNOSIS_CACHE_PHASH_MAX_DISTANCE = int(os.getenv("DIAGNOSIS_CACHE_PHASH_MAX_DISTANCE", "0"))
+
+# cached results are only reused for the model that produced them
+MODEL_NAME = inference.INFERENCE_MODEL or "dummy"
+
+
+def perceptual_hash(data: bytes) -> str | None:
+    """64-bit difference hash (dHash) as 16 hex chars; None if the bytes are not an image."""
+    import numpy as np
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("L", (64, 64))
+            pixels = np.asarray(img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    except (UnidentifiedImageError, OSError):
+        return None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def hamming(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+class DiagnosisCache:
+    """
+    In-memory tier: LRU with TTL, keyed by content sha256, with a linear near-duplicate
+    scan over perceptual hashes. The persistent tier lives in the diagnosis_cache table
+    (see infections/crud.py); routes consult both. Also keeps the hit/miss metrics.
+    """
+
+    def __init__(self, max_size: int = DIAGNOSIS_CACHE_MAX_SIZE, ttl: int = DIAGNOSIS_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # sha256 -> (expires_at, phash, image_url, ai_response, inference_ms)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.near_duplicate_hits = 0
+        self.misses = 0
+        self.saved_inference_ms = 0.0
+
+    def get(self, sha256: str):
+        """(image_url, ai_response, inference_ms) for these exact bytes, else None."""
+        with self._lock:
+            entry = self._entries.get(sha256)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries.move_to_end(sha256)
+            return entry[2:]
+
+    def find_near(self, phash: str, max_distance: int = DIAGNOSIS_CACHE_PHASH_MAX_DISTANCE):
+        """Same as get, for the most recent image whose dHash is within max_distance bits."""
+        now = time.time()
+        with self._lock:
+            for key, entry in reversed(self._entries.items()):
+                if entry[0] > now and entry[1] is not None and hamming(entry[1], phash) <= max_distance:
+                    self._entries.move_to_end(key)
+                    return entry[2:]
+        return None
+
+    def put(self, sha256: str, phash: str | None, image_url: str, ai_response: dict, inference_ms: float | None):
+        with self._lock:
+            self._entries[sha256] = (time.time() + self.ttl, phash, image_url, ai_response, inference_ms)
+            self._entries.move_to_end(sha256)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_hit(self, tier: str, inference_ms: float | None):
+        with self._lock:
+            if tier == "memory":
+                self.memory_hits += 1
+            elif tier == "db":
+                self.db_hits += 1
+            else:
+                self.near_duplicate_hits += 1
+            self.saved_inference_ms += inference_ms or 0.0
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.db_hits + self.near_duplicate_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": DIAGNOSIS_CACHE_ENABLED,
+                "model": MODEL_NAME,
+                "memory_size": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "near_duplicate_hits": self.near_duplicate_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "saved_inference_ms": round(self.saved_inference_ms, 1),
+            }
+
+
+diagnosis_cache = DiagnosisCache()
+
+
+async def lookup(db: AsyncSession, sha256: str, contents: bytes):
+    """
+    Check memory, then the DB, by content hash; then (if enabled) by perceptual hash.
+    Returns ((image_url, ai_response, inference_ms) or None, perceptual hash or None).
+    image_url is None on a near-duplicate hit: the stored image is a different picture
+    (possibly another patient's), so only its AI result may be reused.
+    """
+    hit = diagnosis_cache.get(sha256)
+    if hit:
+        diagnosis_cache.record_hit("memory", hit[2])
+        return hit, None
+
+    max_age = timedelta(days=DIAGNOSIS_CACHE_DB_TTL_DAYS)
+    entry = await db.run_sync(crud.get_cached_diagnosis, MODEL_NAME, max_age, content_hash=sha256)
+    if entry:
+        hit = (entry.image_url, entry.ai_response, entry.inference_ms)
+        diagnosis_cache.put(sha256, entry.perceptual_hash, *hit)
+        diagnosis_cache.record_hit("db", entry.inference_ms)
+        return hit, entry.perceptual_hash
+
+    phash = None
+    if DIAGNOSIS_CACHE_PHASH_MAX_DISTANCE > 0:
+        phash = await run_in_threadpool(perceptual_hash, contents)
+    if phash:
+        hit = diagnosis_cache.find_near(phash)
+        if not hit:
+            entry = await db.run_sync(crud.get_cached_diagnosis, MODEL_NAME, max_age, perceptual_hash=phash)
+            hit = (entry.image_url, entry.ai_response, entry.inference_ms) if entry else None
+        if hit:
+            diagnosis_cache.record_hit("near", hit[2])
+            return (None, *hit[1:]), phash
+
+    diagnosis_cache.record_miss()
+    return None, phash
+
+
+async def store(db: AsyncSession, sha256: str, phash: str | None, image_url: str, ai_response: dict, inference_ms: float | None):
+    diagnosis_cache.put(sha256, phash, image_url, ai_response, inference_ms)
+    await db.run_sync(crud.save_cached_diagnosis, MODEL_NAME, sha256, phash, image_url, ai_response, inference_ms)
@@ -0,0 +1,186 @@
+# modules/infections/inference.py
+from __future__ import annotations
+
+import asyncio
+import importlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+# numpy and Pillow are imported by the inference thread on first use, not at startup
+if TYPE_CHECKING:
+    import numpy as np
+
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "16"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+INFERENCE_IMAGE_SIZE = int(os.getenv("INFERENCE_IMAGE_SIZE", "224"))
+# optional "package.module:callable" for the real model; the dummy model is used otherwise
+INFERENCE_MODEL = os.getenv("INFERENCE_MODEL")
+
+# ImageNet channel statistics (RGB); they broadcast over the last axis of NHWC batches
+CHANNEL_MEAN = (0.485, 0.456, 0.406)
+CHANNEL_STD = (0.229, 0.224, 0.225)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def dummy_model(batch: np.ndarray) -> list[dict]:
+    """Stand-in model: takes an (N, 3, H, W) float32 tensor, returns one response per image."""
+    return [
+        {
+            "diagnosis": "Possible fungal infection",
+            "confidence": 0.86,
+            "advice": "Apply anti-fungal cream twice daily for 2 weeks. Consult a dermatologist if it persists."
+        }
+        for _ in range(len(batch))
+    ]
+
+
+def decode_image(data: bytes, size: int = INFERENCE_IMAGE_SIZE) -> np.ndarray:
+    """Decode and resize one image to a (size, size, 3) uint8 array."""
+    import numpy as np
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("RGB", (size, size))  # lets JPEG decode at reduced scale
+            return np.asarray(img.convert("RGB").resize((size, size), Image.BILINEAR), dtype=np.uint8)
+    except (UnidentifiedImageError, OSError) as exc:
+        raise InvalidImage("Could not decode image") from exc
+
+
+def is_image(data: bytes) -> bool:
+    """Cheap header check (no decode), to reject bad uploads before they are queued."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)):
+            return True
+    except (UnidentifiedImageError, OSError):
+        return False
+
+
+def preprocess_batch(images: list[np.ndarray]) -> np.ndarray:
+    """Stack decoded images and normalize them in one vectorized pass -> (N, 3, H, W) float32."""
+    import numpy as np
+
+    batch = np.stack(images).astype(np.float32)
+    batch /= 255.0
+    batch -= np.array(CHANNEL_MEAN, dtype=np.float32)
+    batch /= np.array(CHANNEL_STD, dtype=np.float32)
+    return np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+
+class InferenceService:
+    """
+    In-process micro-batching front for a diagnosis model.
+    Concurrent predict() calls are queued and grouped into batches of up to
+    max_batch_size, waiting at most max_wait_ms after the first image arrives.
+    Each batch is decoded, preprocessed into one tensor and passed to `model`
+    on a single worker thread; results are fanned back to the awaiting callers.
+    """
+
+    def __init__(self, model=dummy_model, max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS, image_size: int = INFERENCE_IMAGE_SIZE):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.image_size = image_size
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.images = 0
+
+    async def predict(self, image_bytes: bytes) -> dict:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((image_bytes, future))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            futures = [future for _, future in batch]
+            try:
+                results = await self._loop.run_in_executor(self._executor, self._infer, [data for data, _ in batch])
+            except Exception as exc:
+                results = [exc] * len(batch)
+            for future, result in zip(futures, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _infer(self, images: list[bytes]) -> list:
+        """Runs on the inference thread: decode, preprocess and predict one batch."""
+        results = [None] * len(images)
+        decoded, positions = [], []
+        for i, data in enumerate(images):
+            try:
+                decoded.append(decode_image(data, self.image_size))
+                positions.append(i)
+            except InvalidImage as exc:
+                results[i] = exc
+        if decoded:
+            predictions = list(self.model(preprocess_batch(decoded)))
+            if len(predictions) != len(decoded):
+                # which prediction belongs to which image is unknown: fail every image of the batch
+                error = RuntimeError(f"Model returned {len(predictions)} predictions for {len(decoded)} images")
+                predictions = [error] * len(decoded)
+            for i, prediction in zip(positions, predictions):
+                results[i] = prediction
+        self.batches += 1
+        self.images += len(images)
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "images": self.images,
+            "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+def _load_model():
+    if not INFERENCE_MODEL:
+        return dummy_model
+    module_name, _, attr = INFERENCE_MODEL.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+_service = None
+
+def get_inference_service() -> InferenceService:
+    global _service
+    if _service is None:
+        _service = InferenceService(model=_load_model())
+    return _service
+
+def service_stats() -> dict:
+    """Stats of the running service; empty before the first prediction starts it."""
+    return _service.stats() if _service is not None else {}
@@ -1,5 +1,6 @@
 # modules/infections/models.py
-from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, JSON, Float, Boolean
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, JSON, Float, Boolean, UniqueConstraint, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from modules.core.db import Base
 import datetime
@@ -8,11 +9,51 @@ class InfectionRecord(Base):
     __tablename__ = "infection_records"
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
-    image_url = Column(String, nullable=False)
-    ai_response = Column(JSON, nullable=True)  # JSON dump as text
+    image_url = Column(String, nullable=True)  # set once the image is stored
+    # the model's response as a JSON document (JSONB on Postgres); diagnosis and confidence are copied out below
+    ai_response = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     diagnosis = Column(String, nullable=True)
     confidence = Column(Float, nullable=True)
     recommended_consultation = Column(Boolean, default=False)
+    # pending -> processing -> done | failed, for diagnoses finished by a background job
+    status = Column(String(16), nullable=False, default="done", server_default="done")
+    error = Column(String, nullable=True)
+    appointment_id = Column(Integer, ForeignKey("appointments.id", ondelete="SET NULL"), nullable=True)  # booked consultation
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    # bumped by every change (diagnosis finished, consultation linked); incremental exports follow it
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
     patient = relationship("Patient")
+    appointment = relationship("Appointment")
+
+    __table_args__ = (
+        # date-range and incremental exports (modules/exports/infection_history.py)
+        Index("ix_infection_records_created_at", created_at),
+        Index("ix_infection_records_updated_at_id", updated_at, id),
+        # a patient's timeline, newest first (GET /infections/me)
+        Index("ix_infection_records_patient_created_at", patient_id, created_at, id),
+        # GET /infections filters (crud.search_infection_records)
+        Index("ix_infection_records_diagnosis_created_at", diagnosis, created_at),
+        Index("ix_infection_records_confidence", confidence),
+        # containment queries on any response field (ai_response @> '{...}'); Postgres only
+        Index("ix_infection_records_ai_response", ai_response, postgresql_using="gin",
+              postgresql_ops={"ai_response": "jsonb_path_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+
+class DiagnosisCacheEntry(Base):
+    """Persistent tier of the diagnosis cache: one AI result per (image content, model)."""
+    __tablename__ = "diagnosis_cache"
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False)  # sha256 of the uploaded bytes
+    perceptual_hash = Column(String(16), nullable=True, index=True)  # 64-bit dHash, hex
+    model = Column(String, nullable=False)
+    image_url = Column(String, nullable=False)
+    ai_response = Column(JSON, nullable=False)
+    inference_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("content_hash", "model", name="uq_diagnosis_cache_content_model"),
+    )
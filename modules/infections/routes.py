@@ -1,51 +1,104 @@
 # modules/infections/routes.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from modules.core.db import get_db
-from modules.auth.security import get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_db, get_async_db, AsyncSessionLocal
+from modules.auth.security import get_current_user, get_current_user_async
 from modules.users.models import User
 from modules.patients import crud as patient_crud
-from modules.infections import crud, schemas
-from modules.core import cloudinary_utils
-from modules.appointments import crud as appt_crud
+from modules.infections import crud, schemas, inference, diagnosis_cache, tasks
+from modules.core import upload_utils, response_cache
+from modules.core.storage import get_storage
+from modules.jobs import worker
 
 router = APIRouter(prefix="/infections", tags=["infections"])
 
-# helper: dummy AI call - replace with real integration
-def call_ai_model_on_image_bytes(image_bytes: bytes):
-    # Dummy: return a sample response. Replace with real API call:
+# completion stream: how often the record is re-read, and when the stream gives up
+INFECTION_EVENTS_POLL_SECONDS = 0.5
+INFECTION_EVENTS_TIMEOUT_SECONDS = 300
+INFECTION_EVENTS_KEEPALIVE_SECONDS = 15
+
+def _diagnose_response(record) -> dict:
     return {
-        "diagnosis": "Possible fungal infection",
-        "confidence": 0.86,
-        "advice": "Apply anti-fungal cream twice daily for 2 weeks. Consult a dermatologist if it persists."
+        "id": record.id,
+        "diagnosis": record.diagnosis,
+        "confidence": record.confidence,
+        "ai_response": record.ai_response,
+        "recommended_consultation": record.recommended_consultation,
+        "status": record.status,
+        "appointment_id": record.appointment_id,
     }
 
 @router.post("/diagnose", response_model=schemas.DiagnoseResponse)
-def diagnose_infection(image: UploadFile = File(...), notes: str | None = Form(None), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def diagnose_infection(
+    response: Response,
+    image: UploadFile = File(...),
+    notes: str | None = Form(None),
+    wait: bool = Query(False, description="diagnose inline and answer with the result instead of 202 + a pending record"),
+    idempotency_key: str | None = Header(None, max_length=64),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Only patients can use diagnose feature")
-    patient = patient_crud.get_patient_by_user_id(db, current_user.id)
+    patient = await db.run_sync(patient_crud.get_patient_by_user_id, current_user.id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
 
-    # upload image to Cloudinary (or local)
-    image_url = cloudinary_utils.upload_file_to_cloudinary(image)
+    timer = upload_utils.StageTimer()
 
-    # read bytes and send to AI
-    contents = image.file.read()
-    ai_resp = call_ai_model_on_image_bytes(contents)
+    # read the upload once (size-capped); storage and AI both use this buffer
+    upload = await timer.track("read", upload_utils.read_upload(image))
+    contents = upload.read_bytes()
 
-    # decide if we recommend consultation (simple rule: confidence < threshold OR serious tags)
-    recommend = ai_resp.get("confidence", 1.0) < 0.9  # example heuristic
-    record = crud.create_infection_record(db, patient.id, image_url, ai_response=ai_resp, diagnosis=ai_resp.get("diagnosis"), confidence=ai_resp.get("confidence"), recommended_consultation=recommend)
+    # same image diagnosed before: reuse its stored URL and AI result (near-identical: the AI result only)
+    cached, phash = None, None
+    if diagnosis_cache.DIAGNOSIS_CACHE_ENABLED:
+        cached, phash = await timer.track("cache", diagnosis_cache.lookup(db, upload.sha256, contents))
 
-    return {
-        "id": record.id,
-        "diagnosis": record.diagnosis,
-        "confidence": record.confidence,
-        "ai_response": str(ai_resp),
-        "recommended_consultation": record.recommended_consultation
-    }
+    if not cached and tasks.DIAGNOSE_ASYNC and not wait:
+        # upload + inference run in a background job; the client polls GET /infections/{id}
+        # or listens on /infections/{id}/events
+        if not await run_in_threadpool(inference.is_image, contents):
+            raise HTTPException(status_code=400, detail="Uploaded file is not a readable image")
+        record = await timer.track("db", db.run_sync(
+            crud.create_pending_diagnosis, patient.id, contents, upload.content_type, upload.sha256, phash, idempotency_key
+        ))
+        worker.notify()
+        response.headers["Server-Timing"] = timer.server_timing()
+        if record.status != "done":
+            response.status_code = 202
+            response.headers["Location"] = f"/infections/{record.id}"
+        return _diagnose_response(record)
+
+    if cached:
+        image_url, ai_resp, _ = cached
+        if image_url is None:
+            # near-duplicate of another upload: this record keeps the patient's own image
+            image_url = await timer.track("upload", run_in_threadpool(
+                get_storage().save, contents, upload.content_type, upload.sha256
+            ))
+    else:
+        try:
+            image_url, ai_resp = await tasks.analyze_image(db, contents, upload.content_type, upload.sha256, phash, timer)
+        except inference.InvalidImage:
+            raise HTTPException(status_code=400, detail="Uploaded file is not a readable image")
+
+    recommend = tasks.recommends_consultation(ai_resp)
+    record = await timer.track("db", db.run_sync(
+        crud.create_infection_record, patient.id, image_url,
+        ai_response=ai_resp, diagnosis=ai_resp.get("diagnosis"), confidence=ai_resp.get("confidence"), recommended_consultation=recommend
+    ))
+    response.headers["Server-Timing"] = timer.server_timing()
+    return _diagnose_response(record)
 
 # If patient wants consultation for a given infection record
 @router.post("/{record_id}/consult", response_model=schemas.DiagnoseResponse)
@@ -56,15 +109,138 @@ def request_consult(record_id: int, current_user: User = Depends(get_current_use
     if not record or record.patient.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Record not found or not yours")
 
-    # Try booking appointment (no specialization filter here, or set based on diagnosis)
-    appt = appt_crud.book_earliest_slot_across_doctors(db, record.patient_id, preferred_specialization=None)
-    if not appt:
+    # Book the earliest appointment (no specialization filter here, or set based on diagnosis)
+    # and link it to the record; asking again returns the same appointment
+    record = crud.book_consultation(db, record_id, preferred_specialization=None)
+    if not record:
         raise HTTPException(status_code=404, detail="No available slots to book")
-    # Optionally update record to link appointment (not modeled)
+    return {**_diagnose_response(record), "recommended_consultation": True}
+
+
+# Query diagnoses by AI result (admin only)
+@router.get("", response_model=list[schemas.InfectionRecordOut])
+async def search_infection_records(
+    diagnosis: str | None = None,
+    min_confidence: float | None = None,
+    max_confidence: float | None = None,
+    fields: str | None = Query(None, description='JSON object of ai_response fields to match, e.g. {"advice": "..."}'),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    parsed = None
+    if fields:
+        try:
+            parsed = json.loads(fields)
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict) or not all(isinstance(v, (str, int, float, bool)) for v in parsed.values()):
+            raise HTTPException(status_code=400, detail="fields must be a JSON object of string, number or boolean values")
+    return await db.run_sync(
+        crud.search_infection_records, diagnosis, min_confidence, max_confidence, parsed, limit, offset
+    )
+
+
+# ---------------- Patient timeline ----------------
+
+def _encode_cursor(created_at: datetime, record_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{record_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, record_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(record_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# The patient's own records, newest first: ?cursor= from the previous page's next_cursor.
+# A page's ETag comes from its rows' (id, updated_at), so an unchanged page answers 304.
+@router.get("/me", response_model=schemas.InfectionTimelinePage)
+async def read_my_infection_timeline(
+    response: Response,
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    if_none_match: str | None = Header(None),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if current_user.role != "patient":
+        raise HTTPException(status_code=403, detail="Only patients")
+    before = _decode_cursor(cursor) if cursor else None
+    # one row past the page tells whether there is a next one
+    rows = await db.run_sync(crud.get_patient_timeline, current_user.id, before, limit + 1)
+    page, more = rows[:limit], len(rows) > limit
+    version = ";".join(f"{row.id}:{row.updated_at.isoformat() if row.updated_at else ''}" for row in page)
+    etag = '"' + hashlib.sha256(f"{limit}|{cursor}|{more}|{version}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if response_cache.if_none_match(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    storage = get_storage()
     return {
-        "id": record.id,
-        "diagnosis": record.diagnosis,
-        "confidence": record.confidence,
-        "ai_response": record.ai_response,
-        "recommended_consultation": True
+        "items": [
+            {**row._asdict(), "thumbnail_url": storage.thumbnail_url(row.image_url)}
+            for row in page
+        ],
+        "next_cursor": _encode_cursor(page[-1].created_at, page[-1].id) if more else None,
     }
+
+
+# Diagnosis cache metrics (admin only)
+@router.get("/diagnosis-cache")
+async def read_diagnosis_cache_stats(current_user: User = Depends(get_current_user_async)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return diagnosis_cache.diagnosis_cache.stats()
+
+
+# ---------------- Record status (asynchronous diagnose) ----------------
+
+async def _get_own_record(db: AsyncSession, record_id: int, current_user: User):
+    found = await db.run_sync(crud.get_infection_with_owner, record_id)
+    if not found or (found[1] != current_user.id and current_user.role != "admin"):
+        raise HTTPException(status_code=404, detail="Record not found or not yours")
+    return found[0]
+
+@router.get("/{record_id}", response_model=schemas.InfectionRecordOut)
+async def read_infection_record(record_id: int, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Poll a diagnosis: status is pending / processing until the background job is done (or failed)."""
+    return await _get_own_record(db, record_id, current_user)
+
+@router.get("/{record_id}/events")
+async def stream_infection_record(record_id: int, current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-sent events: a `status` event whenever the record's status changes, ending
+    with the finished record (status done or failed) or a `timeout` event.
+    """
+    await _get_own_record(db, record_id, current_user)
+
+    async def events():
+        last_status = None
+        started = last_sent = time.monotonic()
+        while True:
+            # a short session per poll: the stream does not hold a pooled connection
+            async with AsyncSessionLocal() as session:
+                record = await session.run_sync(crud.get_infection_by_id, record_id)
+            if record is None:
+                return
+            if record.status != last_status:
+                last_status = record.status
+                data = schemas.InfectionRecordOut.model_validate(record).model_dump_json()
+                yield f"event: status\ndata: {data}\n\n"
+                last_sent = time.monotonic()
+            if record.status in ("done", "failed"):
+                return
+            now = time.monotonic()
+            if now - started > INFECTION_EVENTS_TIMEOUT_SECONDS:
+                yield f"event: timeout\ndata: {json.dumps({'id': record_id})}\n\n"
+                return
+            if now - last_sent > INFECTION_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = now
+            await asyncio.sleep(INFECTION_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
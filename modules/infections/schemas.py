@@ -1,13 +1,47 @@
 # modules/infections/schemas.py
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime
 
 class DiagnoseResponse(BaseModel):
     id: int
     diagnosis: Optional[str]
     confidence: Optional[float]
-    ai_response: Optional[str]
+    ai_response: Optional[dict]
     recommended_consultation: bool
+    status: str = "done"  # pending / processing while a background job finishes the record
+    appointment_id: Optional[int] = None
 
     model_config = {"from_attributes": True}
 
+class InfectionRecordOut(BaseModel):
+    id: int
+    status: str
+    image_url: Optional[str]
+    diagnosis: Optional[str]
+    confidence: Optional[float]
+    ai_response: Optional[dict]
+    recommended_consultation: bool
+    error: Optional[str]
+    appointment_id: Optional[int]
+    created_at: datetime
+    completed_at: Optional[datetime]
+
+    model_config = {"from_attributes": True}
+
+
+class InfectionTimelineItem(BaseModel):
+    id: int
+    status: str
+    diagnosis: Optional[str]
+    confidence: Optional[float]
+    recommended_consultation: bool
+    appointment_id: Optional[int]
+    image_url: Optional[str]
+    thumbnail_url: Optional[str]
+    created_at: datetime
+    completed_at: Optional[datetime]
+
+class InfectionTimelinePage(BaseModel):
+    items: list[InfectionTimelineItem]
+    next_cursor: Optional[str]  # pass as ?cursor= for the next (older) page; null on the last page
@@ -0,0 +1,62 @@
+# modules/infections/tasks.py
+import asyncio
+import os
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core import upload_utils
+from modules.core.storage import get_storage
+from modules.core.metrics import external_call
+from modules.infections import crud, inference, diagnosis_cache
+from modules.jobs.worker import register, PermanentJobError
+
+# diagnose answers 202 with a pending record and a job finishes it; false runs it inline
+DIAGNOSE_ASYNC = os.getenv("DIAGNOSE_ASYNC", "true").lower() == "true"
+
+def recommends_consultation(ai_resp: dict) -> bool:
+    # simple rule: confidence < threshold OR serious tags
+    return ai_resp.get("confidence", 1.0) < 0.9  # example heuristic
+
+async def analyze_image(db: AsyncSession, contents: bytes, content_type: str | None, sha256: str,
+                        phash: str | None = None, timer: upload_utils.StageTimer | None = None):
+    """
+    Store the image (skipped if these bytes were stored before) and run the AI model
+    concurrently, then fill the diagnosis cache. Returns (image_url, ai_response);
+    raises inference.InvalidImage for bytes that are not an image.
+    Images from concurrent calls are micro-batched by the inference service; plug the
+    real model in with INFERENCE_MODEL (see modules/infections/inference.py).
+    """
+    timer = timer or upload_utils.StageTimer()
+    # reject non-images before the upload starts, so a failed inference leaves no stored object
+    if not await run_in_threadpool(inference.is_image, contents):
+        raise inference.InvalidImage("Could not decode image")
+
+    async def infer():
+        with external_call("ai_inference"):
+            return await inference.get_inference_service().predict(contents)
+
+    image_url, ai_resp = await asyncio.gather(
+        timer.track("upload", run_in_threadpool(get_storage().save, contents, content_type, sha256)),
+        timer.track("inference", infer()),
+    )
+    if diagnosis_cache.DIAGNOSIS_CACHE_ENABLED:
+        await diagnosis_cache.store(db, sha256, phash, image_url, ai_resp, timer.stages["inference"])
+    return image_url, ai_resp
+
+
+async def _diagnose_failed(db: AsyncSession, job, error: str):
+    await db.run_sync(crud.fail_infection_record, job.payload["record_id"], error)
+
+@register(crud.DIAGNOSE_JOB, on_failure=_diagnose_failed)
+async def run_diagnosis(db: AsyncSession, job) -> dict:
+    """Finish a record created by diagnose (crud.create_pending_diagnosis)."""
+    payload = job.payload
+    record_id = payload["record_id"]
+    if not await db.run_sync(crud.start_infection_record, record_id):
+        return {"record_id": record_id, "skipped": True}  # finished by an earlier attempt
+    try:
+        image_url, ai_resp = await analyze_image(db, job.blob, payload["content_type"], payload["sha256"], payload["perceptual_hash"])
+    except inference.InvalidImage as exc:
+        raise PermanentJobError("Uploaded file is not a readable image") from exc
+    recommend = recommends_consultation(ai_resp)
+    await db.run_sync(crud.complete_infection_record, record_id, image_url, ai_resp, recommend)
+    return {"record_id": record_id, "diagnosis": ai_resp.get("diagnosis")}
@@ -0,0 +1,140 @@
+# modules/jobs/crud.py
+from sqlalchemy import update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from modules.jobs.models import Job
+from datetime import datetime, timedelta
+import os
+import random
+
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+# a claimed job is the worker's until then; afterwards another worker may take it over
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "300"))
+# retry n waits about base * 2**(n-1) seconds (with jitter), at most the max
+JOBS_BACKOFF_BASE_SECONDS = float(os.getenv("JOBS_BACKOFF_BASE_SECONDS", "2"))
+JOBS_BACKOFF_MAX_SECONDS = float(os.getenv("JOBS_BACKOFF_MAX_SECONDS", "600"))
+
+def get_job(db: Session, job_id: int):
+    return db.get(Job, job_id)
+
+def get_job_by_key(db: Session, idempotency_key: str):
+    return db.query(Job).filter(Job.idempotency_key == idempotency_key).first()
+
+def enqueue(db: Session, kind: str, payload: dict | None = None, blob: bytes | None = None,
+            idempotency_key: str | None = None, max_attempts: int = JOBS_MAX_ATTEMPTS,
+            run_at: datetime | None = None, commit: bool = True):
+    """
+    Add a job; a job already enqueued under `idempotency_key` is returned instead.
+    With commit=False the job is only flushed, so it commits (or rolls back) together
+    with the caller's own rows; the caller then handles a duplicate-key IntegrityError.
+    """
+    if idempotency_key:
+        existing = get_job_by_key(db, idempotency_key)
+        if existing:
+            return existing
+    job = Job(
+        kind=kind,
+        payload=payload,
+        blob=blob,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts,
+        run_at=run_at or datetime.utcnow(),
+    )
+    db.add(job)
+    if not commit:
+        db.flush()
+        return job
+    try:
+        db.commit()
+    except IntegrityError:
+        # the same key was enqueued concurrently
+        db.rollback()
+        return get_job_by_key(db, idempotency_key)
+    db.refresh(job)
+    return job
+
+def claim_next(db: Session, worker_id: str, kinds: list[str] | None = None):
+    """
+    Lease the oldest due job to `worker_id` and count the attempt; None when idle.
+    Due means queued with run_at <= now, or running with an expired lease (its worker died).
+    Rows locked by other workers are skipped (FOR UPDATE SKIP LOCKED); where the backend
+    has no row locks (SQLite), the claim UPDATE only matches the attempt count it read,
+    so two workers can never both win the same job.
+    """
+    now = datetime.utcnow()
+    query = db.query(Job).filter(or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_until < now),
+    ))
+    if kinds:
+        query = query.filter(Job.kind.in_(kinds))
+    lost = []
+    while True:
+        candidates = query.filter(Job.id.notin_(lost)) if lost else query
+        job = candidates.order_by(Job.run_at, Job.id).with_for_update(skip_locked=True, of=Job).first()
+        if job is None:
+            db.rollback()
+            return None
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == job.status, Job.attempts == job.attempts)
+            .values(status="running", attempts=Job.attempts + 1, locked_by=worker_id,
+                    locked_until=now + timedelta(seconds=JOBS_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        if claimed.rowcount != 1:
+            lost.append(job.id)
+            db.rollback()
+            continue
+        db.commit()
+        db.refresh(job)
+        return job
+
+def backoff_seconds(attempt: int) -> float:
+    """Delay before retry number `attempt` (1-based): exponential, capped, with jitter."""
+    delay = min(JOBS_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1), JOBS_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+def complete(db: Session, job_id: int, worker_id: str, result: dict | None = None) -> bool:
+    """Mark a job done. False if the lease was lost meanwhile (another worker owns the job now)."""
+    finished = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "running", Job.locked_by == worker_id)
+        .values(status="done", result=result, blob=None, locked_until=None, finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return finished.rowcount == 1
+
+def fail(db: Session, job: Job, worker_id: str, error: str, retry: bool = True) -> str | None:
+    """
+    Record a failed attempt: requeue with backoff while attempts remain (and `retry`),
+    otherwise mark the job failed. Returns the new status, or None if the lease was lost.
+    """
+    now = datetime.utcnow()
+    if retry and job.attempts < job.max_attempts:
+        values = {"status": "queued", "run_at": now + timedelta(seconds=backoff_seconds(job.attempts)),
+                  "locked_by": None, "locked_until": None}
+    else:
+        values = {"status": "failed", "blob": None, "locked_until": None, "finished_at": now}
+    updated = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == "running", Job.locked_by == worker_id)
+        .values(last_error=error[:2000], **values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return values["status"] if updated.rowcount == 1 else None
+
+def purge_finished(db: Session, older_than: timedelta) -> int:
+    """Delete done jobs finished before now - older_than; failed jobs are kept for inspection."""
+    deleted = db.execute(
+        delete(Job)
+        .where(Job.status == "done", Job.finished_at < datetime.utcnow() - older_than)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return deleted.rowcount
+
+def count_by_status(db: Session) -> dict:
+    return dict(db.query(Job.status, func.count()).group_by(Job.status).all())
@@ -0,0 +1,29 @@
+# modules/jobs/models.py
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, LargeBinary, Index
+from modules.core.db import Base
+import datetime
+
+class Job(Base):
+    """One unit of background work; the table is the queue (see modules/jobs/crud.py)."""
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(64), nullable=False)  # handler name, e.g. "infections.diagnose"
+    payload = Column(JSON, nullable=True)
+    blob = Column(LargeBinary, nullable=True)  # input bytes (e.g. an uploaded image); dropped once finished
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, done, failed
+    # enqueueing twice with the same key returns the first job
+    idempotency_key = Column(String(128), nullable=True, unique=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_at = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)  # not before (retry backoff)
+    locked_by = Column(String(64), nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # lease; an expired lease means the worker died
+    result = Column(JSON, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # the worker's claim query: due queued jobs, oldest first
+        Index("ix_jobs_status_run_at", status, run_at),
+    )
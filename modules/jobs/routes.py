@@ -0,0 +1,16 @@
+# modules/jobs/routes.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.core.db import get_async_db
+from modules.auth.security import get_current_user_async
+from modules.users.models import User
+from modules.jobs import crud, worker
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Queue depth by status and this process's worker counters (admin only)
+@router.get("/stats")
+async def read_job_stats(current_user: User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {"queue": await db.run_sync(crud.count_by_status), "worker": worker.stats()}
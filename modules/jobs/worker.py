@@ -0,0 +1,167 @@
+# modules/jobs/worker.py
+"""
+Job workers. They run inside each app process (JOBS_WORKER_ENABLED, started by the
+lifespan) and/or as dedicated processes:
+
+    python -m modules.jobs.worker --concurrency 4
+    python -m modules.jobs.worker --kinds infections.diagnose
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import timedelta
+from modules.core.db import AsyncSessionLocal, async_engine
+from modules.jobs import crud
+
+logger = logging.getLogger(__name__)
+
+JOBS_WORKER_ENABLED = os.getenv("JOBS_WORKER_ENABLED", "true").lower() == "true"
+# jobs processed at the same time per process
+JOBS_WORKER_CONCURRENCY = int(os.getenv("JOBS_WORKER_CONCURRENCY", "2"))
+# idle workers look for due jobs this often (jobs enqueued in-process wake them at once)
+JOBS_POLL_INTERVAL_SECONDS = float(os.getenv("JOBS_POLL_INTERVAL_SECONDS", "1"))
+# done jobs are deleted after this long
+JOBS_RETENTION_HOURS = int(os.getenv("JOBS_RETENTION_HOURS", "24"))
+
+# importing these registers their handlers
+HANDLER_MODULES = ["modules.infections.tasks"]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for failures a retry cannot fix (e.g. bad input): the job fails at once."""
+
+
+_handlers = {}  # kind -> (handler, on_failure)
+
+def register(kind: str, on_failure=None):
+    """
+    Decorator for `async def handler(db: AsyncSession, job) -> dict | None`; the returned
+    dict is stored as the job result. Handlers may run more than once for the same job
+    (retries, a worker dying mid-job), so they must be idempotent.
+    `on_failure(db, job, error)` runs once the job has failed for good.
+    """
+    def decorator(fn):
+        _handlers[kind] = (fn, on_failure)
+        return fn
+    return decorator
+
+def load_handlers():
+    for name in HANDLER_MODULES:
+        importlib.import_module(name)
+
+
+_lock = threading.Lock()
+_stats = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0}
+_wakeup = None
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+def notify():
+    """Wake this process's idle workers (call from the event loop after enqueueing)."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+def stats() -> dict:
+    with _lock:
+        return {"enabled": JOBS_WORKER_ENABLED, "handlers": sorted(_handlers), **_stats}
+
+
+async def run_job(job, worker_id: str):
+    handler, on_failure = _handlers.get(job.kind, (None, None))
+    retry = True
+    if handler is None:
+        error, retry = f"No handler registered for {job.kind!r}", False
+    elif job.attempts > job.max_attempts:
+        # only reachable by lease expiry: the job keeps killing (or outliving) its workers
+        error, retry = "Lease expired on the last attempt", False
+    else:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await handler(db, job)
+        except PermanentJobError as exc:
+            error, retry = str(exc), False
+        except Exception as exc:
+            logger.exception("Job %s (%s) attempt %s failed", job.id, job.kind, job.attempts)
+            error = f"{type(exc).__name__}: {exc}"
+        else:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(crud.complete, job.id, worker_id, result)
+            _count("succeeded")
+            return
+
+    async with AsyncSessionLocal() as db:
+        status = await db.run_sync(crud.fail, job, worker_id, error, retry)
+    _count("retried" if status == "queued" else "failed")
+    if status == "failed" and on_failure is not None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await on_failure(db, job, error)
+        except Exception:
+            logger.exception("Failure hook of job %s (%s) failed", job.id, job.kind)
+
+async def run_worker_loop(worker_id: str, kinds: list[str] | None = None, poll_interval: float = JOBS_POLL_INTERVAL_SECONDS):
+    """Claim and run jobs one at a time until cancelled."""
+    while True:
+        job = None
+        try:
+            async with AsyncSessionLocal() as db:
+                job = await db.run_sync(crud.claim_next, worker_id, kinds)
+        except Exception:
+            logger.exception("Claiming a job failed")
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+        _count("claimed")
+        await run_job(job, worker_id)
+
+async def run_purge_loop(interval: int = 3600):
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.run_sync(crud.purge_finished, timedelta(hours=JOBS_RETENTION_HOURS))
+        except Exception:
+            logger.exception("Purging finished jobs failed")
+        await asyncio.sleep(interval)
+
+async def run_workers(concurrency: int = JOBS_WORKER_CONCURRENCY, kinds: list[str] | None = None):
+    """Background task started by the app lifespan (or the CLI below); runs until cancelled."""
+    global _wakeup
+    load_handlers()
+    _wakeup = asyncio.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    await asyncio.gather(
+        run_purge_loop(),
+        *(run_worker_loop(f"{prefix}:{i}", kinds) for i in range(concurrency)),
+    )
+
+
+async def serve(concurrency: int = JOBS_WORKER_CONCURRENCY, kinds: list[str] | None = None):
+    """Dedicated worker process."""
+    try:
+        await run_workers(concurrency, kinds)
+    finally:
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--concurrency", type=int, default=JOBS_WORKER_CONCURRENCY)
+    parser.add_argument("--kinds", nargs="+", help="only run jobs of these kinds")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # go through the importable module (not __main__) so handlers register in the same registry
+    from modules.jobs import worker
+    try:
+        asyncio.run(worker.serve(args.concurrency, args.kinds))
+    except KeyboardInterrupt:
+        pass
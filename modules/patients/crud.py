@@ -1,6 +1,7 @@
 # modules/patients/crud.py
 from sqlalchemy.orm import Session
 from modules.patients.models import Patient
+from modules.core.response_cache import response_cache
 from datetime import date
 
 def create_patient(db: Session, user_id: int, dob: date | None = None, gender: str | None = None, medical_history: str | None = None, profile_image: str | None = None):
@@ -8,6 +9,7 @@ def create_patient(db: Session, user_id: int, dob: date | None = None, gender: s
     db.add(patient)
     db.commit()
     db.refresh(patient)
+    response_cache.invalidate(f"user:{user_id}")
     return patient
 
 def get_patient_by_user_id(db: Session, user_id: int):
@@ -21,4 +23,5 @@ def update_patient(db: Session, user_id: int, **updates):
         setattr(patient, k, v)
     db.commit()
     db.refresh(patient)
+    response_cache.invalidate(f"user:{user_id}", f"patient:{patient.id}")
     return patient
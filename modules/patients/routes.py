@@ -5,7 +5,9 @@ from modules.core.db import get_db
 from modules.auth.security import get_current_user
 from modules.users.models import User
 from modules.patients import crud, schemas
-from modules.core import cloudinary_utils  # optional helper for image upload (I show below)
+from modules.core import upload_utils
+from modules.core.storage import get_storage
+from modules.core.response_cache import cached, tag
 import json
 
 router = APIRouter(prefix="/patients", tags=["patients"])
@@ -34,10 +36,13 @@ def update_profile(
         except json.JSONDecodeError:
             raise HTTPException(status_code=400, detail="medical_history must be valid JSON array")
 
-    # ✅ Upload image if provided
+    # ✅ Upload image if provided (identical images are stored once)
     image_url = None
     if profile_image:
-        image_url = cloudinary_utils.upload_file_to_cloudinary(profile_image)
+        contents = profile_image.file.read(upload_utils.MAX_UPLOAD_BYTES + 1)
+        if len(contents) > upload_utils.MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {upload_utils.MAX_UPLOAD_BYTES} bytes")
+        image_url = get_storage().save(contents, profile_image.content_type)
 
     updated = crud.update_patient(
         db,
@@ -52,9 +57,11 @@ def update_profile(
 
 # Get my patient profile
 @router.get("/me", response_model=schemas.PatientOut)
+@cached()
 def get_my_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Only patients")
+    tag(f"user:{current_user.id}")
     patient = crud.get_patient_by_user_id(db, current_user.id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
@@ -1,13 +1,14 @@
 # modules/users/crud.py
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from modules.users.models import User
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from modules.auth.principal_cache import principal_cache
+from modules.core.response_cache import response_cache
+from modules.auth import hashing
 
 # -------------------- CREATE --------------------
 def create_user(db: Session, username: str, password: str, role: str = "patient"):
-    hashed_password = pwd_context.hash(password)
+    hashed_password = hashing.hash_password_sync(password)
     new_user = User(
         username=username,
         hashed_password=hashed_password,
@@ -22,12 +23,40 @@ def create_user(db: Session, username: str, password: str, role: str = "patient"
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
+def get_user_by_email(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+def get_user_by_username_or_email(db: Session, username_or_email: str):
+    return db.query(User).filter((User.username == username_or_email) | (User.email == username_or_email)).first()
+
 def get_all_users(db: Session):
     return db.query(User).all()
 
 def get_users_by_role(db: Session, role: str):
     return db.query(User).filter(User.role == role).all()
 
+# UserOut-shaped projection: plain row tuples, no ORM instances, no hashed_password
+USER_OUT_COLUMNS = (User.id, User.username, User.role, User.email, User.phone_number)
+
+def get_users_page(db: Session, after_id: int | None = None, limit: int = 100, role: str | None = None):
+    """Keyset page of users ordered by id: rows with id > after_id, at most `limit` of them."""
+    stmt = select(*USER_OUT_COLUMNS).order_by(User.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(User.id > after_id)
+    if role is not None:
+        stmt = stmt.where(User.role == role)
+    return db.execute(stmt).all()
+
+def iter_users(db: Session, role: str | None = None, batch_size: int = 1000):
+    """Every user as a projected row, fetched in keyset batches so memory stays flat."""
+    after_id = None
+    while True:
+        rows = get_users_page(db, after_id, batch_size, role)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1].id
+
 # -------------------- UPDATE --------------------
 def update_user_role(db: Session, username: str, new_role: str):
     user = get_user_by_username(db, username)
@@ -35,20 +64,26 @@ def update_user_role(db: Session, username: str, new_role: str):
         user.role = new_role
         db.commit()
         db.refresh(user)
+        principal_cache.invalidate(username)
+        response_cache.invalidate(f"user:{user.id}")
     return user
 
 def update_user_password(db: Session, username: str, new_password: str):
     user = get_user_by_username(db, username)
     if user:
-        user.hashed_password = pwd_context.hash(new_password)
+        user.hashed_password = hashing.hash_password_sync(new_password)
         db.commit()
         db.refresh(user)
+        principal_cache.invalidate(username)
     return user
 
 # -------------------- DELETE --------------------
 def delete_user(db: Session, username: str):
     user = get_user_by_username(db, username)
     if user:
+        user_id = user.id
         db.delete(user)
         db.commit()
+        principal_cache.invalidate(username)
+        response_cache.invalidate(f"user:{user_id}")
     return user
@@ -1,5 +1,5 @@
 # modules/users/models.py
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index
 from sqlalchemy.orm import relationship
 from modules.core.db import Base
 
@@ -13,4 +13,9 @@ class User(Base):
     role = Column(String, default="patient", nullable=False)
 
     patient = relationship("Patient", back_populates="user", uselist=False)
-    doctor = relationship("Doctor", back_populates="user", uselist=False)
\ No newline at end of file
+    doctor = relationship("Doctor", back_populates="user", uselist=False)
+
+    __table_args__ = (
+        # keyset pagination of role listings: WHERE role = ? AND id > ? ORDER BY id
+        Index("ix_users_role_id", role, id),
+    )
\ No newline at end of file
@@ -1,23 +1,55 @@
 # modules/users/routes.py
 
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from modules.auth.security import get_current_user
-from modules.core.db import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from modules.auth.security import get_current_user, get_current_user_async
+from modules.auth.principal_cache import principal_cache
+from modules.core.response_cache import response_cache
+from modules.auth import hashing
+from modules.core.db import get_db, get_async_db, SessionLocal
 from modules.users.models import User
+from modules.users import crud, schemas
 
 router = APIRouter(prefix="/users", tags=["users"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 # -------------------- GET ALL USERS (admin only) --------------------
-@router.get("/")
-def read_all_users(current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+# Keyset pagination on id: pass the X-Next-Cursor header of a page as ?after_id= to get the
+# next one. ?format=ndjson streams every matching user instead (admin exports).
+USERS_PAGE_MAX = 1000
+
+def _users_response(response: Response, db: Session, after_id: int | None, limit: int, role: str | None, format: str):
+    if format == "ndjson":
+        def export():
+            # own session: the request's session is closed before the body is streamed
+            export_db = SessionLocal()
+            try:
+                for row in crud.iter_users(export_db, role=role):
+                    yield json.dumps(row._asdict()) + "\n"
+            finally:
+                export_db.close()
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+
+    rows = crud.get_users_page(db, after_id, limit, role)
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [row._asdict() for row in rows]
+
+@router.get("/", response_model=list[schemas.UserOut])
+def read_all_users(
+    response: Response,
+    after_id: int | None = None,
+    limit: int = Query(100, ge=1, le=USERS_PAGE_MAX),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return db.query(User).all()
+    return _users_response(response, db, after_id, limit, None, format)
 
 
 # -------------------- GET SINGLE USER --------------------
@@ -34,11 +66,19 @@ def read_user(username: str, current_user=Depends(get_current_user), db: Session
 
 
 # -------------------- GET USERS BY ROLE (admin only) --------------------
-@router.get("/role/{role}")
-def read_users_by_role(role: str, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+@router.get("/role/{role}", response_model=list[schemas.UserOut])
+def read_users_by_role(
+    role: str,
+    response: Response,
+    after_id: int | None = None,
+    limit: int = Query(100, ge=1, le=USERS_PAGE_MAX),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
-    return db.query(User).filter(User.role == role).all()
+    return _users_response(response, db, after_id, limit, role, format)
 
 
 # -------------------- UPDATE USER ROLE (admin only) --------------------
@@ -54,22 +94,28 @@ def update_role(username: str, new_role: str, current_user=Depends(get_current_u
     user.role = new_role
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(username)
+    response_cache.invalidate(f"user:{user.id}")
     return {"msg": f"{username}'s role updated to {new_role}"}
 
 
 # -------------------- UPDATE OWN PASSWORD --------------------
+# async so bcrypt runs on the password-hash pool instead of a threadpool worker
 @router.put("/{username}/password")
-def update_password(username: str, new_password: str, current_user=Depends(get_current_user), db: Session = Depends(get_db)):
+async def update_password(username: str, new_password: str, current_user=Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
     if current_user.username != username and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.run_sync(crud.get_user_by_username, username)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user.hashed_password = pwd_context.hash(new_password)
-    db.commit()
-    db.refresh(user)
+    try:
+        user.hashed_password = await hashing.hash_password(new_password)
+    except hashing.PasswordPoolBusy as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    await db.commit()
+    principal_cache.invalidate(username)
     return {"msg": "Password updated successfully"}
 
 
@@ -83,6 +129,9 @@ def delete(username: str, current_user=Depends(get_current_user), db: Session =
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
+    user_id = user.id
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(username)
+    response_cache.invalidate(f"user:{user_id}")
     return {"msg": f"User {username} deleted successfully"}
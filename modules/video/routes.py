@@ -1,6 +1,6 @@
 # modules/video/routes.py
 from fastapi import APIRouter, Depends, HTTPException
-from modules.core.agora_utils import generate_agora_token
+from modules.core.agora_utils import APP_ID, token_cache
 from modules.auth.security import get_current_user
 from modules.users.models import User
 
@@ -10,10 +10,11 @@ router = APIRouter(prefix="/video", tags=["video"])
 def get_video_token(channel: str, current_user: User = Depends(get_current_user)):
     if not channel:
         raise HTTPException(status_code=400, detail="Channel name required")
-    token = generate_agora_token(channel, current_user.id)
+    token, expires_at = token_cache.get_token(channel, current_user.id)
     return {
-        "app_id": os.getenv("AGORA_APP_ID"),
+        "app_id": APP_ID,
         "channel": channel,
         "uid": current_user.id,
-        "token": token
+        "token": token,
+        "expires_at": expires_at
     }